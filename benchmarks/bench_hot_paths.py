@@ -0,0 +1,379 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+"""
+Microbenchmarks of the hot functions of projection, tile lookup, metrics, tile arrival and json writing,
+on synthetic inputs such that no video asset is needed.
+
+The results are written as json, and compared with a baseline file written by an earlier run with -save_baseline.
+Cases whose median duration grew by more than the tolerance are reported as regressions, and make the exit code 1.
+
+Usage: python ./benchmarks/bench_hot_paths.py [-resolutions 1080p 4k 8k] [-tile_grids 4x3 8x6 16x8]
+                                              [-repeat 5] [-chunks 10] [-json_chunks 2] [-filter projection]
+                                              [-output result.json] [-baseline baseline.json] [-save_baseline]
+                                              [-tolerance 0.2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import os.path as osp
+import platform
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+
+sys.path.insert(0, osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))), 'e3po'))
+import add_e3po_to_environment
+from e3po.utils.projection_utilities import fov_to_3d_polar_coord, transform_projection, \
+    _3d_polar_coord_to_erp, _3d_polar_coord_to_cmp, _3d_polar_coord_to_eac, pixel_coord_to_tile, \
+    pixel_coord_to_relative_tile_coord
+from e3po.utils.psnr_ssim import calculate_psnr_ssim_mse
+from e3po.utils.evaluation_utilities import calc_arrival_ts, get_curr_display_chunks
+from e3po.utils.json import write_decision_json, write_video_json
+from e3po.utils.tile_layout import encode_tile_id
+from bench_ssim import make_frame_pair
+
+# erp resolutions of the source video, with format [height, width]
+RESOLUTIONS = {
+    '1080p': [960, 1920],
+    '4k': [1920, 3840],
+    '8k': [3840, 7680]
+}
+RANGE_FOV = [89, 89]
+CHUNK_DURATION = 1000       # in milliseconds
+VIDEO_FPS = 30
+
+
+def get_fov_resolution(resolution):
+    """Fov resolution with about the pixel density of the erp source, i.e. a quarter of its width."""
+    return [resolution[1] // 4, resolution[1] // 4]
+
+
+def get_face_resolution(resolution):
+    """Resolution of the 3x2 cmp or eac layout with the pixel density of the erp source."""
+    face_size = resolution[1] // 4
+    return [face_size * 2, face_size * 3]
+
+
+def parse_tile_grid(tile_grid):
+    """Parse 'COLSxROWS' into (cols, rows)."""
+    cols, rows = tile_grid.lower().split('x')
+    return int(cols), int(rows)
+
+
+def make_video_size(resolution, cols, rows, chunk_num):
+    """
+    Synthetic video size of a tiled erp video, with the format written by write_video_json.
+
+    Returns
+    -------
+    video_size: dict
+        {tile_id: {'video_size', 'user_video_spec', 'chunk_info'}}
+    """
+    rng = np.random.default_rng(0)
+    tile_width, tile_height = resolution[1] // cols, resolution[0] // rows
+    video_size = {}
+    for chunk_idx in range(chunk_num):
+        chunk_info = {
+            'chunk_idx': chunk_idx,
+            'chunk_duration': CHUNK_DURATION / 1000,
+            'start_second': chunk_idx * CHUNK_DURATION / 1000,
+            'end_second': (chunk_idx + 1) * CHUNK_DURATION / 1000
+        }
+        for tile_idx in range(cols * rows):
+            video_size[encode_tile_id(chunk_idx, tile_idx)] = {
+                'video_size': int(rng.integers(20000, 200000)),
+                'user_video_spec': {
+                    'segment_info': {
+                        'segment_out_info': {'width': tile_width, 'height': tile_height},
+                        'start_position': {'width': tile_idx % cols * tile_width,
+                                           'height': tile_idx // cols * tile_height}
+                    },
+                    'tile_info': {'chunk_idx': chunk_idx, 'tile_idx': tile_idx}
+                },
+                'chunk_info': chunk_info
+            }
+    return video_size
+
+
+def make_dl_list(cols, rows, chunk_num):
+    """Synthetic decisions, which download half of the tiles of each chunk one chunk ahead of playback."""
+    rng = np.random.default_rng(1)
+    dl_list = []
+    for chunk_idx in range(chunk_num):
+        tiles = rng.choice(cols * rows, max(1, cols * rows // 2), replace=False)
+        dl_list.append({
+            'chunk_idx': chunk_idx,
+            'decision_data': {
+                'system_ts': max(0, (chunk_idx - 1) * CHUNK_DURATION),
+                'tile_info': [encode_tile_id(chunk_idx, int(tile_idx)) for tile_idx in sorted(tiles)]
+            }
+        })
+    return dl_list
+
+
+def make_network_record(duration_ms):
+    """Synthetic network trace with one segment per 100 ms."""
+    rng = np.random.default_rng(2)
+    return [
+        {'start_ms': start_ms, 'duration_ms': 100, 'throughput_MBps': float(rng.uniform(2, 20)),
+         'rtt_ms': float(rng.uniform(20, 80))}
+        for start_ms in range(0, duration_ms, 100)
+    ]
+
+
+def projection_cases(resolution_name, resolution):
+    """Cases of fov_to_3d_polar_coord, the polar to pixel conversions and transform_projection."""
+    fov_resolution = get_fov_resolution(resolution)
+    face_resolution = get_face_resolution(resolution)
+    fov_direction = [0.6, 0.3, 0]
+    polar_coord = fov_to_3d_polar_coord(fov_direction, RANGE_FOV, fov_resolution)
+
+    yield f'projection.fov_to_3d_polar_coord[{resolution_name}]', \
+        lambda: fov_to_3d_polar_coord(fov_direction, RANGE_FOV, fov_resolution)
+    yield f'projection._3d_polar_coord_to_erp[{resolution_name}]', \
+        lambda: _3d_polar_coord_to_erp(polar_coord, resolution)
+    yield f'projection._3d_polar_coord_to_cmp[{resolution_name}]', \
+        lambda: _3d_polar_coord_to_cmp(polar_coord, face_resolution)
+    yield f'projection._3d_polar_coord_to_eac[{resolution_name}]', \
+        lambda: _3d_polar_coord_to_eac(polar_coord, face_resolution)
+    for dst_projection in ('cmp', 'eac'):
+        yield f'projection.transform_projection[erp->{dst_projection},{resolution_name}]', \
+            lambda dst_projection=dst_projection: transform_projection(dst_projection, 'erp', face_resolution,
+                                                                       resolution)
+
+
+def tile_cases(resolution_name, resolution, tile_grid):
+    """Cases of pixel_coord_to_tile and pixel_coord_to_relative_tile_coord, for the fov pixels of one frame."""
+    cols, rows = parse_tile_grid(tile_grid)
+    video_size = make_video_size(resolution, cols, rows, 1)
+    polar_coord = fov_to_3d_polar_coord([0.6, 0.3, 0], RANGE_FOV, get_fov_resolution(resolution))
+    pixel_coord = _3d_polar_coord_to_erp(polar_coord, resolution)
+    coord_tile_list = pixel_coord_to_tile(pixel_coord, cols * rows, video_size, 0)
+
+    yield f'tile.pixel_coord_to_tile[{resolution_name},{tile_grid}]', \
+        lambda: pixel_coord_to_tile(pixel_coord, cols * rows, video_size, 0)
+    yield f'tile.pixel_coord_to_relative_tile_coord[{resolution_name},{tile_grid}]', \
+        lambda: pixel_coord_to_relative_tile_coord(pixel_coord, coord_tile_list, video_size, 0)
+
+
+def metric_cases(resolution_name, resolution):
+    """Case of calculate_psnr_ssim_mse on the cpu, for a pair of fov frames."""
+    height, width = get_fov_resolution(resolution)
+    img1, img2 = make_frame_pair(height, width, 10)
+
+    yield f'metric.calculate_psnr_ssim_mse[{resolution_name}]', lambda: calculate_psnr_ssim_mse(img1, img2)
+
+
+def arrival_cases(tile_grid, chunk_num):
+    """Cases of calc_arrival_ts, and get_curr_display_chunks over all frames of the video."""
+    cols, rows = parse_tile_grid(tile_grid)
+    video_size = make_video_size(RESOLUTIONS['4k'], cols, rows, chunk_num)
+    dl_list = make_dl_list(cols, rows, chunk_num)
+    network_record = make_network_record(chunk_num * CHUNK_DURATION * 2)
+    logger = logging.getLogger('bench_hot_paths')
+    logger.setLevel(logging.WARNING)
+    settings = SimpleNamespace(system_opt={'network_trace': {'rendering_delay': 10}}, logger=logger)
+    arrival_list = calc_arrival_ts(settings, dl_list, video_size, network_record)
+    frame_ts = np.arange(chunk_num * VIDEO_FPS) * 1000 / VIDEO_FPS + CHUNK_DURATION
+
+    def display_all_frames():
+        for curr_ts in frame_ts:
+            get_curr_display_chunks(arrival_list, curr_ts)
+
+    yield f'arrival.calc_arrival_ts[{tile_grid},{chunk_num} chunks]', \
+        lambda: calc_arrival_ts(settings, dl_list, video_size, network_record)
+    yield f'arrival.get_curr_display_chunks[{tile_grid},{len(frame_ts)} frames]', display_all_frames
+
+
+def json_cases(tile_grid, chunk_num, tmp_dir):
+    """Cases of writing the video json of a preprocessing run and the decision json of a decision run."""
+    cols, rows = parse_tile_grid(tile_grid)
+    video_size = make_video_size(RESOLUTIONS['4k'], cols, rows, chunk_num)
+    dl_list = make_dl_list(cols, rows, chunk_num)
+    video_json_path = osp.join(tmp_dir, 'video_size.json')
+    decision_json_path = osp.join(tmp_dir, 'decision.json')
+
+    def write_all_tiles():
+        if osp.exists(video_json_path):
+            os.remove(video_json_path)
+        for tile in video_size.values():
+            write_video_json(video_json_path, tile['video_size'], tile['chunk_info'], tile['user_video_spec'])
+
+    def write_all_decisions():
+        if osp.exists(decision_json_path):
+            os.remove(decision_json_path)
+        for decision in dl_list:
+            write_decision_json(decision_json_path, decision['decision_data']['system_ts'], [decision])
+
+    yield f'json.write_video_json[{tile_grid},{len(video_size)} tiles]', write_all_tiles
+    yield f'json.write_decision_json[{tile_grid},{len(dl_list)} decisions]', write_all_decisions
+
+
+def measure(func, repeat):
+    """Median and minimum duration of func over repeat calls after a warm-up call, in seconds."""
+    func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return {
+        'median_s': float(np.median(durations)),
+        'min_s': float(np.min(durations)),
+        'repeat': repeat
+    }
+
+
+def iter_cases(resolutions, tile_grids, chunk_num, json_chunk_num, tmp_dir):
+    """All cases as (name, func), whose inputs are built lazily such that large ones are freed early."""
+    for resolution_name in resolutions:
+        yield from projection_cases(resolution_name, RESOLUTIONS[resolution_name])
+        for tile_grid in tile_grids:
+            yield from tile_cases(resolution_name, RESOLUTIONS[resolution_name], tile_grid)
+        yield from metric_cases(resolution_name, RESOLUTIONS[resolution_name])
+    for tile_grid in tile_grids:
+        yield from arrival_cases(tile_grid, chunk_num)
+        yield from json_cases(tile_grid, json_chunk_num, tmp_dir)
+
+
+def run(resolutions, tile_grids, repeat, chunk_num, json_chunk_num, name_filter=None):
+    """
+    Run the benchmark.
+
+    Parameters
+    ----------
+    resolutions: list
+        keys of RESOLUTIONS
+    tile_grids: list
+        tile grids, with format 'COLSxROWS'
+    repeat: int
+        timed calls of each case
+    chunk_num: int
+        number of chunks of the arrival cases
+    json_chunk_num: int
+        number of chunks of the json cases, whose writes re-read the whole file
+    name_filter: str
+        only run the cases whose name contains it
+
+    Returns
+    -------
+    dict
+        {'environment', 'config', 'results': {case: {'median_s', 'min_s', 'repeat'}}}
+    """
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='e3po_bench_') as tmp_dir:
+        for name, func in iter_cases(resolutions, tile_grids, chunk_num, json_chunk_num, tmp_dir):
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(func, repeat)
+            print(f"{name:<72} {results[name]['median_s'] * 1000:10.2f} ms")
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {
+            'resolutions': resolutions,
+            'tile_grids': tile_grids,
+            'repeat': repeat,
+            'chunks': chunk_num,
+            'json_chunks': json_chunk_num
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the median durations with those of a baseline run.
+
+    Returns
+    -------
+    rows: list
+        one item per case of both runs, with format {'case', 'baseline_s', 'median_s', 'ratio', 'status'},
+        where status is 'regression', 'improvement' or 'ok'
+    """
+
+    rows = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        baseline_s = baseline['results'][name]['median_s']
+        ratio = result['median_s'] / baseline_s if baseline_s > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'case': name, 'baseline_s': baseline_s, 'median_s': result['median_s'],
+                     'ratio': ratio, 'status': status})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-resolutions', nargs='+', choices=list(RESOLUTIONS), default=list(RESOLUTIONS),
+                        help='erp resolutions of the source video')
+    parser.add_argument('-tile_grids', nargs='+', default=['4x3', '8x6', '16x8'], help='tile grids, COLSxROWS')
+    parser.add_argument('-repeat', type=int, default=5, help='timed calls of each case')
+    parser.add_argument('-chunks', type=int, default=10, help='chunks of the arrival cases')
+    parser.add_argument('-json_chunks', type=int, default=2, help='chunks of the json cases')
+    parser.add_argument('-filter', type=str, default=None, help='only run the cases whose name contains it')
+    parser.add_argument('-output', type=str, default=None, help='json file of the results')
+    parser.add_argument('-baseline', type=str, default=osp.join(osp.dirname(osp.abspath(__file__)), 'baseline.json'),
+                        help='json file of the baseline results')
+    parser.add_argument('-save_baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('-tolerance', type=float, default=0.2, help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    result = run(args.resolutions, args.tile_grids, args.repeat, args.chunks, args.json_chunks, args.filter)
+
+    if osp.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        result['comparison'] = compare(result, baseline, args.tolerance)
+        print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for row in result['comparison']:
+            print(f"{row['case']:<72} {row['baseline_s'] * 1000:10.2f} ms -> {row['median_s'] * 1000:10.2f} ms "
+                  f"{row['ratio']:6.2f}x {row['status']}")
+    elif not args.save_baseline:
+        print(f"\nno baseline at {args.baseline}, write one with -save_baseline")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+
+    regressions = [row['case'] for row in result.get('comparison', []) if row['status'] == 'regression']
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
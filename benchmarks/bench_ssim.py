@@ -0,0 +1,105 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+"""
+Benchmark of the cpu ssim, comparing the float64 dense-window reference with the float32 separable engine.
+
+Usage: python ./benchmarks/bench_ssim.py [-height 1920] [-width 1832] [-repeat 5] [-threads 8]
+"""
+
+import argparse
+import os.path as osp
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))), 'e3po'))
+import add_e3po_to_environment
+from e3po.utils import psnr_ssim
+
+
+def make_frame_pair(height, width, noise, seed=0):
+    """A smooth random frame and a noisy copy of it, in uint8."""
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(rng.random((height, width, 3)).astype(np.float32) * 255, (0, 0), 8)
+    frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX)
+    noisy = frame + rng.normal(0, noise, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8), np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def reference_ssim(img1, img2):
+    """The previous cpu ssim, i.e. _cal_ssim on each float64 channel."""
+    img1 = img1.astype(np.float64)
+    img2 = img2.astype(np.float64)
+    return np.mean([psnr_ssim._cal_ssim(img1[..., i], img2[..., i]) for i in range(img1.shape[2])])
+
+
+def time_call(func, repeat, *args):
+    """Result of func(*args) and its median duration over repeat calls, in seconds."""
+    result = func(*args)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return result, float(np.median(durations))
+
+
+def run(height, width, repeat, threads):
+    """
+    Run the benchmark.
+
+    Returns
+    -------
+    dict
+        median durations in seconds, speedup and the largest absolute ssim difference
+    """
+    psnr_ssim.SSIM_THREADS = threads
+    max_diff = 0
+    reference_time = fast_time = 0
+    for noise in (2, 10, 40):
+        img1, img2 = make_frame_pair(height, width, noise)
+        reference, _reference_time = time_call(reference_ssim, repeat, img1, img2)
+        fast, _fast_time = time_call(psnr_ssim._cal_ssim_fast, repeat, img1, img2)
+        max_diff = max(max_diff, abs(reference - fast))
+        reference_time += _reference_time
+        fast_time += _fast_time
+    return {
+        'reference_s': reference_time / 3,
+        'fast_s': fast_time / 3,
+        'speedup': reference_time / fast_time,
+        'max_abs_diff': max_diff
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-height', type=int, default=1920, help='frame height')
+    parser.add_argument('-width', type=int, default=1832, help='frame width')
+    parser.add_argument('-repeat', type=int, default=5, help='timed calls of each implementation')
+    parser.add_argument('-threads', type=int, default=psnr_ssim.SSIM_THREADS, help='threads of the fast ssim')
+    args = parser.parse_args()
+
+    result = run(args.height, args.width, args.repeat, args.threads)
+    print(f"reference ssim: {result['reference_s'] * 1000:.1f} ms/frame")
+    print(f"fast ssim:      {result['fast_s'] * 1000:.1f} ms/frame ({args.threads} threads)")
+    print(f"speedup:        {result['speedup']:.2f}x")
+    print(f"max |diff|:     {result['max_abs_diff']:.2e}")
+    assert result['max_abs_diff'] < 1e-4, '[error] fast ssim deviates from the reference'
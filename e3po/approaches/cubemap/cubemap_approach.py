@@ -22,11 +22,15 @@ import cv2
 import yaml
 import shutil
 import numpy as np
-from e3po.utils import get_logger
+from e3po.utils import get_logger, save_video_frame
 from e3po.utils.data_utilities import transcode_video, segment_video, resize_video
 from e3po.utils.decision_utilities import predict_motion_tile, tile_decision, generate_dl_list
-from e3po.utils.projection_utilities import fov_to_3d_polar_coord, _3d_polar_coord_to_pixel_coord,\
-    pixel_coord_to_tile, pixel_coord_to_relative_tile_coord
+from e3po.utils.motion_predictor import build_motion_predictor
+from e3po.utils.projection_utilities import pixel_coord_to_tile, pixel_coord_to_relative_tile_coord
+from e3po.utils.fov_context import FovContext
+
+# generate_display_result keeps no state in user_data between frames, so that frames can be evaluated in parallel
+RENDER_STATELESS = True
 
 
 def video_analysis(user_data, video_info):
@@ -110,6 +114,13 @@ def read_config():
 
     motion_history_size = opt['video']['hw_size'] * 1000
     motino_prediction_size = opt['video']['pw_size']
+    visibility_lut = {
+        "enable": opt['decision']['visibility_lut'],
+        "grid_step": opt['decision']['lut_grid_step'],
+        "margin": opt['decision']['lut_margin'],
+        "lut_folder": opt['decision']['lut_folder']
+    }
+    motion_predictor = opt['decision']['motion_predictor']
     ffmpeg_settings = opt['ffmpeg']
     if not ffmpeg_settings['ffmpeg_path']:
         assert shutil.which('ffmpeg'), '[error] ffmpeg doesn\'t exist'
@@ -136,7 +147,10 @@ def read_config():
         "motion_prediction_size": motino_prediction_size,
         "ffmpeg_settings": ffmpeg_settings,
         "projection_mode": projection_mode,     # source projection
-        "converted_projection_mode": converted_projection_mode
+        "converted_projection_mode": converted_projection_mode,
+        "visibility_lut": visibility_lut,
+        "motion_predictor": motion_predictor,
+        "decision_interval": opt['decision']['decision_interval']
     }
 
     return config_params
@@ -268,18 +282,21 @@ def download_decision(network_stats, motion_history, video_size, curr_ts, user_d
     if curr_ts == 0:  # initialize the related parameters
         user_data['next_download_idx'] = 0
         user_data['latest_decision'] = []
+        user_data['motion_predictor'] = build_motion_predictor(config_params['motion_predictor'])
     dl_list = []
     chunk_idx = user_data['next_download_idx']
     latest_decision = user_data['latest_decision']
 
     if user_data['next_download_idx'] >= video_info['duration'] / video_info['chunk_duration']:
+        user_data['next_wakeup_ts'] = float('inf')     # all chunks are decided, sleep until the next system event
         return dl_list, user_data
 
-    predicted_record = predict_motion_tile(motion_history, config_params['motion_history_size'], config_params['motion_prediction_size'])  # motion prediction
+    predicted_record = predict_motion_tile(motion_history, config_params['motion_history_size'], config_params['motion_prediction_size'], user_data['motion_predictor'])  # motion prediction
     tile_record = tile_decision(predicted_record, video_size, video_info['range_fov'], chunk_idx, user_data)     # tile decision
     dl_list = generate_dl_list(chunk_idx, tile_record, latest_decision, dl_list)
 
     user_data = update_decision_info(user_data, tile_record, curr_ts)  # update decision information
+    user_data['next_wakeup_ts'] = get_next_wakeup_ts(user_data, chunk_idx, curr_ts)
 
     return dl_list, user_data
 
@@ -327,16 +344,12 @@ def generate_display_result(curr_display_frames, current_display_chunks, curr_fo
     else:
         tile_list = current_display_chunks[-1]['tile_list']
 
-    avail_tile_list = []
-    for i in range(len(tile_list)):
-        tile_id = tile_list[i]['tile_id']
-        tile_idx = video_size[tile_id]['user_video_spec']['tile_info']['tile_idx']
-        avail_tile_list.append(tile_idx)
+    avail_tile_list = [tile_info['tile_idx'] for tile_info in tile_list]
 
-    # calculating fov_uv parameters
-    fov_ypr = [float(curr_fov['curr_motion']['yaw']), float(curr_fov['curr_motion']['pitch']), 0]
-    _3d_polar_coord = fov_to_3d_polar_coord(fov_ypr, curr_fov['range_fov'], curr_fov['fov_resolution'])
-    pixel_coord = _3d_polar_coord_to_pixel_coord(_3d_polar_coord, config_params['projection_mode'], [config_params['converted_height'], config_params['converted_width']])
+    # calculating fov_uv parameters, reusing the rays shared by E3PO for the current frame
+    fov_context = curr_fov.get('fov_context') or \
+        FovContext(curr_fov['curr_motion'], curr_fov['range_fov'], curr_fov['fov_resolution'])
+    pixel_coord = fov_context.get_pixel_coord(config_params['projection_mode'], [config_params['converted_height'], config_params['converted_width']])
 
     coord_tile_list = pixel_coord_to_tile(pixel_coord, config_params['total_tile_num'], video_size, chunk_idx)
     relative_tile_coord = pixel_coord_to_relative_tile_coord(pixel_coord, coord_tile_list, video_size, chunk_idx)
@@ -352,22 +365,50 @@ def generate_display_result(curr_display_frames, current_display_chunks, curr_fo
         if tile_idx != -1:
             dstMap_u, dstMap_v = cv2.convertMaps(relative_tile_coord[0].astype(np.float32), relative_tile_coord[1].astype(np.float32), cv2.CV_16SC2)
         else:
-            out_pixel_coord = _3d_polar_coord_to_pixel_coord(
-                _3d_polar_coord,
+            dstMap_u, dstMap_v = fov_context.get_remap(
                 config_params['background_info']['background_projection_mode'],
                 [config_params['background_height'], config_params['background_width']]
             )
-            dstMap_u, dstMap_v = cv2.convertMaps(out_pixel_coord[0].astype(np.float32), out_pixel_coord[1].astype(np.float32), cv2.CV_16SC2)
         remapped_frame = cv2.remap(curr_display_frames[i], dstMap_u, dstMap_v, cv2.INTER_LINEAR)
         display_img[hit_coord_mask] = remapped_frame[hit_coord_mask]
 
-    cv2.imwrite(dst_video_frame_uri, display_img, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    save_video_frame(dst_video_frame_uri, display_img)
 
     get_logger().debug(f'[evaluation] end get display img {frame_idx}')
 
     return user_data
 
 
+def get_next_wakeup_ts(user_data, chunk_idx, curr_ts):
+    """
+    Get the timestamp at which the next decision should be made.
+
+    Parameters
+    ----------
+    user_data: dict
+        user related parameters and information
+    chunk_idx: int
+        the chunk decided at curr_ts
+    curr_ts: int
+        current system timestamp
+
+    Returns
+    -------
+    next_wakeup_ts: float
+        the requested timestamp, None for the next tick
+    """
+
+    if user_data['next_download_idx'] != chunk_idx:      # the next chunk is decided from the next tick on
+        return None
+    video_info = user_data['video_info']
+    chunk_boundary_ts = video_info['pre_download_duration'] \
+        + user_data['next_download_idx'] * video_info['chunk_duration'] * 1000
+    decision_interval = user_data['config_params']['decision_interval']
+    if decision_interval:
+        return min(curr_ts + decision_interval, chunk_boundary_ts)
+    return chunk_boundary_ts
+
+
 def update_decision_info(user_data, tile_record, curr_ts):
     """
     update the decision information
@@ -21,9 +21,13 @@ import os
 import cv2
 import numpy as np
 import yaml
-from e3po.utils import get_logger
-from e3po.utils.projection_utilities import fov_to_3d_polar_coord
+from e3po.utils import get_logger, save_video_frame
+from e3po.utils.fov_context import FovContext
 from e3po.utils.json import get_tile_info
+from e3po.utils.tile_layout import encode_tile_id
+
+# generate_display_result keeps no state in user_data between frames, so that frames can be evaluated in parallel
+RENDER_STATELESS = True
 
 
 def video_analysis(user_data, video_info):
@@ -219,20 +223,19 @@ def generate_display_result(curr_display_frames, current_display_chunks, curr_fo
     if user_data is None or "video_info" not in user_data:
         user_data = init_user(user_data, video_info)
 
-    client_fov = [float(curr_fov['curr_motion']['yaw']), float(curr_fov['curr_motion']['pitch']), 0]
-
     frame_idx_temp = frame_idx
     if frame_idx_temp > len(current_display_chunks) - 1:
         frame_idx_temp = len(current_display_chunks) - 1
     server_fov = get_server_fov(video_size, frame_idx_temp)
 
-    # generate client image
-    _3d_polar_coord = fov_to_3d_polar_coord(client_fov, curr_fov['range_fov'], curr_fov['fov_resolution'])
-    coord_x_arr, coord_y_arr = _3d_polar_coord_to_pixel_coord(_3d_polar_coord, server_fov, user_data)
+    # generate client image, reusing the rays shared by E3PO for the current frame
+    fov_context = curr_fov.get('fov_context') or \
+        FovContext(curr_fov['curr_motion'], curr_fov['range_fov'], curr_fov['fov_resolution'])
+    coord_x_arr, coord_y_arr = _3d_polar_coord_to_pixel_coord(fov_context.polar_coord, server_fov, user_data)
     fov_result = generate_fov_img(curr_display_frames[0], coord_x_arr, coord_y_arr)
 
     # write the calculated fov image into file
-    cv2.imwrite(dst_video_frame_uri, fov_result, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    save_video_frame(dst_video_frame_uri, fov_result)
     get_logger().debug(f'[evaluation] end get display img {frame_idx}')
 
     return user_data
@@ -250,7 +253,7 @@ def get_server_fov(video_size, frame_idx):
     -------
 
     """
-    tile_id = f"chunk_{str(frame_idx).zfill(4)}_tile_{str(1).zfill(3)}"
+    tile_id = encode_tile_id(frame_idx, 1)
 
     tile_info = get_tile_info(video_size, tile_id)
 
@@ -25,6 +25,7 @@ from .base_data import BaseData
 from e3po.utils.json import write_video_json
 from e3po.utils.data_utilities import generate_source_video, update_chunk_info, \
     encode_dst_video, get_video_size, remove_temp_files, remove_temp_video
+from e3po.utils.profiler import get_profiler
 
 
 @data_registry.register()
@@ -75,12 +76,14 @@ class OnDemandData(BaseData):
 
         approach = importlib.import_module(self.approach_module_name)
         user_data = None
-        user_data = approach.video_analysis(user_data, self.video_info)
+        with get_profiler().timer('approach.video_analysis'):
+            user_data = approach.video_analysis(user_data, self.video_info)
         for chunk_idx in range(self.chunk_num):
             source_video_uri = generate_source_video(self, self.ori_video_uri, chunk_idx)
             chunk_info = update_chunk_info(self, chunk_idx)
             while True:
-                user_video_spec, user_data = approach.preprocess_video(source_video_uri, self.dst_video_folder, chunk_info, user_data, self.video_info)
+                with get_profiler().timer('approach.preprocess_video'):
+                    user_video_spec, user_data = approach.preprocess_video(source_video_uri, self.dst_video_folder, chunk_info, user_data, self.video_info)
                 if user_video_spec is None:
                     break
                 dst_video_uri = encode_dst_video(self, self.dst_video_folder, self.encoding_params, user_video_spec)
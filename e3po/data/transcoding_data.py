@@ -27,6 +27,8 @@ from e3po.utils.data_utilities import update_chunk_info, encode_dst_video, get_v
 from e3po.utils.json import write_video_json, update_video_json
 from e3po.utils.misc import generate_motion_clock
 from e3po.utils.network_trace import update_network
+from e3po.utils.history import MotionHistory, NetworkHistory
+from e3po.utils.profiler import get_profiler
 
 
 @data_registry.register()
@@ -74,14 +76,15 @@ class TranscodingData(BaseData):
 
         approach = importlib.import_module(self.approach_module_name)
         user_data = None
-        user_data = approach.video_analysis(user_data, self.video_info)
+        with get_profiler().timer('approach.video_analysis'):
+            user_data = approach.video_analysis(user_data, self.video_info)
         motion_record = pre_processing_client_log(self.system_opt)
         motion_clock = generate_motion_clock(self, motion_record)
         network_record = pre_processing_network_log(self.system_opt)
 
-        motion_history = []
+        motion_history = MotionHistory(self.system_opt['motion_trace']['history_capacity'])
         motion_history = update_motion(0, 0, motion_history, motion_record[0])
-        network_stats = []
+        network_stats = NetworkHistory(self.system_opt['network_trace']['history_capacity'])
         network_stats, network_last_idx = update_network(0, 0, network_stats, network_record)
 
         last_frame_idx = -1
@@ -96,7 +99,8 @@ class TranscodingData(BaseData):
                 continue
             curr_video_frame = extract_frame(self.video_info['uri'], curr_frame_idx, self.ffmpeg_settings)
             last_frame_idx = curr_frame_idx
-            dst_video_frame, user_video_spec, user_data = approach.transcode_video(curr_video_frame, curr_frame_idx, network_stats, motion_history, user_data, self.video_info)
+            with get_profiler().timer('approach.transcode_video'):
+                dst_video_frame, user_video_spec, user_data = approach.transcode_video(curr_video_frame, curr_frame_idx, network_stats, motion_history, user_data, self.video_info)
             dst_video_frame_uri = generate_dst_frame_uri(self.dst_video_folder, curr_frame_idx)
             save_video_frame(dst_video_frame_uri, dst_video_frame)
             frame_info = update_chunk_info(self, curr_frame_idx)
@@ -114,7 +118,8 @@ class TranscodingData(BaseData):
                 continue
             curr_video_frame = extract_frame(self.video_info['uri'], curr_frame_idx, self.ffmpeg_settings)
             last_frame_idx = curr_frame_idx
-            dst_video_frame, user_video_spec, user_data = approach.transcode_video(curr_video_frame, curr_frame_idx, network_stats, motion_history, user_data, self.video_info)
+            with get_profiler().timer('approach.transcode_video'):
+                dst_video_frame, user_video_spec, user_data = approach.transcode_video(curr_video_frame, curr_frame_idx, network_stats, motion_history, user_data, self.video_info)
             dst_video_frame_uri = generate_dst_frame_uri(self.dst_video_folder, curr_frame_idx)
             save_video_frame(dst_video_frame_uri, dst_video_frame)
             frame_info = update_chunk_info(self, curr_frame_idx)
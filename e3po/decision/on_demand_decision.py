@@ -27,6 +27,9 @@ from e3po.utils.json import write_decision_json
 from e3po.utils.misc import generate_motion_clock
 from e3po.utils.misc import update_motion
 from e3po.utils.network_trace import update_network
+from e3po.utils.history import MotionHistory, NetworkHistory
+from e3po.utils.scheduler import EventScheduler, next_wakeup_tick, schedule_download_completions
+from e3po.utils.profiler import get_profiler
 
 @decision_registry.register()
 class OnDemandDecision(BaseDecision):
@@ -74,26 +77,48 @@ class OnDemandDecision(BaseDecision):
         """
 
         curr_ts = 0
-        motion_history = []
+        motion_history = MotionHistory(self.system_opt['motion_trace']['history_capacity'])
         motion_record = pre_processing_client_log(self.system_opt)
         motion_clock = generate_motion_clock(self, motion_record)
 
         network_record = pre_processing_network_log(self.system_opt)
-        network_stats = []
+        network_stats = NetworkHistory(self.system_opt['network_trace']['history_capacity'])
 
         approach = importlib.import_module(self.approach_module_name)
         user_data = None
         # pre_download_duration
         motion_history = update_motion(0, curr_ts, motion_history, motion_record[0])
         network_stats, network_last_idx = update_network(curr_ts, 0, network_stats, network_record)
-        dl_list, user_data = approach.download_decision(network_stats, motion_history, self.video_size, curr_ts, user_data, self.video_info)
+        with get_profiler().timer('approach.download_decision'):
+            dl_list, user_data = approach.download_decision(network_stats, motion_history, self.video_size, curr_ts, user_data, self.video_info)
         write_decision_json(self.decision_json_uri, curr_ts, dl_list)
 
-        # after pre_download_duration
-        for motion_ts in motion_clock:
-            curr_ts = motion_ts + self.pre_download_duration
-            motion_history = update_motion(motion_ts, curr_ts, motion_history, motion_record[motion_ts])
-            dl_list, user_data = approach.download_decision(network_stats, motion_history, self.video_size, curr_ts, user_data, self.video_info)
-            write_decision_json(self.decision_json_uri, curr_ts, dl_list)
+        # after pre_download_duration, the approach is only woken on the ticks it requested, or on system events
+        scheduler = EventScheduler()
+        link_idle_ts = schedule_download_completions(scheduler, network_record, dl_list, self.video_size)
+        chunk_duration = int(self.video_info['chunk_duration'] * 1000)
+        for chunk_start_ts in range(0, int(self.video_duration * 1000), chunk_duration):
+            scheduler.schedule(chunk_start_ts + self.pre_download_duration, 'chunk_boundary')
+        for start_ms in network_record.start_ms.tolist():
+            scheduler.schedule(start_ms, 'network_boundary')
+        scheduler.pop_until(curr_ts)
+
+        ticks = [motion_ts + self.pre_download_duration for motion_ts in motion_clock]
+        motion_idx = 0
+        tick_idx = next_wakeup_tick(ticks, 0, user_data, scheduler)
+        while tick_idx < len(ticks):
+            curr_ts = ticks[tick_idx]
+            for motion_ts in motion_clock[motion_idx:tick_idx + 1]:      # catch up on the motion samples
+                motion_history = update_motion(motion_ts, motion_ts + self.pre_download_duration, motion_history, motion_record[motion_ts])
+            motion_idx = tick_idx + 1
+            scheduler.pop_until(curr_ts)
+            network_stats, network_last_idx = update_network(curr_ts, network_last_idx, network_stats, network_record)
+            with get_profiler().timer('approach.download_decision'):
+                dl_list, user_data = approach.download_decision(network_stats, motion_history, self.video_size, curr_ts, user_data, self.video_info)
+            if dl_list:
+                write_decision_json(self.decision_json_uri, curr_ts, dl_list)
+                link_idle_ts = schedule_download_completions(scheduler, network_record, dl_list, self.video_size,
+                                                             link_idle_ts)
+            tick_idx = next_wakeup_tick(ticks, tick_idx + 1, user_data, scheduler)
 
         self.logger.info(f"on_demand decision end.")
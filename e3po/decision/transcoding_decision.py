@@ -20,6 +20,7 @@
 from e3po.utils.registry import decision_registry
 from .base_decision import BaseDecision
 from e3po.utils.json import write_decision_json
+from e3po.utils.tile_layout import encode_tile_id
 
 
 @decision_registry.register()
@@ -61,7 +62,7 @@ class TranscodingDecision(BaseDecision):
             curr_frame_idx = int(curr_ts * self.video_info['video_fps'] // 1000.0)
             if curr_frame_idx == last_frame_idx:
                 continue
-            tile_id = [f"chunk_{str(curr_frame_idx).zfill(4)}_tile_{str(1).zfill(3)}"]
+            tile_id = [encode_tile_id(curr_frame_idx, 1)]
             dl_list = {
                 "chunk_idx": curr_frame_idx,
                 "decision_data": {"tile_info": tile_id}
@@ -20,7 +20,53 @@
 import os.path as osp
 import os
 import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from e3po.utils import get_logger
+from e3po.utils.tile_decoder import build_tile_decoder_pool
+from e3po.utils.frame_sink import AsyncImageWriter, FrameSink, set_frame_sink
+from e3po.utils.metric_sampling import build_metric_sampler
+from e3po.utils.vmaf import VmafStream, merge_vmaf_logs
+from e3po.utils.video_encoder import VideoEncodeStream, concat_videos
+from e3po.utils.pipeline import build_frame_pipeline
+from e3po.utils.evaluation_utilities import generate_benchmark_result
+from e3po.utils.psnr_ssim import calculate_psnr_ssim_mse
+from e3po.utils.profiler import Profiler, get_profiler, set_profiler
+from e3po.utils.benchmark_store import get_benchmark_store, get_benchmark_meta, get_benchmark_key
+
+# evaluator of the frame shards, inherited by the forked worker processes
+_shard_context = None
+
+
+def get_part_uri(uri, part_idx):
+    """Uri of a part of the file, e.g. output.part0.mp4, or the uri itself if part_idx is None."""
+    if part_idx is None:
+        return uri
+    root, ext = osp.splitext(uri)
+    return f"{root}.part{part_idx}{ext}"
+
+
+def _evaluate_shard(part_idx, frame_events):
+    """Evaluate a contiguous range of the frames in a worker process, with its own resources."""
+    evaluator, approach, arrival_list, motion_record, video_size = _shard_context
+    set_profiler(Profiler(enabled=get_profiler().enabled, trace=get_profiler().trace))      # only the stages of this shard
+    evaluator.open_frame_resources(part_idx)
+    evaluator.psnr, evaluator.ssim, evaluator.mse, evaluator.metric_frames = [], [], [], []
+    evaluation_result = evaluator.evaluate_frames(approach, frame_events, arrival_list, motion_record, video_size)
+    vmaf_frame_num = evaluator.vmaf_stream.frame_num if evaluator.vmaf_stream is not None else 0
+    evaluator.release_resources()
+
+    return {
+        'evaluation_result': evaluation_result,
+        'psnr': evaluator.psnr,
+        'ssim': evaluator.ssim,
+        'mse': evaluator.mse,
+        'metric_frames': evaluator.metric_frames,
+        'decode_stats': evaluator.decode_stats,
+        'decoder_stats': evaluator.tile_decoder_pool.get_stats(),
+        'vmaf': (evaluator.vmaf_score, vmaf_frame_num),
+        'profile': get_profiler().get_state()
+    }
 
 
 class BaseEvaluation:
@@ -69,6 +115,7 @@ class BaseEvaluation:
         self.psnr_flag = self.system_opt['metric']['psnr_flag']
         self.ssim_flag = self.system_opt['metric']['ssim_flag']
         self.save_benchmark_flag = self.system_opt['metric']['save_benchmark_flag']
+        self.save_result_img_flag = self.system_opt['metric']['save_result_img_flag']
         self.benchmark_img_path = osp.join(
             self.opt['project_path'],
             'result',
@@ -78,13 +125,23 @@ class BaseEvaluation:
         )
         if self.save_benchmark_flag:
             os.makedirs(self.benchmark_img_path, exist_ok=True)
+        # ground-truth fov frames shared by all approaches, keyed by video, motion trace and fov settings
+        if self.system_opt['metric'].get('benchmark_store', True):
+            self.benchmark_store = get_benchmark_store(self.system_opt, self.opt['project_path'], self.ori_video_uri)
+        else:
+            self.benchmark_store = None
         self.pipe = None
+        # the benchmark video is keyed like the store, such that it is only reused for the same motion trace and fov
         self.benchmark_video_uri = osp.join(
-            self.benchmark_img_path,
+            self.opt['project_path'],
+            'result',
+            'benchmark_store',
+            get_benchmark_key(get_benchmark_meta(self.system_opt, self.ori_video_uri)),
             'benchmark.mp4'
         )
 
         self.psnr_ssim_frequency = self.system_opt['metric']['psnr_ssim_frequency']
+        self.metric_sampler = build_metric_sampler(self.system_opt)          # frames whose psnr, ssim and mse are calculated
         self.use_gpu = self.system_opt['metric']['use_gpu']
         self.video_dir = self.system_opt['video']['origin']['video_dir']
 
@@ -102,14 +159,11 @@ class BaseEvaluation:
             shutil.rmtree(self.result_img_path)
         os.makedirs(self.result_img_path, exist_ok=True)
 
-        self.frame_extractor = {}       # storing cv2.VideoCapture class objects
-        self.frame_idx = {}             # record the sequence number of the current extracted frame
-        self.last_frame = {}            # record the last extracted frame for each video.
-
         # data indicators to be counted
         self.psnr = []
         self.ssim = []
         self.mse = []
+        self.metric_frames = []         # index of the frames of the above metric values
 
         # evaluation result path
         self.evaluation_json_path = osp.join(
@@ -120,6 +174,12 @@ class BaseEvaluation:
             self.approach_folder_name,
             'evaluation.json'
         )
+        self.vmaf_log_path = osp.join(osp.dirname(self.evaluation_json_path), 'vmaf.json')
+        self.vmaf_opt = self.system_opt['metric'].get('vmaf') or {}
+        # vmaf is computed while evaluating, and like the image path only over every frame, since it is temporal
+        self.vmaf_streaming = self.vmaf_opt.get('streaming', True) and VmafStream.is_supported() \
+            and self.metric_sampler.is_full
+        self.vmaf_score = None
         try:
             if osp.exists(self.evaluation_json_path):
                 os.remove(self.evaluation_json_path)
@@ -178,6 +238,200 @@ class BaseEvaluation:
         self.encoding_params = self.system_opt['encoding_params']
         self.chunk_frame_num = self.video_fps * self.video_info['chunk_duration']
 
+        # the fov videos are encoded while evaluating, from the frames piped into ffmpeg
+        self.streaming_encode = self.ffmpeg_settings.get('streaming_encode', True)
+        # the benchmark video needs every frame, which is only rendered when no metric sampling is applied
+        self.encode_benchmark_video = self.streaming_encode and self.save_benchmark_flag \
+            and self.metric_sampler.is_full and not osp.exists(self.benchmark_video_uri)
+        if self.encode_benchmark_video:
+            os.makedirs(osp.dirname(self.benchmark_video_uri), exist_ok=True)
+        self.encode_output_video = self.streaming_encode and self.save_result_img_flag
+        self.output_video_uri = osp.join(self.result_img_path, 'output.mp4')
+
+        # processes sharing the frames of render-stateless approaches
+        self.frame_processes = (self.system_opt.get('pipeline') or {}).get('processes') or os.cpu_count() or 1
+
+        self.open_frame_resources()
+
+    def open_frame_resources(self, part_idx=None):
+        """
+        Create the resources of the frame loop, i.e. tile decoders, frame writers, vmaf stream and video encoders,
+        which belong to one process.
+
+        Parameters
+        ----------
+        part_idx: int
+            index of the frame shard evaluated by this process, whose vmaf log and videos are written as parts
+        """
+        self.tile_decoder_pool = build_tile_decoder_pool(self.system_opt)   # sequential decoders of the tile videos
+        self.prefetch_chunk_idx = None                                      # the chunk whose tiles have been prefetched
+        self.decode_stats = {'available_tiles': 0, 'decoded_tiles': 0}      # tile frames handed to / decoded for approaches
+
+        # generated frames are handed to the metrics in memory, and written to disk in the background
+        self.benchmark_writer = AsyncImageWriter()
+        self.frame_sink = FrameSink(self.result_img_path, AsyncImageWriter() if self.save_result_img_flag else None)
+
+        self.vmaf_stream = None
+        if self.vmaf_streaming:
+            self.vmaf_stream = VmafStream(self.ffmpeg_settings['ffmpeg_path'], self.system_opt['video']['video_fps'],
+                                          self.vmaf_opt, get_part_uri(self.vmaf_log_path, part_idx))
+        self.benchmark_encoder = None
+        if self.encode_benchmark_video:
+            self.benchmark_encoder = VideoEncodeStream(self.ffmpeg_settings, self.encoding_params,
+                                                       get_part_uri(self.benchmark_video_uri, part_idx))
+        self.output_encoder = None
+        if self.encode_output_video:
+            self.output_encoder = VideoEncodeStream(self.ffmpeg_settings, self.encoding_params,
+                                                    get_part_uri(self.output_video_uri, part_idx))
+
+    def release_resources(self):
+        """
+        Close the tile decoders, finish writing the generated frames, and finish the vmaf calculation and
+        the video encoding.
+        """
+        set_frame_sink(None)
+        self.frame_sink.close()
+        self.benchmark_writer.close()
+        self.tile_decoder_pool.close()
+        if self.vmaf_stream is not None:
+            self.vmaf_score = self.vmaf_stream.close()
+        for encoder in (self.benchmark_encoder, self.output_encoder):
+            if encoder is not None:
+                encoder.close()
+
+    def evaluate_frames(self, approach, frame_events, arrival_list, motion_record, video_size):
+        """
+        Evaluate the given frames, which is implemented by each evaluation.
+
+        Parameters
+        ----------
+        approach: module
+            the approach
+        frame_events: list
+            each item with format (motion_ts, frame_idx), see generate_frame_events
+        arrival_list: ArrivalTable or dict
+            the calculated available tile chunks list
+        motion_record: MotionTrace
+            the motion trace
+        video_size: dict
+            the video size after video preprocessing
+
+        Returns
+        -------
+        evaluation_result: list
+            the evaluation result of each frame
+        """
+        raise NotImplementedError
+
+    def run_frame_events(self, approach, frame_events, arrival_list, motion_record, video_size):
+        """
+        Evaluate all frames and release the resources of the frame loop.
+
+        Approaches declaring RENDER_STATELESS = True, i.e. whose generate_display_result keeps no state in user_data
+        between frames, are evaluated by several processes, each one evaluating a contiguous range of the frames
+        with its own decoders. The results are merged in frame order, and the videos and vmaf of the ranges are
+        combined. Other approaches are evaluated frame by frame in this process.
+
+        Returns
+        -------
+        evaluation_result: list
+            the evaluation result of each frame
+        """
+
+        processes = min(self.frame_processes, len(frame_events))
+        if not getattr(approach, 'RENDER_STATELESS', False) or processes <= 1 \
+                or 'fork' not in multiprocessing.get_all_start_methods():
+            evaluation_result = self.evaluate_frames(approach, frame_events, arrival_list, motion_record, video_size)
+            self.release_resources()
+            return evaluation_result
+
+        self.release_resources()        # the frames are evaluated by the worker processes
+        bounds = [len(frame_events) * part_idx // processes for part_idx in range(processes + 1)]
+        self.logger.info(f"[evaluation] {len(frame_events)} frames of the render-stateless approach are evaluated "
+                         f"by {processes} processes")
+
+        global _shard_context
+        _shard_context = (self, approach, arrival_list, motion_record, video_size)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as executor:
+                futures = [executor.submit(_evaluate_shard, part_idx, frame_events[bounds[part_idx]:bounds[part_idx + 1]])
+                           for part_idx in range(processes)]
+                shards = [future.result() for future in futures]
+        finally:
+            _shard_context = None
+
+        evaluation_result = []
+        for shard in shards:
+            evaluation_result += shard['evaluation_result']
+            self.psnr += shard['psnr']
+            self.ssim += shard['ssim']
+            self.mse += shard['mse']
+            self.metric_frames += shard['metric_frames']
+            for key in self.decode_stats:
+                self.decode_stats[key] += shard['decode_stats'][key]
+            self.tile_decoder_pool.merge_stats(shard['decoder_stats'])
+            get_profiler().merge(shard['profile'])
+        self.last_img_index = frame_events[-1][1]
+
+        if self.vmaf_streaming:
+            # the logs of the parts are joined, with the score pooled over all frames
+            part_logs = [(get_part_uri(self.vmaf_log_path, part_idx), shard['vmaf'][1])
+                         for part_idx, shard in enumerate(shards) if shard['vmaf'][1] > 0]
+            if part_logs and all(shard['vmaf'][0] is not None for shard in shards if shard['vmaf'][1] > 0):
+                self.vmaf_score = merge_vmaf_logs(part_logs, self.vmaf_log_path)
+        for encode, video_uri in ((self.encode_benchmark_video, self.benchmark_video_uri),
+                                  (self.encode_output_video, self.output_video_uri)):
+            if encode:
+                part_uris = [get_part_uri(video_uri, part_idx) for part_idx in range(processes)]
+                concat_videos(self.ffmpeg_settings, [uri for uri in part_uris if osp.exists(uri)], video_uri)
+
+        return evaluation_result
+
+    def build_frame_pipeline(self):
+        """
+        Build the pipeline of the per-frame work following the approach, i.e. benchmark rendering, metric
+        calculation and the ordered outputs, which overlaps for consecutive frames.
+
+        Each item is a dict {'frame_idx', 'curr_fov', 'dst_video_frame', 'result'}, where result is the
+        evaluation result of the frame, whose psnr, ssim and mse are filled in by the pipeline.
+
+        Returns
+        -------
+        FramePipeline
+            the pipeline, which should be closed after the last frame
+        """
+        return build_frame_pipeline(self.system_opt, [('benchmark', self._render_benchmark),
+                                                      ('metric', self._calculate_metrics)], self._output_frame)
+
+    def _render_benchmark(self, item):
+        if self.metric_sampler.is_sampled(item['frame_idx']):
+            item['dst_benchmark_frame'] = generate_benchmark_result(self, item['curr_fov'], item['frame_idx'])
+        else:                   # neither the benchmark nor the metrics are needed for this frame
+            item['dst_benchmark_frame'] = None
+        return item
+
+    def _calculate_metrics(self, item):
+        if item['dst_benchmark_frame'] is not None:
+            psnr, ssim, mse = calculate_psnr_ssim_mse(item['dst_benchmark_frame'], item['dst_video_frame'],
+                                                      self.use_gpu, self.psnr_flag, self.ssim_flag)
+            item['result'].update({'psnr': psnr, 'ssim': ssim, 'mse': mse})
+        return item
+
+    def _output_frame(self, item):
+        # called in frame order
+        if self.output_encoder is not None:
+            self.output_encoder.push(item['dst_video_frame'])
+        if item['dst_benchmark_frame'] is None:
+            return
+        if self.benchmark_encoder is not None:
+            self.benchmark_encoder.push(item['dst_benchmark_frame'])
+        if self.vmaf_stream is not None:
+            self.vmaf_stream.push(item['dst_video_frame'], item['dst_benchmark_frame'])
+        self.psnr.append(item['result']['psnr'])
+        self.ssim.append(item['result']['ssim'])
+        self.mse.append(item['result']['mse'])
+        self.metric_frames.append(item['frame_idx'])
+
     def set_base_ts(self, base_ts):
         """Set starting timestamp of client motion trace."""
         self.base_ts = base_ts
@@ -23,8 +23,10 @@ from .base_eval import BaseEvaluation
 from e3po.utils.json import read_decision_json, read_video_json
 from e3po.utils.evaluation_utilities import *
 from e3po.utils import pre_processing_client_log, pre_processing_network_log, write_evaluation_json
-from e3po.utils.psnr_ssim import calculate_psnr_ssim_mse
 from e3po.utils.misc import generate_motion_clock, generate_dst_frame_uri
+from e3po.utils.scheduler import generate_frame_events
+from e3po.utils.frame_sink import set_frame_sink
+from e3po.utils.profiler import get_profiler
 
 
 @evaluation_registry.register()
@@ -62,27 +64,45 @@ class TranscodingEvaluation(BaseEvaluation):
         motion_clock = generate_motion_clock(self, motion_record)
 
         approach = importlib.import_module(self.approach_module_name)
+        frame_events = generate_frame_events(motion_clock, self.video_fps)     # only ticks with a new frame
+        evaluation_result += self.run_frame_events(approach, frame_events, arrival_list, motion_record, video_size)
+        encode_display_video(self)
+        evaluation_result.append(evaluate_misc(self, arrival_list, video_size))
+        if self.opt.get('profile_path'):        # the summary is only part of the results when profiling
+            evaluation_result.append([{'Profile': get_profiler().summary()}])
+        write_evaluation_json(evaluation_result, self.evaluation_json_path)
+
+        self.logger.info(f"transcoding evaluation end.")
+
+    def evaluate_frames(self, approach, frame_events, arrival_list, motion_record, video_size):
+        """
+        Evaluate the given frames, see BaseEvaluation.evaluate_frames.
+
+        Returns
+        -------
+        evaluation_result: list
+            the evaluation result of each frame
+        """
+
+        evaluation_result = []
         user_data = None
-        for motion_ts in motion_clock:
-            curr_ts = motion_ts + pre_downloading_duration
-            frame_idx = int(motion_ts * self.video_fps // 1000.0)
-            if self.last_img_index == frame_idx:
-                continue
+        set_frame_sink(self.frame_sink)
+        frame_pipeline = self.build_frame_pipeline()
+        for motion_ts, frame_idx in frame_events:
+            curr_ts = motion_ts + self.base_ts
             self.last_img_index = frame_idx
 
             current_display_chunks = get_curr_display_chunks(arrival_list, curr_ts)
             curr_display_frames = get_curr_display_frames(self, current_display_chunks, curr_ts, frame_idx)
             dst_video_frame_uri = generate_dst_frame_uri(self.result_img_path, frame_idx)
             curr_fov = update_curr_fov(self.curr_fov, motion_record[motion_ts])
-            user_data = approach.generate_display_result(curr_display_frames, current_display_chunks, curr_fov, dst_video_frame_uri, frame_idx, video_size, user_data, self.video_info)
-            dst_benchmark_frame_uri = generate_benchmark_result(self, curr_fov, frame_idx)
-            psnr, ssim, mse = calculate_psnr_ssim_mse(dst_benchmark_frame_uri, dst_video_frame_uri, self.use_gpu, self.psnr_flag, self.ssim_flag)
-            self.psnr.append(psnr)
-            self.ssim.append(ssim)
-            self.mse.append(mse)
-            evaluation_result.append([{'frame_idx': frame_idx, 'psnr': psnr, 'ssim': ssim, 'mse': mse, 'yaw': curr_fov['curr_motion']['yaw'], 'pitch': curr_fov['curr_motion']['pitch'], 'motion_ts': motion_ts}])
-        encode_display_video(self)
-        evaluation_result.append(evaluate_misc(self, arrival_list, video_size))
-        write_evaluation_json(evaluation_result, self.evaluation_json_path)
+            with get_profiler().timer('approach.generate_display_result'):
+                user_data = approach.generate_display_result(curr_display_frames, current_display_chunks, curr_fov, dst_video_frame_uri, frame_idx, video_size, user_data, self.video_info)
+            dst_video_frame = self.frame_sink.take(dst_video_frame_uri)
+            frame_result = {'frame_idx': frame_idx, 'psnr': None, 'ssim': None, 'mse': None, 'yaw': curr_fov['curr_motion']['yaw'], 'pitch': curr_fov['curr_motion']['pitch'], 'motion_ts': motion_ts}
+            evaluation_result.append([frame_result])
+            # the benchmark and metrics of the frame are calculated while the approach renders the next ones
+            frame_pipeline.put({'frame_idx': frame_idx, 'curr_fov': dict(curr_fov), 'dst_video_frame': dst_video_frame, 'result': frame_result})
+        frame_pipeline.close()
 
-        self.logger.info(f"transcoding evaluation end.")
\ No newline at end of file
+        return evaluation_result
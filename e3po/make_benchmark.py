@@ -0,0 +1,31 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import add_e3po_to_environment
+from e3po.utils import get_opt, get_logger
+from e3po.utils.profiler import write_profile
+from e3po.utils.benchmark_utilities import BenchmarkRenderer
+
+if __name__ == '__main__':
+    opt = get_opt(approach_required=False)
+    get_logger().info('[making benchmark] start')
+    renderer = BenchmarkRenderer(opt)
+    renderer.make_benchmark()
+    get_logger().info('[making benchmark] end')
+    write_profile(opt)
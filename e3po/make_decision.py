@@ -20,6 +20,7 @@
 import add_e3po_to_environment
 from e3po.decision import build_decision
 from e3po.utils import get_opt, get_logger
+from e3po.utils.profiler import write_profile
 
 if __name__ == '__main__':
     opt = get_opt()
@@ -27,3 +28,4 @@ if __name__ == '__main__':
     decision = build_decision(opt)
     decision.make_decision()
     get_logger().info('[make decision] end')
+    write_profile(opt)
@@ -20,10 +20,12 @@
 import add_e3po_to_environment
 from e3po.evaluation import build_evaluation
 from e3po.utils import get_opt, get_logger
+from e3po.utils.profiler import write_profile
 
 if __name__ == '__main__':
     opt = get_opt()
     get_logger().info('[evaluation] start')
     evaluation = build_evaluation(opt)
     evaluation.make_evaluation()
-    get_logger().info('[evaluation] end')
\ No newline at end of file
+    get_logger().info('[evaluation] end')
+    write_profile(opt)
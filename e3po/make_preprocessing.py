@@ -20,6 +20,7 @@
 import add_e3po_to_environment
 from e3po.data import build_data
 from e3po.utils import get_opt, get_logger
+from e3po.utils.profiler import write_profile
 
 if __name__ == '__main__':
     opt = get_opt()
@@ -27,3 +28,4 @@ if __name__ == '__main__':
     data = build_data(opt)
     data.make_preprocessing()
     get_logger().info('[preprocessing data] end')
+    write_profile(opt)
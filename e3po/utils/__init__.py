@@ -25,6 +25,9 @@ from .json import write_evaluation_json, read_decision_json, read_video_json, ge
 from .psnr_ssim import calculate_psnr_ssim_mse
 from .evaluation_utilities import extract_frame
 from .network_trace import pre_processing_network_log
+from .fov_context import FovContext
+from .tile_layout import encode_tile_id, decode_tile_id
+from .history import MotionHistory, NetworkHistory
 
 __all__ = [
     # options.py
@@ -51,6 +54,17 @@ __all__ = [
     # eval_utilities.py
     'extract_frame',
 
+    # fov_context.py
+    'FovContext',
+
+    # tile_layout.py
+    'encode_tile_id',
+    'decode_tile_id',
+
+    # history.py
+    'MotionHistory',
+    'NetworkHistory',
+
     # logger.py
     'get_logger',
 ]
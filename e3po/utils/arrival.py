@@ -0,0 +1,345 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+import numpy as np
+from e3po.utils.tile_layout import decode_tile_id, get_tile_index
+from e3po.utils.network_trace import NetworkTrace
+
+# one row per decision, i.e. per downloaded group of tiles
+DECISION_DTYPE = np.dtype([
+    ('system_ts', np.float64),
+    ('chunk_idx', np.int64),
+    ('bytes', np.float64),
+])
+
+
+def build_decision_table(dl_list, video_size):
+    """
+    Convert the decision log into arrays.
+
+    Parameters
+    ----------
+    dl_list: list
+        the decided and downloaded tile list, see read_decision_json
+    video_size: dict
+        the video size after video preprocessing
+
+    Returns
+    -------
+    rows: array
+        structured array with dtype DECISION_DTYPE, one item per decision
+    tiles: dict
+        one item per downloaded tile, in decision order, with format
+        {'row': array, 'size': array, 'tile_idx': array, 'tile_id': list}, where row is the index of its decision
+    """
+
+    tile_index = get_tile_index(video_size)
+    tile_rows, tile_sizes, tile_idx, tile_id = [], [], [], []
+
+    for row_idx, row in enumerate(dl_list):
+        for _tile_id in row['decision_data']['tile_info']:
+            tile_key = decode_tile_id(_tile_id)        # string ids end at the json boundary
+            tile_rows.append(row_idx)
+            tile_sizes.append(tile_index.get_size(*tile_key))
+            tile_idx.append(tile_index.get_spec_tile_idx(*tile_key))
+            tile_id.append(_tile_id)
+
+    tile_rows = np.asarray(tile_rows, dtype=np.int64)
+    tile_sizes = np.asarray(tile_sizes)
+    rows = np.zeros(len(dl_list), dtype=DECISION_DTYPE)
+    rows['system_ts'] = [row['decision_data']['system_ts'] for row in dl_list]
+    rows['chunk_idx'] = [row['chunk_idx'] for row in dl_list]
+    rows['bytes'] = np.bincount(tile_rows, weights=tile_sizes, minlength=len(rows))
+    tiles = {
+        'row': tile_rows,
+        'size': tile_sizes,
+        'tile_idx': np.asarray(tile_idx, dtype=np.int64),
+        'tile_id': tile_id
+    }
+
+    return rows, tiles
+
+
+class ArrivalTable:
+    """
+    Arrival timestamps of all downloaded tiles, stored as flat arrays grouped by chunk.
+
+    The tiles of chunk c are tile_*[offsets[i]:offsets[i + 1]] with i = chunk_slot[c], in decision order.
+    The table can also be accessed as the legacy dict
+    {chunk_idx: {'chunk_idx', 'chunk_size', 'tile_list': [{'playable_ts', 'tile_id', 'tile_idx'}]}},
+    whose items are built on first access and then shared.
+
+    Parameters
+    ----------
+    chunk_idx: array
+        chunk index of each tile
+    playable_ts: array
+        playable timestamp of each tile
+    tile_idx: array
+        tile index of each tile
+    tile_id: list
+        string tile id of each tile
+    tile_size: array
+        size of each tile, in bytes
+    """
+
+    def __init__(self, chunk_idx, playable_ts, tile_idx, tile_id, tile_size):
+        order = np.argsort(chunk_idx, kind='stable')
+        self.tile_chunk_idx = np.asarray(chunk_idx, dtype=np.int64)[order]
+        self.tile_playable_ts = np.asarray(playable_ts, dtype=np.float64)[order]
+        self.tile_idx = np.asarray(tile_idx, dtype=np.int64)[order]
+        self.tile_id = [tile_id[i] for i in order]
+
+        self.chunks, starts = np.unique(self.tile_chunk_idx, return_index=True)
+        self.offsets = np.append(starts, len(order)).astype(np.int64)
+        self.chunk_slot = {chunk: slot for slot, chunk in enumerate(self.chunks.tolist())}
+
+        tile_size = np.asarray(tile_size)
+        self.chunk_size = np.add.reduceat(tile_size[order], starts) if len(order) else tile_size[:0]
+        self._items = {}
+        self._index = None
+
+    def tile_slice(self, chunk_idx):
+        """Range of the tiles of chunk_idx in the flat arrays."""
+        slot = self.chunk_slot[chunk_idx]
+        return slice(int(self.offsets[slot]), int(self.offsets[slot + 1]))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, chunk_idx):
+        return chunk_idx in self.chunk_slot
+
+    def __getitem__(self, chunk_idx):
+        item = self._items.get(chunk_idx)
+        if item is None:
+            if chunk_idx not in self.chunk_slot:
+                raise KeyError(chunk_idx)
+            tiles = self.tile_slice(chunk_idx)
+            item = {
+                'chunk_idx': chunk_idx,
+                'chunk_size': self.chunk_size[self.chunk_slot[chunk_idx]].item(),
+                'tile_list': [
+                    {'playable_ts': playable_ts, 'tile_id': tile_id, 'tile_idx': tile_idx}
+                    for playable_ts, tile_id, tile_idx in zip(self.tile_playable_ts[tiles].tolist(),
+                                                              self.tile_id[tiles],
+                                                              self.tile_idx[tiles].tolist())
+                ]
+            }
+            self._items[chunk_idx] = item
+        return item
+
+    def keys(self):
+        return self.chunks.tolist()
+
+    def values(self):
+        return [self[chunk_idx] for chunk_idx in self.keys()]
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def get_index(self):
+        """The display index of the table, which is built on first use."""
+        if self._index is None:
+            self._index = ArrivalIndex(self)
+        return self._index
+
+
+class TileListView(Sequence):
+    """
+    Read-only view of the first count tiles of a chunk, each one with format {'playable_ts', 'tile_id', 'tile_idx'}.
+
+    Parameters
+    ----------
+    tiles: list
+        the read-only tile items of the chunk
+    count: int
+        number of visible tiles
+    """
+
+    __slots__ = ('_tiles', '_count')
+
+    def __init__(self, tiles, count):
+        self._tiles = tiles
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._tiles[i] for i in range(*idx.indices(self._count))]
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError('tile list index out of range')
+        return self._tiles[idx]
+
+
+class ChunkView(Mapping):
+    """
+    Read-only view of a partially playable chunk, which can be accessed as the legacy dict
+    {'chunk_idx', 'chunk_size', 'tile_list'}.
+    """
+
+    __slots__ = ('_item', '_tile_list')
+
+    _fields = ('chunk_idx', 'chunk_size', 'tile_list')
+
+    def __init__(self, item, tiles, count):
+        self._item = item
+        self._tile_list = TileListView(tiles, count)
+
+    def __getitem__(self, key):
+        if key == 'tile_list':
+            return self._tile_list
+        if key not in self._fields:
+            raise KeyError(key)
+        return self._item[key]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+
+class ArrivalIndex:
+    """
+    Display index over an ArrivalTable, which answers "which tiles are playable at curr_ts" with a cursor.
+
+    A tile is displayed once it and all the tiles decided before it in the same chunk are playable, i.e. the
+    tiles of a chunk are shown as a growing prefix. The index sorts all tiles by that ready timestamp once,
+    and a cursor moves over them as curr_ts advances, such that each query only pays for the tiles that
+    became playable since the previous one. Querying an earlier curr_ts rewinds the cursor.
+
+    Parameters
+    ----------
+    arrival_table: ArrivalTable
+        the playable timestamps, indexed by chunk
+    """
+
+    def __init__(self, arrival_table):
+        self.arrival_table = arrival_table
+
+        # ready timestamp of each tile, i.e. the running maximum of playable_ts within its chunk
+        ready_ts = arrival_table.tile_playable_ts.copy()
+        offsets = arrival_table.offsets
+        for slot in range(len(arrival_table)):
+            tiles = slice(offsets[slot], offsets[slot + 1])
+            ready_ts[tiles] = np.maximum.accumulate(ready_ts[tiles])
+        self.order = np.argsort(ready_ts, kind='stable')
+        self.ready_ts = ready_ts[self.order]
+        self._ready_list = self.ready_ts.tolist()
+        self._slot_list = (np.searchsorted(offsets, self.order, side='right') - 1).tolist()
+
+        self._tiles = {}
+        self.reset()
+
+    def reset(self):
+        """Move the cursor back to the start of the simulation."""
+        self.cursor = 0
+        self.curr_ts = float('-inf')
+        self.counts = [0] * len(self.arrival_table)
+        self._display_slots = []
+        self._display_chunks = []
+
+    def _chunk_view(self, slot):
+        chunk_idx = self.arrival_table.chunks[slot].item()
+        tiles = self._tiles.get(chunk_idx)
+        if tiles is None:
+            tiles = [MappingProxyType(tile) for tile in self.arrival_table[chunk_idx]['tile_list']]
+            self._tiles[chunk_idx] = tiles
+        return ChunkView(self.arrival_table[chunk_idx], tiles, self.counts[slot])
+
+    def playable_chunks(self, curr_ts):
+        """
+        Get the chunks with playable tiles at curr_ts.
+
+        Parameters
+        ----------
+        curr_ts: int
+            current system timestamp
+
+        Returns
+        -------
+        display_chunks: list
+            read-only ChunkView items in ascending order of chunk index, the list is shared until the next change
+        """
+
+        if curr_ts < self.curr_ts:
+            self.reset()
+        self.curr_ts = curr_ts
+
+        changed_slots = set()
+        while self.cursor < len(self._ready_list) and self._ready_list[self.cursor] <= curr_ts:
+            slot = self._slot_list[self.cursor]
+            self.counts[slot] += 1
+            changed_slots.add(slot)
+            self.cursor += 1
+        if not changed_slots:
+            return self._display_chunks
+
+        display_chunks = list(self._display_chunks)
+        for slot in sorted(changed_slots):
+            pos = bisect_left(self._display_slots, slot)
+            if pos < len(self._display_slots) and self._display_slots[pos] == slot:
+                display_chunks[pos] = self._chunk_view(slot)
+            else:
+                self._display_slots.insert(pos, slot)
+                display_chunks.insert(pos, self._chunk_view(slot))
+        self._display_chunks = display_chunks
+
+        return display_chunks
+
+
+def build_arrival_table(rows, tiles, network_record, rendering_delay):
+    """
+    Calculate the playable timestamp of every downloaded tile.
+
+    Decisions are downloaded one after another, each one starts once decided and the previous one completed,
+    and its tiles become playable one rtt plus the rendering delay after the download completes.
+
+    Parameters
+    ----------
+    rows: array
+        decisions, see build_decision_table
+    tiles: dict
+        downloaded tiles, see build_decision_table
+    network_record: NetworkTrace or list of dict
+        full network trace, see pre_processing_network_log
+    rendering_delay: float
+        rendering delay, in milliseconds
+
+    Returns
+    -------
+    arrival_table: ArrivalTable
+        the playable timestamps, indexed by chunk
+    """
+
+    network_trace = NetworkTrace.from_records(network_record)
+    complete_ts, network_idx = network_trace.queue_finish_times(rows['system_ts'], rows['bytes'])
+    row_playable_ts = complete_ts + network_trace.rtt_ms[network_idx] + rendering_delay
+
+    tile_rows = tiles['row']
+    return ArrivalTable(rows['chunk_idx'][tile_rows], row_playable_ts[tile_rows], tiles['tile_idx'],
+                        tiles['tile_id'], tiles['size'])
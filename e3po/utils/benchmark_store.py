@@ -0,0 +1,239 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import hashlib
+import json
+import os
+import os.path as osp
+import threading
+import numpy as np
+from e3po.utils.logger import get_logger
+
+BENCHMARK_STORE_VERSION = 1
+BENCHMARK_CHUNK_FRAMES = 32         # frames per memory-mapped chunk file
+
+_store_cache = {}
+
+
+def _file_key(uri):
+    """Name, size and mtime of a file, by which its content is identified."""
+    stat = os.stat(uri)
+    return {'name': osp.basename(uri), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def get_benchmark_meta(system_opt, ori_video_uri, column_idx=None):
+    """
+    Everything the ground-truth fov frames depend on, which the benchmark store is keyed by.
+
+    Parameters
+    ----------
+    system_opt: dict
+        system configuration information
+    ori_video_uri: str
+        uri of the original video
+    column_idx: int
+        the user index in the motion log, defaults to motion_trace.column_idx
+
+    Returns
+    -------
+    meta: dict
+        the key fields of the store
+    """
+
+    motion_opt = system_opt['motion_trace']
+    metric_opt = system_opt['metric']
+    video_opt = system_opt['video']
+    return {
+        'version': BENCHMARK_STORE_VERSION,
+        'video': _file_key(ori_video_uri),
+        'projection': video_opt['origin']['projection_mode'],
+        'video_fps': video_opt['video_fps'],
+        'frame_num': int(video_opt['video_duration'] * video_opt['video_fps']),
+        'motion_trace': {
+            **_file_key(motion_opt['motion_file']),
+            'column_idx': motion_opt['column_idx'] if column_idx is None else column_idx,
+            'sample_frequency': motion_opt['sample_frequency'],
+            'motion_frequency': motion_opt['motion_frequency']
+        },
+        'range_fov': list(metric_opt['range_fov']),
+        'fov_resolution': list(metric_opt['fov_resolution']),
+        'inter_mode': metric_opt['inter_mode']
+    }
+
+
+def get_benchmark_key(meta):
+    """Content hash of the benchmark meta."""
+    return hashlib.sha256(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:24]
+
+
+def _create_exclusive(uri, create):
+    """
+    Create the file at uri through create(tmp_uri) unless it exists, without ever replacing a file that
+    another process has created in the meantime.
+    """
+    if osp.exists(uri):
+        return
+    tmp_uri = f"{uri}.{os.getpid()}.tmp"
+    create(tmp_uri)
+    try:
+        os.link(tmp_uri, uri)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_uri)
+
+
+class BenchmarkStore:
+    """
+    Content-addressed store of ground-truth fov frames, shared by all approaches evaluated on the same video,
+    motion trace and fov settings.
+
+    Frames are kept in memory-mapped npy chunk files of BENCHMARK_CHUNK_FRAMES frames each, together with
+    a valid bitmap, such that reads are zero-copy and several processes can fill disjoint frames of the
+    same store concurrently.
+
+    Parameters
+    ----------
+    store_dir: str
+        directory of the store
+    meta: dict
+        the key fields of the store, see get_benchmark_meta
+    """
+
+    def __init__(self, store_dir, meta):
+        self.store_dir = store_dir
+        self.meta = meta
+        self.frame_num = int(meta['frame_num'])
+        height, width = meta['fov_resolution']
+        self.frame_shape = (int(height), int(width), 3)
+        self._chunks = {}
+        self._lock = threading.Lock()        # chunks are opened by the pipeline threads concurrently
+
+        os.makedirs(store_dir, exist_ok=True)
+        _create_exclusive(osp.join(store_dir, 'meta.json'), self._write_meta)
+        _create_exclusive(osp.join(store_dir, 'valid.npy'), self._create_valid)
+        self.valid = np.load(osp.join(store_dir, 'valid.npy'), mmap_mode='r+')
+
+    def _write_meta(self, uri):
+        with open(uri, 'w') as f:
+            json.dump({**self.meta, 'chunk_frames': BENCHMARK_CHUNK_FRAMES}, f, indent=2)
+
+    def _create_valid(self, uri):
+        valid = np.lib.format.open_memmap(uri, mode='w+', dtype=np.uint8, shape=(self.frame_num,))
+        valid.flush()
+        del valid
+
+    def _create_chunk(self, uri):
+        chunk = np.lib.format.open_memmap(uri, mode='w+', dtype=np.uint8, shape=(BENCHMARK_CHUNK_FRAMES, *self.frame_shape))
+        chunk.flush()
+        del chunk
+
+    def _get_chunk(self, chunk_idx, create):
+        chunk = self._chunks.get(chunk_idx)
+        if chunk is not None:
+            return chunk
+        with self._lock:
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is None:
+                uri = osp.join(self.store_dir, f"chunk_{str(chunk_idx).zfill(5)}.npy")
+                if not osp.exists(uri):
+                    if not create:
+                        return None
+                    _create_exclusive(uri, self._create_chunk)
+                chunk = np.load(uri, mmap_mode='r+')
+                self._chunks[chunk_idx] = chunk
+        return chunk
+
+    def __contains__(self, frame_idx):
+        return 0 <= frame_idx < self.frame_num and bool(self.valid[frame_idx])
+
+    def valid_count(self):
+        """Number of frames in the store."""
+        return int(np.count_nonzero(self.valid))
+
+    def get(self, frame_idx):
+        """
+        Read a frame.
+
+        Parameters
+        ----------
+        frame_idx: int
+            frame index
+
+        Returns
+        -------
+        frame: array
+            read-only view of the frame, None if it is not in the store
+        """
+
+        if frame_idx not in self:
+            return None
+        chunk = self._get_chunk(frame_idx // BENCHMARK_CHUNK_FRAMES, create=False)
+        if chunk is None:
+            return None
+        frame = chunk[frame_idx % BENCHMARK_CHUNK_FRAMES]
+        frame.flags.writeable = False
+        return frame
+
+    def put(self, frame_idx, frame):
+        """Write a frame, frames beyond the video length are ignored."""
+        if not 0 <= frame_idx < self.frame_num:
+            return
+        if frame.shape != self.frame_shape:
+            get_logger().warning(f"[benchmark store] frame {frame_idx} has shape {frame.shape}, {self.frame_shape} expected")
+            return
+        chunk = self._get_chunk(frame_idx // BENCHMARK_CHUNK_FRAMES, create=True)
+        chunk[frame_idx % BENCHMARK_CHUNK_FRAMES] = frame
+        # the frame is flushed before it is marked as valid
+        chunk.flush()
+        self.valid[frame_idx] = 1
+        self.valid.flush()
+
+
+def get_benchmark_store(system_opt, project_path, ori_video_uri, column_idx=None):
+    """
+    Open the benchmark store of the given video, motion trace and fov settings, which is created on first use
+    under result/benchmark_store of the project.
+
+    Parameters
+    ----------
+    system_opt: dict
+        system configuration information
+    project_path: str
+        path of the project
+    ori_video_uri: str
+        uri of the original video
+    column_idx: int
+        the user index in the motion log, defaults to motion_trace.column_idx
+
+    Returns
+    -------
+    BenchmarkStore
+        the store, shared within the process
+    """
+
+    meta = get_benchmark_meta(system_opt, ori_video_uri, column_idx)
+    key = get_benchmark_key(meta)
+    store_dir = osp.join(project_path, 'result', 'benchmark_store', key)
+    store = _store_cache.get(store_dir)
+    if store is None:
+        store = BenchmarkStore(store_dir, meta)
+        _store_cache[store_dir] = store
+        get_logger().debug(f"[benchmark store] {store_dir}, {store.valid_count()}/{store.frame_num} frames ready")
+    return store
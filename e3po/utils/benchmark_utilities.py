@@ -0,0 +1,151 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import os
+import os.path as osp
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from e3po.utils.logger import get_logger
+from e3po.utils.misc import generate_motion_clock
+from e3po.utils.motion_trace import pre_processing_client_log
+from e3po.utils.scheduler import generate_frame_events
+from e3po.utils.fov_context import FovContext
+from e3po.utils.benchmark_store import get_benchmark_store
+from e3po.utils.evaluation_utilities import render_benchmark_frame, read_video_frames
+
+
+def _render_shard(system_opt, project_path, ori_video_uri, frame_start, frame_end, jobs):
+    """
+    Decode the frames [frame_start, frame_end) of the original video once, and render the ground-truth fov
+    frames of all users from them. It runs in a worker process.
+    The frames are decoded by read_video_frames, like the ones rendered lazily during evaluation, such that
+    the store holds the same frames whichever path filled it.
+
+    Parameters
+    ----------
+    jobs: list
+        one item per user, with format (column_idx, {frame_idx: motion}), holding the frames still missing
+
+    Returns
+    -------
+    rendered_num: int
+        number of rendered fov frames
+    """
+
+    stores = [(get_benchmark_store(system_opt, project_path, ori_video_uri, column_idx), frame_motions)
+              for column_idx, frame_motions in jobs]
+    projection = system_opt['video']['origin']['projection_mode']
+    metric_opt = system_opt['metric']
+    rendered_num = 0
+
+    for frame_idx, src_img in read_video_frames(ori_video_uri, frame_start, frame_end, system_opt['ffmpeg']):
+        for store, frame_motions in stores:
+            if frame_idx not in frame_motions:          # decoded, but not converted
+                continue
+            fov_context = FovContext(frame_motions[frame_idx], metric_opt['range_fov'], metric_opt['fov_resolution'])
+            store.put(frame_idx, render_benchmark_frame(src_img, fov_context, projection, metric_opt['inter_mode']))
+            rendered_num += 1
+
+    return rendered_num
+
+
+class BenchmarkRenderer:
+    """
+    Precompute the ground-truth fov frames of one or many users into the benchmark store, ahead of evaluation.
+
+    The ground-truth frames only depend on the original video, the motion trace and the fov settings, so they are
+    rendered once for all approaches. The original video is split into frame ranges which are decoded sequentially
+    by a pool of processes, and each decoded frame is rendered for every user that displays it.
+
+    Parameters
+    ----------
+    opt : dict
+        Configurations.
+    """
+
+    def __init__(self, opt):
+        self.opt = opt
+        self.logger = get_logger()
+        self.system_opt = opt['e3po_settings']
+        self.ori_video_uri = osp.join(self.system_opt['video']['origin']['video_dir'],
+                                      self.system_opt['video']['origin']['video_name'])
+        self.video_fps = self.system_opt['video']['video_fps']
+        self.column_idx_list = list(dict.fromkeys(opt.get('column_idx_list') or [self.system_opt['motion_trace']['column_idx']]))
+        self.workers = self.system_opt['metric'].get('benchmark_workers') or os.cpu_count() or 1
+        if not self.system_opt['ffmpeg']['ffmpeg_path']:
+            assert shutil.which('ffmpeg'), '[error] ffmpeg doesn\'t exist'
+            self.system_opt['ffmpeg']['ffmpeg_path'] = shutil.which('ffmpeg')
+
+    def get_frame_motions(self, motion_record):
+        """
+        Motion of every displayed frame, i.e. the motion at the first clock tick showing it, as in evaluation.
+
+        Returns
+        -------
+        frame_motions: dict
+            {frame_idx: motion}
+        """
+        motion_clock = generate_motion_clock(self, motion_record)
+        return {frame_idx: motion_record[motion_ts]
+                for motion_ts, frame_idx in generate_frame_events(motion_clock, self.video_fps)}
+
+    def make_benchmark(self):
+        """
+        Render the missing ground-truth fov frames of all users into their benchmark stores.
+
+        Returns
+        -------
+            None
+        """
+
+        assert osp.exists(self.ori_video_uri), f'[error] {self.ori_video_uri} doesn\'t exist'
+        motion_records = pre_processing_client_log(self.system_opt, self.column_idx_list)
+
+        jobs = []
+        for column_idx, motion_record in zip(self.column_idx_list, motion_records):
+            store = get_benchmark_store(self.system_opt, self.opt['project_path'], self.ori_video_uri, column_idx)
+            frame_motions = {frame_idx: dict(motion) for frame_idx, motion in self.get_frame_motions(motion_record).items()
+                             if frame_idx < store.frame_num and frame_idx not in store}
+            self.logger.info(f"[benchmark] user {column_idx}: {len(frame_motions)} frames to render, "
+                             f"{store.valid_count()} ready in {store.store_dir}")
+            if frame_motions:
+                jobs.append((column_idx, frame_motions))
+        if not jobs:
+            return
+
+        missing = sorted(set().union(*[frame_motions.keys() for _, frame_motions in jobs]))
+        shard_num = min(self.workers, len(missing))
+        bounds = [missing[0]] + [missing[i * len(missing) // shard_num] for i in range(1, shard_num)] + [missing[-1] + 1]
+        shards = []
+        for frame_start, frame_end in zip(bounds[:-1], bounds[1:]):
+            shard_jobs = [(column_idx, {frame_idx: motion for frame_idx, motion in frame_motions.items()
+                                        if frame_start <= frame_idx < frame_end})
+                          for column_idx, frame_motions in jobs]
+            shards.append((frame_start, frame_end, shard_jobs))
+
+        self.logger.info(f"[benchmark] rendering {len(missing)} frames of {len(jobs)} users "
+                         f"in {len(shards)} shards, with {self.workers} processes")
+        args = (self.system_opt, self.opt['project_path'], self.ori_video_uri)
+        if self.workers == 1:
+            rendered_num = sum(_render_shard(*args, *shard) for shard in shards)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(_render_shard, *args, *shard) for shard in shards]
+                rendered_num = sum(future.result() for future in futures)
+        self.logger.info(f"[benchmark] {rendered_num} fov frames rendered")
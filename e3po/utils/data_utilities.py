@@ -22,8 +22,10 @@ import os
 import numpy as np
 import os.path as osp
 from e3po.utils import get_logger, extract_frame
-from e3po.utils.misc import get_video_size
+from e3po.utils.misc import get_video_size, run_cmd
+from e3po.utils.profiler import get_profiler
 from e3po.utils.projection_utilities import transform_projection
+from e3po.utils.tile_layout import encode_tile_id
 
 
 def generate_source_video(settings, ori_video_path, chunk_idx):
@@ -69,7 +71,7 @@ def generate_source_video(settings, ori_video_path, chunk_idx):
           f"-y {source_video_uri} " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
     settings.logger.debug(cmd)
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.cut_chunk')
     settings.logger.info("[generating chunk] end")
 
     return source_video_uri
@@ -134,10 +136,7 @@ def encode_dst_video(settings, dst_video_folder, encoding_params, user_video_spe
     if settings.approach_mode == "on_demand":
         chunk_idx = user_video_spec['tile_info']['chunk_idx']
         tile_idx = user_video_spec['tile_info']['tile_idx']
-        if tile_idx != -1:  # normal tile stream
-            result_video_name = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(tile_idx).zfill(3)}"
-        else:               # background stream
-            result_video_name = f"chunk_{str(chunk_idx).zfill(4)}_background"
+        result_video_name = encode_tile_id(chunk_idx, tile_idx)     # tile or background stream
     elif settings.approach_mode == "transcoding":
         result_video_name = settings.approach_folder_name
     else:
@@ -158,7 +157,7 @@ def encode_dst_video(settings, dst_video_folder, encoding_params, user_video_spe
           f"-y {dst_video_uri} " \
           f"-loglevel {settings.ffmpeg_settings['loglevel']}"
     settings.logger.debug(cmd)
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.encode_tile')
 
     return dst_video_uri
 
@@ -247,7 +246,8 @@ def transcode_video(source_video_uri, src_proj, dst_proj, src_resolution, dst_re
 
     for frame_idx in range(frame_count):
         source_frame = extract_frame(source_video_uri, frame_idx, ffmpeg_settings)
-        pixel_coord = transform_projection(dst_proj, src_proj, dst_resolution, src_resolution)
+        with get_profiler().timer('projection.transform'):
+            pixel_coord = transform_projection(dst_proj, src_proj, dst_resolution, src_resolution)
         dstMap_u, dstMap_v = cv2.convertMaps(pixel_coord[0].astype(np.float32), pixel_coord[1].astype(np.float32), cv2.CV_16SC2)
         transcode_frame = cv2.remap(source_frame, dstMap_u, dstMap_v, cv2.INTER_LINEAR)
         transcode_frame_uri = osp.join(dst_video_folder, f"{frame_idx}.png")
@@ -266,7 +266,7 @@ def transcode_video(source_video_uri, src_proj, dst_proj, src_resolution, dst_re
           f"-qp {10} " \
           f"-y {transcode_video_uri} " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.encode_transcoded')
     remove_temp_files(dst_video_folder)
 
     return transcode_video_uri
@@ -306,7 +306,7 @@ def segment_video(ffmpeg_settings, source_video_uri, dst_video_folder, segmentat
           f"-q:v 2 -f image2 {result_frame_path} " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
 
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.segment')
 
 
 def resize_video(ffmpeg_settings, source_video_uri, dst_video_folder, dst_video_info):
@@ -342,7 +342,7 @@ def resize_video(ffmpeg_settings, source_video_uri, dst_video_folder, dst_video_
           f"-q:v 2 -f image2 {result_frame_path} " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
 
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.resize')
 
 
 def get_video_frame_sizes(ffmpeg_settings, dst_video_uri):
@@ -375,7 +375,7 @@ def get_video_frame_sizes(ffmpeg_settings, dst_video_uri):
           f"-y {osp.join(dst_video_path, '%d.h264')} " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
 
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.split_frames')
 
     frame_size = []
     frame_num = len([f for f in os.listdir(dst_video_path) if f.endswith('h264')])
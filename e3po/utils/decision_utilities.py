@@ -17,13 +17,15 @@
 # along with this program; if not, see:
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
 
-from copy import deepcopy
 import numpy as np
 from e3po.utils.projection_utilities import fov_to_3d_polar_coord,\
     _3d_polar_coord_to_pixel_coord, pixel_coord_to_tile
+from e3po.utils.visibility_lut import get_visibility_lut
+from e3po.utils.motion_predictor import EwmaMotionPredictor
+from e3po.utils.tile_layout import get_tile_raster, encode_tile_id, tile_bit, tiles_to_bitset
 
 
-def predict_motion_tile(motion_history, motion_history_size, motion_prediction_size):
+def predict_motion_tile(motion_history, motion_history_size, motion_prediction_size, predictor=None):
     """
     Predicting motion with given historical information and prediction window size.
     (As an example, users can implement their customized function.)
@@ -37,6 +39,9 @@ def predict_motion_tile(motion_history, motion_history_size, motion_prediction_s
         the size of motion history to be used for predicting
     motion_prediction_size: int
         the size of motion to be predicted
+    predictor: BaseMotionPredictor
+        incremental predictor kept across calls, which only consumes the samples appended since its last
+        call. If None, an exponential smoothing predictor is run over the last motion_history_size samples.
 
     Returns
     -------
@@ -46,18 +51,14 @@ def predict_motion_tile(motion_history, motion_history_size, motion_prediction_s
             {'yaw ': yaw,' pitch ': pitch,' scale ': scale}
     """
     # Use exponential smoothing to predict the angle of each motion within pw for yaw and pitch.
-    a = 0.3  # Parameters for exponential smoothing prediction
-    hw = [d['motion_record'] for d in motion_history]
-    predicted_motion = list(hw)[0]
-    for motion_record in list(hw)[-motion_history_size:]:
-        predicted_motion['yaw'] = a * predicted_motion['yaw'] + (1-a) * motion_record['yaw']
-        predicted_motion['pitch'] = a * predicted_motion['pitch'] + (1-a) * motion_record['pitch']
-        predicted_motion['scale'] = a * predicted_motion['scale'] + (1-a) * motion_record['scale']
+    if predictor is None:
+        predictor = EwmaMotionPredictor(alpha=0.3)
+        predictor.observe(motion_history[-motion_history_size:])
+    else:
+        predictor.observe(motion_history)
 
     # The current prediction method implemented is to use the same predicted motion for all chunks in pw.
-    predicted_record = []
-    for i in range(motion_prediction_size):
-        predicted_record.append(deepcopy(predicted_motion))
+    predicted_record = predictor.predict(motion_prediction_size)
 
     return predicted_record
 
@@ -93,12 +94,23 @@ def tile_decision(predicted_record, video_size, range_fov, chunk_idx, user_data)
     sampling_size = [50, 50]
     converted_width = user_data['config_params']['converted_width']
     converted_height = user_data['config_params']['converted_height']
-    for predicted_motion in predicted_record:
-        _3d_polar_coord = fov_to_3d_polar_coord([float(predicted_motion['yaw']), float(predicted_motion['pitch']), 0], range_fov, sampling_size)
-        pixel_coord = _3d_polar_coord_to_pixel_coord(_3d_polar_coord, config_params['projection_mode'], [converted_height, converted_width])
-        coord_tile_list = pixel_coord_to_tile(pixel_coord, config_params['total_tile_num'], video_size, chunk_idx)
-        unique_tile_list = [int(item) for item in np.unique(coord_tile_list)]
-        tile_record.extend(unique_tile_list)
+
+    lut_settings = config_params.get('visibility_lut') or {}
+    if lut_settings.get('enable'):
+        # the same sampling, precomputed over a quantized (yaw, pitch) grid and stored as a lookup table,
+        # which approximates the exact sampling, such that a margin of at least one cell is needed to never miss a tile
+        tile_raster = get_tile_raster(video_size, chunk_idx, config_params['total_tile_num'])
+        lut = get_visibility_lut(tile_raster, config_params['projection_mode'], [converted_height, converted_width],
+                                 range_fov, lut_settings.get('grid_step', 2), lut_settings.get('lut_folder'))
+        for predicted_motion in predicted_record:
+            tile_record.extend(lut.lookup(float(predicted_motion['yaw']), float(predicted_motion['pitch']), lut_settings.get('margin', 1)))
+    else:
+        for predicted_motion in predicted_record:
+            _3d_polar_coord = fov_to_3d_polar_coord([float(predicted_motion['yaw']), float(predicted_motion['pitch']), 0], range_fov, sampling_size)
+            pixel_coord = _3d_polar_coord_to_pixel_coord(_3d_polar_coord, config_params['projection_mode'], [converted_height, converted_width])
+            coord_tile_list = pixel_coord_to_tile(pixel_coord, config_params['total_tile_num'], video_size, chunk_idx)
+            unique_tile_list = [int(item) for item in np.unique(coord_tile_list)]
+            tile_record.extend(unique_tile_list)
 
     if config_params['background_flag']:
         if -1 not in user_data['latest_decision']:
@@ -130,14 +142,10 @@ def generate_dl_list(chunk_idx, tile_record, latest_result, dl_list):
     """
 
     tile_result = []
-    for i in range(len(tile_record)):
-        tile_idx = tile_record[i]
-        if tile_idx not in latest_result:
-            if tile_idx != -1:
-                tile_id = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(tile_idx).zfill(3)}"
-            else:
-                tile_id = f"chunk_{str(chunk_idx).zfill(4)}_background"
-            tile_result.append(tile_id)
+    latest_bitset = tiles_to_bitset(latest_result)
+    for tile_idx in tile_record:
+        if not latest_bitset & tile_bit(tile_idx):
+            tile_result.append(encode_tile_id(chunk_idx, int(tile_idx)))
 
     if len(tile_result) != 0:
         dl_list.append(
@@ -18,26 +18,30 @@
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
 
 import os
+import time
 import cv2
 import numpy as np
 import os.path as osp
-from copy import deepcopy
-from e3po.utils.json import get_video_json_size
-from e3po.utils.projection_utilities import \
-    fov_to_3d_polar_coord, _3d_polar_coord_to_pixel_coord
-from e3po.utils.misc import get_video_size
-from e3po.utils.network_trace import update_network
+from e3po.utils.misc import get_video_size, run_cmd
+from e3po.utils.profiler import get_profiler, wait_process
+from e3po.utils.fov_context import FovContext
+from e3po.utils.tile_decoder import LazyFrameList
+from e3po.utils.vmaf import build_libvmaf_filter, read_vmaf_log
+from e3po.utils.video_encoder import VideoEncodeStream
+from e3po.utils.arrival import ArrivalTable, build_decision_table, build_arrival_table
 import subprocess
+from functools import partial
 
 
 def update_curr_fov(curr_fov, curr_motion):
     """
-    Updating current motion information
+    Updating current motion information, together with the per-frame fov context shared by
+    the approach and the benchmark generator.
 
     Parameters
     ----------
     curr_fov: dict
-        recording the fov information, with format {"curr_motion", "range_fov", "fov_resolution"}
+        recording the fov information, with format {"curr_motion", "range_fov", "fov_resolution", "fov_context"}
     curr_motion: dict
         recording the motion information, with format {"yaw", "pitch", "scale"}
 
@@ -48,6 +52,7 @@ def update_curr_fov(curr_fov, curr_motion):
     """
 
     curr_fov['curr_motion'] = curr_motion
+    curr_fov['fov_context'] = FovContext(curr_motion, curr_fov['range_fov'], curr_fov['fov_resolution'])
     return curr_fov
 
 
@@ -63,80 +68,18 @@ def calc_arrival_ts(settings, dl_list, video_size, network_record):
         the decided and downloaded tile list
     video_size: dict
         the video size after video preprocessing
-    network_record : list of dict
-        Full list of network state records. Each record is a dictionary containing at least
-        the 'start_ms' field, indicating when the record becomes active.
+    network_record : NetworkTrace or list of dict
+        Full network trace, see pre_processing_network_log.
 
     Returns
     -------
-    arrival_list: list
-        the calculated available tile chunks list
+    arrival_list: ArrivalTable
+        the calculated available tile chunks, indexed by chunk
     """
 
-    arrival_list = {}
+    rows, tiles = build_decision_table(dl_list, video_size)
     rendering_delay = settings.system_opt['network_trace']['rendering_delay']
-
-    network_history = []
-    network_last_idx = 0
-    curr_network_ts = 0
-    last_chunk_complete_time = 0    # Time when the previous chunk finished downloading
-
-    for row in dl_list:
-        chunk_idx = row['chunk_idx']
-        chunk_size = 0
-        for tile_id in row['decision_data']['tile_info']:
-            chunk_size += get_video_json_size(video_size, chunk_idx, tile_id)
-
-        need_download_size = chunk_size         # Size of the chunk that needs to be downloaded
-        curr_ts = row['decision_data']['system_ts']
-        if curr_network_ts < curr_ts:
-            curr_network_ts = curr_ts
-        if last_chunk_complete_time < curr_ts:  # The previous chunk completed downloading before this one
-            last_chunk_complete_time = curr_ts
-
-        while need_download_size > 0:           # The current chunk has not finished downloading
-            network_history, network_last_idx = update_network(curr_network_ts, network_last_idx, network_history,
-                                                               network_record)
-            network_stats = network_history[-1]  # Get the current available bandwidth
-            max_download_size = network_stats['throughput_MBps'] * min(network_stats['start_ms'] + network_stats['duration_ms'] - last_chunk_complete_time,
-                                                                       network_stats['duration_ms']) * 1000     # In Bytes
-
-            if max_download_size >= need_download_size: # Current available bandwidth can complete the download
-                download_delay = chunk_size / network_stats['throughput_MBps'] / 1000   # In ms
-                chunk_complete_time = last_chunk_complete_time + download_delay
-                need_download_size = 0
-                last_chunk_complete_time = chunk_complete_time
-            else:
-                need_download_size -= max_download_size
-                last_chunk_complete_time = network_stats['start_ms'] + network_stats['duration_ms']
-                curr_network_ts = network_stats['start_ms'] + network_stats['duration_ms']
-
-        download_delay = chunk_complete_time - row['decision_data']['system_ts']
-        playable_ts = row['decision_data']['system_ts'] + download_delay + network_stats['rtt_ms'] + rendering_delay
-
-        if chunk_idx not in arrival_list.keys():                # new chunk
-            tmp_arrival_list = []
-            for tile_id in row['decision_data']['tile_info']:
-                tmp_arrival_list.append(
-                    {
-                        'playable_ts': playable_ts,
-                        'tile_id': tile_id,
-                    }
-                )
-            arrival_list[chunk_idx] = {
-                'chunk_idx': chunk_idx,
-                'chunk_size': chunk_size,
-                'tile_list': tmp_arrival_list
-            }
-        else:                                           # same chunk
-            for tile_id in row['decision_data']['tile_info']:
-                arrival_list[chunk_idx]['tile_list'].append(
-                    {
-                        'playable_ts': playable_ts,
-                        'tile_id': tile_id
-                    }
-                )
-            arrival_list[chunk_idx]['chunk_size'] += chunk_size
+    arrival_list = build_arrival_table(rows, tiles, network_record, rendering_delay)
     settings.logger.info("[decision to playable] end")
 
     return arrival_list
@@ -148,7 +91,7 @@ def get_curr_display_chunks(arrival_list, curr_ts):
 
     Parameters
     ----------
-    arrival_list: list
+    arrival_list: ArrivalTable or dict
         the calculated available tile chunks list, before the current timestamp
     curr_ts: int
         current system timestamp
@@ -156,10 +99,13 @@ def get_curr_display_chunks(arrival_list, curr_ts):
     Returns
     -------
     curr_display_chunks: list
-        currently available chunks, each item with the format {'playable_ts', 'tile_id'}
+        currently available chunks, each item with the format {'playable_ts', 'tile_id', 'tile_idx'}
 
     """
 
+    if isinstance(arrival_list, ArrivalTable):     # indexed, read-only views
+        return arrival_list.get_index().playable_chunks(curr_ts)
+
     curr_display_chunks = []
     for arrival_idx in range(len(arrival_list)):
         if arrival_list[arrival_idx]['tile_list'][0]['playable_ts'] <= curr_ts:
@@ -170,7 +116,7 @@ def get_curr_display_chunks(arrival_list, curr_ts):
                     _tile_list.append(arrival_chunk_tile_list[_tile_idx])
                 else:
                     break
-            _arrival_chunk = deepcopy(arrival_list[arrival_idx])
+            _arrival_chunk = dict(arrival_list[arrival_idx])        # the tile items are shared, read-only
             _arrival_chunk['tile_list'] = _tile_list
             curr_display_chunks.append(_arrival_chunk)
         else:
@@ -187,7 +133,7 @@ def get_curr_display_frames(settings, current_display_chunks, curr_ts, frame_idx
     settings: dict
         system configuration information
     current_display_chunks: list
-        each item with the format {'playable_ts', 'tile_id'}
+        each item with the format {'playable_ts', 'tile_id', 'tile_idx'}
     curr_ts: int
         current system timestamp
     frame_idx: int
@@ -195,11 +141,12 @@ def get_curr_display_frames(settings, current_display_chunks, curr_ts, frame_idx
 
     Returns
     -------
-    curr_display_frames: list
-        each item records one available tile frame, according to the current_display_chunks
+    curr_display_frames: LazyFrameList
+        each item records one available tile frame, according to the current_display_chunks,
+        which is decoded when the approach accesses it
     """
 
-    curr_display_frames = []
+    frame_loaders = []
     chunk_idx = int((curr_ts - settings.base_ts) // (settings.video_info['chunk_duration'] * 1000))
 
     if chunk_idx <= len(current_display_chunks) - 1:                # exists current chunk
@@ -215,8 +162,7 @@ def get_curr_display_frames(settings, current_display_chunks, curr_ts, frame_idx
                 settings.dst_video_folder,
                 f'{tile_id}.mp4'
             )
-            tile_frame = extract_frame(tile_video_path, frame_idx % settings.chunk_frame_num, settings.ffmpeg_settings)
-            curr_display_frames.append(tile_frame)
+            frame_loaders.append(partial(read_video_frame, settings, tile_video_path, frame_idx % settings.chunk_frame_num, chunk_idx))
     elif settings.approach_mode == "transcoding":
         tile_video_path = osp.join(
             settings.dst_video_folder,
@@ -224,14 +170,78 @@ def get_curr_display_frames(settings, current_display_chunks, curr_ts, frame_idx
         )
         if frame_idx > len(current_display_chunks) - 1:
             frame_idx = len(current_display_chunks) - 1
-        tile_frame = extract_frame(tile_video_path, frame_idx, settings.ffmpeg_settings)
-        curr_display_frames.append(tile_frame)
+        frame_loaders.append(partial(read_video_frame, settings, tile_video_path, frame_idx))
     else:
         raise ValueError("error when read the approach mode, which should be on_demand or transcoding!")
 
+    curr_display_frames = LazyFrameList(frame_loaders, getattr(settings, 'decode_stats', None))
+
     return curr_display_frames
 
 
+def read_video_frame(settings, video_uri, frame_idx, chunk_idx=None):
+    """
+    Read one frame through the tile decoder pool of settings, or with extract_frame if the video can not be
+    decoded sequentially.
+
+    Parameters
+    ----------
+    settings: dict
+        system configuration information
+    video_uri: str
+        uri of the video
+    frame_idx: int
+        frame index within the video
+    chunk_idx: int
+        chunk index of the video, used to release the decoders of finished chunks
+
+    Returns
+    -------
+    frame: array
+        the decoded frame
+    """
+
+    pool = getattr(settings, 'tile_decoder_pool', None)
+    if pool is not None:
+        try:
+            return pool.get_frame(video_uri, frame_idx, chunk_idx)
+        except IOError as e:
+            settings.logger.debug(f"{e}, fall back to ffmpeg")
+    return extract_frame(video_uri, frame_idx, settings.ffmpeg_settings)
+
+
+def prefetch_tile_frames(settings, arrival_list, frame_idx):
+    """
+    Start decoding the tiles of the current and the next chunk in the background, once per chunk, and close the
+    decoders of the finished chunks.
+
+    Parameters
+    ----------
+    settings: dict
+        system configuration information
+    arrival_list: ArrivalTable or dict
+        the calculated available tile chunks list
+    frame_idx: int
+        frame index according to the current system timestamp
+    """
+
+    pool = getattr(settings, 'tile_decoder_pool', None)
+    chunk_idx = frame_idx // settings.chunk_frame_num
+    if pool is None or chunk_idx == getattr(settings, 'prefetch_chunk_idx', None):
+        return
+    settings.prefetch_chunk_idx = chunk_idx
+
+    pool.release_groups(lambda group: group is None or group >= chunk_idx)
+    for _chunk_idx in (chunk_idx, chunk_idx + 1):
+        if _chunk_idx not in arrival_list:
+            continue
+        tile_ids = {tile_info['tile_id'] for tile_info in arrival_list[_chunk_idx]['tile_list']}
+        for tile_id in sorted(tile_ids):
+            video_uri = osp.join(settings.dst_video_folder, f'{tile_id}.mp4')
+            if osp.exists(video_uri):
+                pool.prefetch(video_uri, frame_idx % settings.chunk_frame_num if _chunk_idx == chunk_idx else 0, _chunk_idx)
+
+
 def generate_benchmark_result(settings, curr_fov, frame_idx):
     """
     Generate the benchmark fov video frame, with given motion information
@@ -247,50 +257,126 @@ def generate_benchmark_result(settings, curr_fov, frame_idx):
 
     Returns
     -------
-    dst_benchmark_frame_uri: str
-        uri of the generated fov frame
+    dst_benchmark_frame: array
+        the generated fov frame, in uint8
     """
 
     settings.logger.debug(f'[evaluation] start get benchmark img')
 
     dst_benchmark_frame_uri = osp.join(settings.benchmark_img_path, f"{frame_idx}.png")
-    fov_ypr = [float(curr_fov['curr_motion']['yaw']), float(curr_fov['curr_motion']['pitch']), 0]
-    _3d_polar_coord = fov_to_3d_polar_coord(fov_ypr, curr_fov['range_fov'], curr_fov['fov_resolution'])
-
-    if not settings.save_benchmark_flag or not os.path.exists(dst_benchmark_frame_uri):
-        src_img = extract_frame(settings.ori_video_uri, frame_idx, settings.ffmpeg_settings)
-        src_height, src_width = src_img.shape[:2]
-        inter_order = get_interpolation(settings.opt['e3po_settings']['metric']['inter_mode'])
-        pixel_coord = _3d_polar_coord_to_pixel_coord(_3d_polar_coord, settings.video_info['projection'], [src_height, src_width])
-        dstMap_u, dstMap_v = cv2.convertMaps(pixel_coord[0].astype(np.float32), pixel_coord[1].astype(np.float32), cv2.CV_16SC2)
-        result = cv2.remap(src_img, dstMap_u, dstMap_v, inter_order)
-    else:
-        result = np.array(cv2.imread(dst_benchmark_frame_uri))
-
-    if settings.save_benchmark_flag and not os.path.exists(dst_benchmark_frame_uri):
-        cv2.imwrite(dst_benchmark_frame_uri, result, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    benchmark_store = getattr(settings, 'benchmark_store', None)
+    result = benchmark_store.get(frame_idx) if benchmark_store is not None else None
+    if result is not None:          # rendered before, for the same video, motion trace and fov settings
+        get_profiler().count('benchmark.store_hits')
+        if settings.save_benchmark_flag:      # the images of an earlier run may belong to another trace
+            settings.benchmark_writer.write(dst_benchmark_frame_uri, result)
+        settings.logger.debug(f'[evaluation] end get benchmark img')
+        return result
+
+    fov_context = curr_fov.get('fov_context') or \
+        FovContext(curr_fov['curr_motion'], curr_fov['range_fov'], curr_fov['fov_resolution'])
+    src_img = extract_frame(settings.ori_video_uri, frame_idx, settings.ffmpeg_settings)
+    result = render_benchmark_frame(src_img, fov_context, settings.video_info['projection'],
+                                    settings.opt['e3po_settings']['metric']['inter_mode'])
+    get_profiler().count('benchmark.rendered')
+    if benchmark_store is not None:
+        benchmark_store.put(frame_idx, result)
+    if settings.save_benchmark_flag:
+        settings.benchmark_writer.write(dst_benchmark_frame_uri, result)
 
     settings.logger.debug(f'[evaluation] end get benchmark img')
 
-    return dst_benchmark_frame_uri
+    return result
 
 
-def extract_frame(video_uri, frame_idx, ffmpeg_settings):
-    """Extract the video frame of the given index."""
-    frame_uri = osp.join(osp.dirname(video_uri), f"{frame_idx}.png")
-    cmd = f"{ffmpeg_settings['ffmpeg_path']} " \
-          f"-i {video_uri} " \
-          f"-vf select='eq(n\,{frame_idx})' " \
-          f"-vframes 1 " \
-          f"-y {frame_uri} " \
-          f"-loglevel {ffmpeg_settings['loglevel']} "
-    os.system(cmd)
+def render_benchmark_frame(src_img, fov_context, projection, inter_mode):
+    """
+    Render the ground-truth fov frame from a frame of the original video.
 
-    assert os.path.exists(frame_uri), f"Error: File {frame_uri} does not exist."
-    frame = cv2.imread(frame_uri)
-    os.remove(frame_uri)
+    Parameters
+    ----------
+    src_img: array
+        frame of the original video
+    fov_context: FovContext
+        fov of the frame
+    projection: str
+        projection mode of the original video
+    inter_mode: str
+        interpolation mode
+
+    Returns
+    -------
+    dst_benchmark_frame: array
+        the fov frame
+    """
+
+    src_height, src_width = src_img.shape[:2]
+    dstMap_u, dstMap_v = fov_context.get_remap(projection, [src_height, src_width])
+    with get_profiler().timer('benchmark.remap'):
+        return cv2.remap(src_img, dstMap_u, dstMap_v, get_interpolation(inter_mode))
 
-    return frame
+
+def read_video_frames(video_uri, frame_start, frame_end, ffmpeg_settings):
+    """
+    Decode the frames [frame_start, frame_end) of a video sequentially with ffmpeg, such that every ground-truth
+    frame goes through the same frame-accurate decoding and color conversion.
+
+    Parameters
+    ----------
+    video_uri: str
+        uri of the video
+    frame_start: int
+        index of the first frame
+    frame_end: int
+        index after the last frame
+    ffmpeg_settings: dict
+        the 'ffmpeg' settings of e3po.yml
+
+    Yields
+    ------
+    frame_idx: int
+        frame index
+    frame: array
+        the decoded frame in BGR, with the same layout as cv2.imread
+    """
+
+    cap = cv2.VideoCapture(video_uri)
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if width <= 0 or height <= 0:
+        raise IOError(f"[read video frames] failed to open {video_uri}")
+
+    cmd = [
+        ffmpeg_settings['ffmpeg_path'], '-loglevel', str(ffmpeg_settings['loglevel']), '-i', video_uri,
+        '-vf', f"select='between(n,{frame_start},{frame_end - 1})'", '-vsync', '0',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-'
+    ]
+    frame_bytes = width * height * 3
+    process_start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+    frame_idx = frame_start
+    try:
+        while frame_idx < frame_end:
+            buffer = process.stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+            yield frame_idx, np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+            frame_idx += 1
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        _, cpu_s = wait_process(process)
+        get_profiler().record('ffmpeg.decode_frames', time.perf_counter() - process_start, process_start,
+                              {'cmd': ' '.join(cmd), 'cpu_s': cpu_s, 'frames': frame_idx - frame_start})
+    if frame_idx < frame_end:
+        raise IOError(f"[read video frames] failed to decode frame {frame_idx} of {video_uri}")
+
+
+def extract_frame(video_uri, frame_idx, ffmpeg_settings):
+    """Extract the video frame of the given index."""
+    for _, frame in read_video_frames(video_uri, frame_idx, frame_idx + 1, ffmpeg_settings):
+        return frame.copy()
 
 
 def write_dict(settings, max_bandwidth, total_size, metric_360PI, cost, avg_psnr, avg_ssim, avg_mse, avg_vmaf, gc_score):
@@ -306,7 +392,7 @@ def write_dict(settings, max_bandwidth, total_size, metric_360PI, cost, avg_psnr
     avg_bandwidth = round(total_size / (settings.video_info['duration']
                                         + settings.pre_download_duration / 1000) / 125 / 1000, 3)
     total_transfer_size = round(total_size / 1000 / 1000, 6)
-    metric_360PI = round(metric_360PI, 6)
+    metric_360PI = round(metric_360PI, 6) if metric_360PI is not None else None
     gc_score = round(gc_score, 6)
 
     misc_dict = {
@@ -322,12 +408,33 @@ def write_dict(settings, max_bandwidth, total_size, metric_360PI, cost, avg_psnr
         'GC Score': f"{gc_score}"
     }
 
+    # sampled metrics, together with the 95% confidence intervals of their averages over all frames
+    metric_sampler = getattr(settings, 'metric_sampler', None)
+    if metric_sampler is not None:
+        misc_dict['Metric sampling'] = f"{metric_sampler.describe()}, {len(settings.metric_frames)} frames"
+        for name, values, unit in [('PSNR', settings.psnr, 'dB'), ('SSIM', settings.ssim, ''), ('MSE', settings.mse, '')]:
+            interval = metric_sampler.confidence_interval(settings.metric_frames, values)
+            if interval is not None:
+                misc_dict[f'{name} 95% CI'] = f"[{round(interval[0], 3)}, {round(interval[1], 3)}]{unit}"
+
+    # decode statistics, the tiles which did not cover the fov have been skipped
+    decode_stats = getattr(settings, 'decode_stats', None)
+    if decode_stats and decode_stats['available_tiles'] > 0:
+        skipped_ratio = 1 - decode_stats['decoded_tiles'] / decode_stats['available_tiles']
+        misc_dict['Decoded tiles'] = f"{decode_stats['decoded_tiles']}/{decode_stats['available_tiles']}"
+        misc_dict['Skipped tile decodes'] = f"{round(skipped_ratio * 100, 3)}%"
+        settings.logger.info(f"[decode stats] {misc_dict['Decoded tiles']} tile frames decoded, "
+                             f"{misc_dict['Skipped tile decodes']} skipped")
+    pool = getattr(settings, 'tile_decoder_pool', None)
+    if pool is not None:
+        misc_dict['Decoded video frames'] = f"{pool.get_stats()['decoded_frames']}"
+
     return misc_dict
 
 
 def encode_display_video(settings):
     """
-    Encode the generated sequence of video frames
+    Encode the generated sequence of video frames from the saved images, unless they were encoded while evaluating
 
     Parameters
     ----------
@@ -337,28 +444,49 @@ def encode_display_video(settings):
     -------
         None
     """
+    if settings.streaming_encode:
+        settings.logger.debug("[encode display video] encoded while evaluating")
+        return
+
     # encoding the benchmark video stream
     ffmpeg_settings = settings.ffmpeg_settings
     encoding_params = settings.encoding_params
 
-    if not osp.exists(settings.benchmark_video_uri):
-        os.chdir(settings.benchmark_img_path)
-        cmd = f"{ffmpeg_settings['ffmpeg_path']} " \
-              f"-r {encoding_params['video_fps']} " \
-              f"-start_number 0 " \
-              f"-i %d.png " \
-              f"-threads {ffmpeg_settings['thread']} " \
-              f"-preset {encoding_params['preset']} " \
-              f"-c:v {encoding_params['encoder']} " \
-              f"-g {encoding_params['gop']} " \
-              f"-bf {encoding_params['bf']} " \
-              f"-qp {encoding_params['qp_list'][0]} " \
-              f"-y benchmark.mp4 " \
-              f"-loglevel {ffmpeg_settings['loglevel']}"
-        settings.logger.debug(cmd)
-        os.system(cmd)
+    if settings.metric_sampler.is_full and not osp.exists(settings.benchmark_video_uri):
+        frame_num = settings.last_img_index + 1
+        benchmark_store = getattr(settings, 'benchmark_store', None)
+        if benchmark_store is not None and all(frame_idx in benchmark_store for frame_idx in range(frame_num)):
+            # the frames of this run are read from the store, which is keyed like the benchmark video
+            os.makedirs(osp.dirname(settings.benchmark_video_uri), exist_ok=True)
+            encoder = VideoEncodeStream(ffmpeg_settings, encoding_params, settings.benchmark_video_uri)
+            for frame_idx in range(frame_num):
+                encoder.push(benchmark_store.get(frame_idx))
+            encoder.close()
+        elif settings.save_benchmark_flag:
+            os.makedirs(osp.dirname(settings.benchmark_video_uri), exist_ok=True)
+            os.chdir(settings.benchmark_img_path)
+            cmd = f"{ffmpeg_settings['ffmpeg_path']} " \
+                  f"-r {encoding_params['video_fps']} " \
+                  f"-start_number 0 " \
+                  f"-i %d.png " \
+                  f"-frames:v {frame_num} " \
+                  f"-threads {ffmpeg_settings['thread']} " \
+                  f"-preset {encoding_params['preset']} " \
+                  f"-c:v {encoding_params['encoder']} " \
+                  f"-g {encoding_params['gop']} " \
+                  f"-bf {encoding_params['bf']} " \
+                  f"-qp {encoding_params['qp_list'][0]} " \
+                  f"-y {settings.benchmark_video_uri} " \
+                  f"-loglevel {ffmpeg_settings['loglevel']}"
+            settings.logger.debug(cmd)
+            run_cmd(cmd, 'ffmpeg.encode_benchmark')
+        else:
+            settings.logger.info("[encode display video] benchmark video skipped, the ground truth images are not saved")
 
     # encoding the approach video stream
+    if not settings.save_result_img_flag:
+        settings.logger.info("[encode display video] skipped, the result images are not saved")
+        return
     os.chdir(settings.result_img_path)
     cmd = f"{ffmpeg_settings['ffmpeg_path']} " \
           f"-r {encoding_params['video_fps']} " \
@@ -373,7 +501,7 @@ def encode_display_video(settings):
           f"-y output.mp4 " \
           f"-loglevel {ffmpeg_settings['loglevel']}"
     settings.logger.debug(cmd)
-    os.system(cmd)
+    run_cmd(cmd, 'ffmpeg.encode_output')
 
 
 def get_interpolation(inter_mode):
@@ -435,15 +563,29 @@ def evaluate_misc(settings, arrival_list, video_size):
             max_bandwidth = chunk_size / settings.video_info['chunk_duration']
         total_size += chunk_size
 
-    # calculate average psnr and ssim
-    avg_psnr = round(np.average(settings.psnr), 3)
-    avg_ssim = round(np.average(settings.ssim), 3)
-    avg_mse = round(np.average(settings.mse), 3)
+    # calculate average psnr and ssim, over all frames when they are sampled
+    metric_sampler = settings.metric_sampler
+    avg_psnr = round(metric_sampler.average(settings.metric_frames, settings.psnr), 3)
+    avg_ssim = round(metric_sampler.average(settings.metric_frames, settings.ssim), 3)
+    avg_mse = round(metric_sampler.average(settings.metric_frames, settings.mse), 3)
 
     gc_score = calculate_gc_score(settings, total_size, video_size)
 
-    # calculate average vmaf
-    avg_vmaf = calculate_vmaf(settings.benchmark_img_path, settings.result_img_path)
+    # calculate average vmaf, streamed during the evaluation or computed from the saved images
+    if settings.vmaf_stream is not None:
+        avg_vmaf = settings.vmaf_score
+    elif settings.save_result_img_flag and settings.save_benchmark_flag and metric_sampler.is_full:
+        avg_vmaf = calculate_vmaf(settings.benchmark_img_path, settings.result_img_path,
+                                  settings.ffmpeg_settings['ffmpeg_path'], settings.vmaf_opt, settings.vmaf_log_path,
+                                  settings.last_img_index + 1)
+    elif not metric_sampler.is_full:
+        settings.logger.warning(f"[evaluation] vmaf is not calculated, since the metrics are sampled "
+                                f"({metric_sampler.describe()}) and vmaf needs consecutive frames")
+        avg_vmaf = None
+    else:
+        settings.logger.warning("[evaluation] vmaf is not calculated, since the result or benchmark images are not "
+                                "saved for every frame")
+        avg_vmaf = None
 
     # calculate 360PI metric
     metric_360PI, cost = calculate_metric_360PI(settings, total_size, video_size, avg_vmaf)
@@ -507,37 +649,48 @@ def calculate_metric_360PI(settings, total_bw, video_size, vmaf):
     return metric_360PI, [cost]
 
 
-def calculate_vmaf(benchmark_img_path, result_img_path):
+def calculate_vmaf(benchmark_img_path, result_img_path, ffmpeg_path='ffmpeg', vmaf_opt=None, log_path='erp.log',
+                   frame_num=None):
     """
     Parameters
     ----------
     benchmark_img_path
     result_img_path
+    ffmpeg_path: path of ffmpeg
+    vmaf_opt: the 'vmaf' settings of e3po.yml, with optional keys model, n_threads and n_subsample
+    log_path: path of the json log written by libvmaf, which should be unique per run
+    frame_num: number of frames of this run, the images beyond it are ignored
 
     Returns
     -------
     The calculated VMAF value.
     """
     command = [
-        'ffmpeg',
+        ffmpeg_path,
         '-i', result_img_path+"/%d.png",
         '-i', benchmark_img_path+"/%d.png",
         '-filter_complex',
-        'libvmaf=model=version=vmaf_4k_v0.6.1:log_path=erp.log',
+        build_libvmaf_filter(vmaf_opt or {}, log_path),
+        *(['-frames:v', str(frame_num)] if frame_num else []),
         '-f', 'null',
         '-'
     ]
 
     # execute the ffmpeg command and get the output result.
-    result = subprocess.run(command, capture_output=True, text=True)
+    with get_profiler().timer('ffmpeg.vmaf') as timer:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        stderr = process.stderr.read()
+        process.stderr.close()
+        _, cpu_s = wait_process(process)
+        timer.set_args(cmd=' '.join(command), cpu_s=cpu_s)
 
     # get the vmaf Score
-    for line in result.stderr.split('\n'):
+    for line in stderr.split('\n'):
         if 'VMAF score' in line:
             vmaf_score = float(line.split(':')[1].strip())
             return vmaf_score
 
-    return None
+    return read_vmaf_log(log_path)
 
 
 def calculate_distance(settings, cost, vmaf, cost_ori, vmaf_ori):
@@ -554,6 +707,8 @@ def calculate_distance(settings, cost, vmaf, cost_ori, vmaf_ori):
     -------
     The calculated distance between the point (cost, point) to the ground truth line.
     """
+    if vmaf is None:
+        return None
     trans_para = settings.system_opt['metric']['trans_para'] * 1000
 
     distance = abs(trans_para * cost - vmaf + (vmaf_ori - trans_para * cost_ori)) / np.sqrt(trans_para ** 2 + 1)
@@ -624,7 +779,7 @@ def calculate_gc_score(settings, total_bw, video_size):
     else:
         raise ValueError("error when read the approach mode!")
 
-    mse = round(np.average(settings.mse), 3)
+    mse = round(settings.metric_sampler.average(settings.metric_frames, settings.mse), 3)
     w_1 = settings.gc_metrics['gc_w1']
     w_2 = settings.gc_metrics['gc_w2']
     w_3 = settings.gc_metrics['gc_w3']
@@ -0,0 +1,106 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import cv2
+import numpy as np
+from e3po.utils.projection_utilities import fov_to_3d_polar_coord, _3d_polar_coord_to_pixel_coord
+from e3po.utils.profiler import get_profiler
+
+
+class FovContext:
+    """
+    Per-frame fov context, shared by the approach and the benchmark generator.
+
+    The 3d polar coordinates of the fov rays and the pixel maps of each projection are computed lazily
+    and memoized, such that every consumer of the same frame reuses them, and nothing is computed at all
+    when no consumer asks for them.
+
+    Parameters
+    ----------
+    curr_motion: dict
+        current motion, with format {yaw, pitch, scale}
+    range_fov: list
+        degree range of fov, with format [height, width]
+    fov_resolution: list
+        fov resolution, with format [height, width]
+    """
+
+    def __init__(self, curr_motion, range_fov, fov_resolution):
+        self.fov_ypr = [float(curr_motion['yaw']), float(curr_motion['pitch']), 0]
+        self.range_fov = range_fov
+        self.fov_resolution = fov_resolution
+        self._polar_coord = None
+        self._pixel_coord = {}
+        self._remap = {}
+
+    @property
+    def polar_coord(self):
+        """3D polar coordinates of the fov rays, with format [phi, theta]."""
+        if self._polar_coord is None:
+            with get_profiler().timer('projection.fov_rays'):
+                self._polar_coord = fov_to_3d_polar_coord(self.fov_ypr, self.range_fov, self.fov_resolution)
+        return self._polar_coord
+
+    def get_pixel_coord(self, projection_type, resolution):
+        """
+        Get the pixel coordinates of the fov rays in the given projection.
+
+        Parameters
+        ----------
+        projection_type: str
+            projection format
+        resolution: list
+            resolution of the projected video, with format [height, width]
+
+        Returns
+        -------
+        pixel_coord: list
+            the pixel coordinates, with format [coor_x, coor_y]
+        """
+
+        key = (projection_type, int(resolution[0]), int(resolution[1]))
+        if key not in self._pixel_coord:
+            polar_coord = self.polar_coord
+            with get_profiler().timer('projection.pixel_coord'):
+                self._pixel_coord[key] = _3d_polar_coord_to_pixel_coord(polar_coord, projection_type, resolution)
+        return self._pixel_coord[key]
+
+    def get_remap(self, projection_type, resolution):
+        """
+        Get the cv2 fixed-point remapping tables of the fov in the given projection.
+
+        Parameters
+        ----------
+        projection_type: str
+            projection format
+        resolution: list
+            resolution of the projected video, with format [height, width]
+
+        Returns
+        -------
+        tuple
+            (dstMap_u, dstMap_v), which can be passed to cv2.remap directly
+        """
+
+        key = (projection_type, int(resolution[0]), int(resolution[1]))
+        if key not in self._remap:
+            pixel_coord = self.get_pixel_coord(projection_type, resolution)
+            with get_profiler().timer('projection.remap_tables'):
+                self._remap[key] = cv2.convertMaps(pixel_coord[0].astype(np.float32), pixel_coord[1].astype(np.float32), cv2.CV_16SC2)
+        return self._remap[key]
@@ -0,0 +1,151 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import queue
+import threading
+import os.path as osp
+import cv2
+import numpy as np
+from e3po.utils.logger import get_logger
+
+_active_sink = None
+
+
+def as_uint8(frame):
+    """
+    Convert a frame into uint8, with the same rounding and saturation as cv2.imwrite, such that the frame
+    equals what a png round trip would have returned.
+    """
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint8:
+        return frame
+    return np.clip(np.rint(frame), 0, 255).astype(np.uint8)
+
+
+class AsyncImageWriter:
+    """
+    Background thread writing images to disk, such that image encoding does not block the evaluation loop.
+
+    Parameters
+    ----------
+    max_pending: int
+        maximum number of images waiting to be written, put() blocks beyond it
+    """
+
+    def __init__(self, max_pending=16):
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name='e3po_image_writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                uri, frame = item
+                if not cv2.imwrite(uri, frame, [cv2.IMWRITE_JPEG_QUALITY, 100]):
+                    get_logger().error(f"[image writer] failed to write {uri}")
+            finally:
+                self._queue.task_done()
+
+    def write(self, uri, frame):
+        """Write frame to uri in the background."""
+        self._queue.put((uri, frame))
+
+    def flush(self):
+        """Wait until all pending images are written."""
+        self._queue.join()
+
+    def close(self):
+        """Write all pending images and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class FrameSink:
+    """
+    In-memory handoff of the frames generated by approaches to the metric calculation.
+
+    While the sink is active, save_video_frame() stores the frames under root_dir in the sink instead of
+    writing them to disk, and the evaluator takes them back by uri. Disk writes become optional and
+    asynchronous, through the writer.
+
+    Parameters
+    ----------
+    root_dir: str
+        directory of the frame uris captured by the sink
+    writer: AsyncImageWriter
+        writer of the captured frames, None to keep them in memory only
+    """
+
+    def __init__(self, root_dir, writer=None):
+        self.root_dir = osp.abspath(root_dir)
+        self.writer = writer
+        self._frames = {}
+
+    def captures(self, uri):
+        """Whether frames written to uri are captured by the sink."""
+        return osp.dirname(osp.abspath(uri)) == self.root_dir
+
+    def put(self, uri, frame):
+        """Store the frame, and write it to disk in the background if the sink has a writer."""
+        frame = as_uint8(frame)
+        self._frames[uri] = frame
+        if self.writer is not None:
+            self.writer.write(uri, frame)
+
+    def take(self, uri):
+        """
+        Take the frame stored for uri, or read it from disk if the approach wrote it by itself.
+
+        Parameters
+        ----------
+        uri: str
+            uri of the frame
+
+        Returns
+        -------
+        frame: array
+            the frame in uint8 BGR
+        """
+
+        frame = self._frames.pop(uri, None)
+        if frame is None:
+            frame = cv2.imread(uri)
+            assert frame is not None, f"[error] frame {uri} was neither handed over nor written"
+        return frame
+
+    def close(self):
+        """Drop the frames which have not been taken, and finish the pending writes."""
+        self._frames.clear()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def set_frame_sink(sink):
+    """Activate sink for save_video_frame(), None to write frames to disk directly again."""
+    global _active_sink
+    _active_sink = sink
+
+
+def get_frame_sink():
+    """The active frame sink, or None."""
+    return _active_sink
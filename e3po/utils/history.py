@@ -0,0 +1,263 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import numpy as np
+
+
+class RingHistory:
+    """
+    Bounded history backed by one NumPy array per column.
+
+    Every sample is written twice, at pos and pos + capacity of arrays with 2 * capacity entries, such that
+    the latest n (n <= capacity) samples always form a contiguous slice, and windows are zero-copy views.
+    Indexing follows list semantics over the retained samples, i.e. history[0] is the oldest retained
+    sample and history[-1] the latest one.
+
+    Parameters
+    ----------
+    columns: list
+        each item with format (name, dtype)
+    capacity: int
+        maximum number of retained samples
+    """
+
+    item_class = None
+
+    def __init__(self, columns, capacity):
+        assert capacity > 0, '[error] history capacity should be positive'
+        self.capacity = int(capacity)
+        self.columns = [name for name, _ in columns]
+        self.total_count = 0
+        self._data = {name: np.zeros(2 * self.capacity, dtype=dtype) for name, dtype in columns}
+
+    def push(self, *values):
+        """Append one sample, with values given in column order."""
+        pos = self.total_count % self.capacity
+        for name, value in zip(self.columns, values):
+            column = self._data[name]
+            column[pos] = value
+            column[pos + self.capacity] = value
+        self.total_count += 1
+
+    def __len__(self):
+        return min(self.total_count, self.capacity)
+
+    def _end(self):
+        """Storage position right after the latest sample."""
+        return (self.total_count - 1) % self.capacity + self.capacity + 1
+
+    def _position(self, idx):
+        size = len(self)
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError('history index out of range')
+        return self._end() - size + idx
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.item_class(self, self._position(i)) for i in range(*idx.indices(len(self)))]
+        return self.item_class(self, self._position(idx))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.item_class(self, self._position(i))
+
+    def value(self, name, pos):
+        """Python value of column name at storage position pos."""
+        return self._data[name][pos].item()
+
+    def window(self, n=None):
+        """
+        Read-only views of the latest n samples.
+
+        Parameters
+        ----------
+        n: int
+            number of samples, all retained samples if None
+
+        Returns
+        -------
+        dict
+            column name to array view, in ascending order of time
+        """
+
+        size = len(self)
+        n = size if n is None else max(0, min(int(n), size))
+        end = self._end() if size else 0
+        window = {}
+        for name in self.columns:
+            view = self._data[name][end - n:end]
+            view.flags.writeable = False
+            window[name] = view
+        return window
+
+    def window_ms(self, duration_ms, ts_name):
+        """
+        Read-only views of the samples within the latest duration_ms.
+
+        Parameters
+        ----------
+        duration_ms: int
+            window length, in milliseconds
+        ts_name: str
+            the (ascending) timestamp column
+
+        Returns
+        -------
+        dict
+            column name to array view, in ascending order of time
+        """
+
+        window = self.window()
+        ts = window[ts_name]
+        if len(ts) == 0:
+            return window
+        start = np.searchsorted(ts, ts[-1] - duration_ms, side='right')
+        return {name: view[start:] for name, view in window.items()}
+
+
+class MotionSample:
+    """
+    Read-only view of one sample in MotionHistory, which can be accessed as the legacy dict
+    {'motion_ts', 'system_ts', 'motion_record'}.
+    """
+
+    __slots__ = ('_history', '_pos')
+
+    _fields = ('motion_ts', 'system_ts', 'motion_record')
+
+    def __init__(self, history, pos):
+        self._history = history
+        self._pos = pos
+
+    @property
+    def motion_ts(self):
+        return self._history.value('motion_ts', self._pos)
+
+    @property
+    def system_ts(self):
+        return self._history.value('system_ts', self._pos)
+
+    @property
+    def motion_record(self):
+        history, pos = self._history, self._pos
+        return {name: history.value(name, pos) for name in MotionHistory.record_keys}
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return list(self._fields)
+
+
+class MotionHistory(RingHistory):
+    """
+    Bounded motion history, which replaces the list of {'motion_ts', 'system_ts', 'motion_record'} dicts.
+
+    Parameters
+    ----------
+    capacity: int
+        maximum number of retained motion samples
+    """
+
+    item_class = MotionSample
+    record_keys = ('yaw', 'pitch', 'roll', 'scale')
+
+    def __init__(self, capacity):
+        super(MotionHistory, self).__init__([
+            ('motion_ts', np.int64),
+            ('system_ts', np.float64),
+            ('yaw', np.float64),
+            ('pitch', np.float64),
+            ('roll', np.float64),
+            ('scale', np.int64)
+        ], capacity)
+
+    def append(self, motion_info):
+        """Append one sample given in the legacy format {'motion_ts', 'system_ts', 'motion_record'}."""
+        motion_record = motion_info['motion_record']
+        self.push(motion_info['motion_ts'], motion_info['system_ts'], motion_record['yaw'],
+                  motion_record['pitch'], motion_record.get('roll', 0), motion_record['scale'])
+
+
+class NetworkSample:
+    """
+    Read-only view of one record in NetworkHistory, which can be accessed as the legacy dict
+    {'start_ms', 'duration_ms', 'throughput_MBps', 'rtt_ms'}.
+    """
+
+    __slots__ = ('_history', '_pos')
+
+    def __init__(self, history, pos):
+        self._history = history
+        self._pos = pos
+
+    def __getitem__(self, key):
+        if key not in self._history.columns:
+            raise KeyError(key)
+        return self._history.value(key, self._pos)
+
+    def __contains__(self, key):
+        return key in self._history.columns
+
+    def get(self, key, default=None):
+        return self[key] if key in self._history.columns else default
+
+    def keys(self):
+        return list(self._history.columns)
+
+
+class NetworkHistory(RingHistory):
+    """
+    Bounded network history, which replaces the list of network record dicts.
+
+    Parameters
+    ----------
+    capacity: int
+        maximum number of retained network records
+    """
+
+    item_class = NetworkSample
+
+    def __init__(self, capacity):
+        super(NetworkHistory, self).__init__([
+            ('start_ms', np.float64),
+            ('duration_ms', np.float64),
+            ('throughput_MBps', np.float64),
+            ('rtt_ms', np.float64)
+        ], capacity)
+
+    def append(self, network_record):
+        """Append one record given in the legacy dict format."""
+        self.push(network_record['start_ms'], network_record['duration_ms'],
+                  network_record['throughput_MBps'], network_record['rtt_ms'])
+
+
+def history_count(history):
+    """Total number of samples ever appended to history, which also accepts plain lists."""
+    return getattr(history, 'total_count', len(history))
@@ -20,8 +20,11 @@
 import os
 import json
 import os.path as osp
+from e3po.utils.tile_layout import encode_tile_id
+from e3po.utils.profiler import timed
 
 
+@timed('json.write_video_json')
 def write_video_json(json_path, dst_video_size, chunk_info, user_video_spec):
     """
     Write result to json file in json_path
@@ -43,10 +46,7 @@ def write_video_json(json_path, dst_video_size, chunk_info, user_video_spec):
 
     chunk_idx = user_video_spec['tile_info']['chunk_idx']
     tile_idx = user_video_spec['tile_info']['tile_idx']
-    if tile_idx != -1:
-        result_video_name = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(tile_idx).zfill(3)}"
-    else:
-        result_video_name = f"chunk_{str(chunk_idx).zfill(4)}_background"
+    result_video_name = encode_tile_id(chunk_idx, tile_idx)
 
     if osp.exists(json_path):
         with open(json_path, 'r') as file:
@@ -70,6 +70,7 @@ def write_video_json(json_path, dst_video_size, chunk_info, user_video_spec):
             json.dump(json_data, file, indent=2, sort_keys=True)
 
 
+@timed('json.write_decision_json')
 def write_decision_json(json_path, curr_ts, dl_list):
     """
     Given the decision JSON path, write the decision results
@@ -109,6 +110,7 @@ def write_decision_json(json_path, curr_ts, dl_list):
             json.dump(result, file, indent=2, sort_keys=True)
 
 
+@timed('json.read_video_json')
 def read_video_json(video_json_path):
     """
     Read the video_json file
@@ -131,6 +133,7 @@ def read_video_json(video_json_path):
         raise ValueError(f"Error reading file: {video_json_path}")
 
 
+@timed('json.read_decision_json')
 def read_decision_json(decision_json_path):
     """
     Read the decision_json file
@@ -151,6 +154,7 @@ def read_decision_json(decision_json_path):
     return decision_record
 
 
+@timed('json.write_evaluation_json')
 def write_evaluation_json(result, json_path):
     """
     Write result to json file in json_path
@@ -222,6 +226,7 @@ def get_tile_info(video_size, tile_id):
     return tile_info
 
 
+@timed('json.update_video_json')
 def update_video_json(video_json_path, dst_video_sizes):
     """
     For transcoding approach, update the video size
@@ -241,8 +246,7 @@ def update_video_json(video_json_path, dst_video_sizes):
     video_json = read_video_json(video_json_path)
     for chunk_idx in range(len(dst_video_sizes)):
         frame_size = dst_video_sizes[chunk_idx]['frame_size']
-        tile_index = 1
-        frame_id = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(tile_index).zfill(3)}"
+        frame_id = encode_tile_id(chunk_idx, 1)
         video_json[frame_id]['video_size'] = frame_size
 
     with open(video_json_path, 'w') as file:
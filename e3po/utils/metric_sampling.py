@@ -0,0 +1,248 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import math
+import numpy as np
+
+SAMPLING_POLICIES = ('every_k', 'random', 'stratified')
+Z_95 = 1.959963984540054            # two-sided 95% quantile of the standard normal distribution
+
+
+class MetricSampler:
+    """
+    Selects the frames whose quality metrics are calculated, and summarizes the sampled values.
+
+    With k = psnr_ssim_frequency, one out of every k frames is sampled:
+    'every_k' takes the frames whose index is a multiple of k, 'random' takes a fixed-seed random subset of
+    the video, and 'stratified' takes a fixed-seed random subset of every chunk.
+
+    Parameters
+    ----------
+    policy: str
+        sampling policy, one of SAMPLING_POLICIES
+    frequency: int
+        k, i.e. the inverse of the sampled fraction of frames
+    total_frame_num: int
+        number of frames of the video
+    chunk_frame_num: int
+        number of frames of each chunk
+    seed: int
+        random seed of the random and stratified policies
+    """
+
+    def __init__(self, policy, frequency, total_frame_num, chunk_frame_num, seed=0):
+        if policy not in SAMPLING_POLICIES:
+            raise ValueError(f"[metric sampling] policy should be one of {SAMPLING_POLICIES}, got {policy}")
+        assert frequency >= 1, '[error] psnr_ssim_frequency should be at least 1'
+        self.policy = policy
+        self.frequency = int(frequency)
+        self.total_frame_num = int(total_frame_num)
+        self.chunk_frame_num = int(chunk_frame_num)
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        if self.frequency == 1 or policy == 'every_k':
+            sampled = np.arange(0, self.total_frame_num, self.frequency)
+        elif policy == 'random':
+            sample_num = math.ceil(self.total_frame_num / self.frequency)
+            sampled = rng.choice(self.total_frame_num, sample_num, replace=False)
+        else:
+            sampled = []
+            for start in range(0, self.total_frame_num, self.chunk_frame_num):
+                stratum_size = min(self.chunk_frame_num, self.total_frame_num - start)
+                sample_num = math.ceil(stratum_size / self.frequency)
+                sampled.extend(start + rng.choice(stratum_size, sample_num, replace=False))
+        self.sampled_frames = frozenset(int(frame_idx) for frame_idx in sampled)
+
+    @property
+    def is_full(self):
+        """Whether every frame is sampled."""
+        return self.frequency == 1
+
+    def is_sampled(self, frame_idx):
+        """Whether the metrics of the frame are calculated. Frames beyond the video length are always sampled."""
+        return self.is_full or frame_idx >= self.total_frame_num or frame_idx in self.sampled_frames
+
+    def describe(self):
+        """Short description of the sampling, e.g. 'stratified 1/5 (seed 0)'."""
+        if self.is_full:
+            return 'all frames'
+        seed = f" (seed {self.seed})" if self.policy != 'every_k' else ''
+        return f"{self.policy} 1/{self.frequency}{seed}"
+
+    def _strata(self, frame_idx_list):
+        """
+        Strata of the stratified policy, i.e. the chunks of the sampled frames.
+
+        Returns
+        -------
+        list
+            (mask, stratum_size) of each chunk, where mask selects its sampled frames and stratum_size is its
+            number of frames, which are all sampled beyond the video length
+        """
+
+        strata = np.asarray(frame_idx_list, dtype=np.int64) // self.chunk_frame_num
+        result = []
+        for stratum in np.unique(strata):
+            mask = strata == stratum
+            stratum_size = min(self.chunk_frame_num, self.total_frame_num - int(stratum) * self.chunk_frame_num)
+            result.append((mask, max(stratum_size, int(mask.sum()))))
+        return result
+
+    @staticmethod
+    def _collapse_strata(strata):
+        """
+        Merge the strata whose variance can not be estimated, i.e. with a single sample out of several frames,
+        with their neighbours, until every group has at least 2 samples or is sampled completely.
+
+        The variance of the merged groups also counts the differences between their chunks, so the resulting
+        confidence interval is conservative.
+
+        Parameters
+        ----------
+        strata: list
+            (mask, stratum_size) of each chunk in frame order, see _strata
+
+        Returns
+        -------
+        list
+            (mask, group_size) of each group
+        """
+
+        groups, pending = [], None
+        for mask, stratum_size in strata:
+            if pending is not None:
+                mask, stratum_size = pending[0] | mask, pending[1] + stratum_size
+            sample_num = int(mask.sum())
+            if sample_num >= 2 or sample_num == stratum_size:
+                groups.append((mask, stratum_size))
+                pending = None
+            else:
+                pending = (mask, stratum_size)
+        if pending is not None:
+            if groups:
+                mask, stratum_size = groups.pop()
+                pending = (pending[0] | mask, pending[1] + stratum_size)
+            groups.append(pending)
+        return groups
+
+    def average(self, frame_idx_list, values):
+        """
+        Estimated average of a metric over all frames, from the sampled frames.
+
+        The chunks are weighted by their number of frames for the stratified policy, since a short last chunk is
+        sampled at a higher rate than the others.
+
+        Parameters
+        ----------
+        frame_idx_list: list
+            index of each sampled frame
+        values: list
+            metric value of each sampled frame
+
+        Returns
+        -------
+        float
+            the average, nan if no frame is sampled
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return float('nan')
+        if self.is_full or self.policy != 'stratified':
+            return float(values.mean())
+        strata = self._strata(frame_idx_list)
+        population = sum(stratum_size for _, stratum_size in strata)
+        return float(sum(stratum_size / population * values[mask].mean() for mask, stratum_size in strata))
+
+    def confidence_interval(self, frame_idx_list, values):
+        """
+        95% confidence interval of the average of a metric over all frames, estimated from the sampled frames.
+
+        The standard error includes the finite population correction, and is pooled per chunk with the weights
+        of average for the stratified policy, where the chunks with a single sample are merged with their
+        neighbours. The interval collapses to the average when every frame is sampled.
+
+        Parameters
+        ----------
+        frame_idx_list: list
+            index of each sampled frame
+        values: list
+            metric value of each sampled frame
+
+        Returns
+        -------
+        tuple
+            (low, high), None if it can not be estimated
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        sample_num = len(values)
+        if sample_num == 0 or not np.all(np.isfinite(values)):
+            return None
+        mean = self.average(frame_idx_list, values)
+        if self.is_full:
+            return mean, mean
+        if sample_num < 2:
+            return None
+
+        if self.policy == 'stratified':
+            strata = self._strata(frame_idx_list)
+            population = sum(stratum_size for _, stratum_size in strata)
+            variance = 0
+            for mask, stratum_size in self._collapse_strata(strata):
+                stratum_values = values[mask]
+                if len(stratum_values) < 2:         # sampled completely
+                    continue
+                weight = stratum_size / population
+                correction = max(0., 1 - len(stratum_values) / stratum_size)
+                variance += weight ** 2 * correction * stratum_values.var(ddof=1) / len(stratum_values)
+        else:
+            population = max(self.total_frame_num, sample_num)
+            correction = max(0., 1 - sample_num / population)
+            variance = correction * values.var(ddof=1) / sample_num
+
+        half_width = Z_95 * math.sqrt(variance)
+        return mean - half_width, mean + half_width
+
+
+def build_metric_sampler(system_opt):
+    """
+    Build the metric sampler from the 'metric' and 'video' settings of e3po.yml.
+
+    Parameters
+    ----------
+    system_opt: dict
+        system configuration information
+
+    Returns
+    -------
+    MetricSampler
+        the sampler, which samples every frame with the default settings
+    """
+
+    metric_opt = system_opt['metric']
+    video_opt = system_opt['video']
+    return MetricSampler(
+        policy=metric_opt.get('metric_sampling') or 'every_k',
+        frequency=metric_opt.get('psnr_ssim_frequency') or 1,
+        total_frame_num=video_opt['video_duration'] * video_opt['video_fps'],
+        chunk_frame_num=video_opt['chunk_duration'] * video_opt['video_fps'],
+        seed=metric_opt.get('metric_sample_seed') or 0
+    )
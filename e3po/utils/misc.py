@@ -19,7 +19,10 @@
 
 import os
 import cv2
+import subprocess
 import os.path as osp
+from e3po.utils.frame_sink import get_frame_sink
+from e3po.utils.profiler import get_profiler, wait_process
 
 
 def scan_file_name(dir_path, suffix=None):
@@ -48,6 +51,30 @@ def scan_file_name(dir_path, suffix=None):
     return result
 
 
+def run_cmd(cmd, stage='ffmpeg'):
+    """
+    Run a shell command, e.g. of ffmpeg, and record its duration in the profiler,
+    with the command and its cpu time in the trace span.
+
+    Parameters
+    ----------
+    cmd: str
+        the command
+    stage: str
+        profiler stage of the command
+
+    Returns
+    -------
+    int
+        the exit code of the command
+    """
+
+    with get_profiler().timer(stage) as timer:
+        returncode, cpu_s = wait_process(subprocess.Popen(cmd, shell=True))
+        timer.set_args(cmd=cmd, cpu_s=cpu_s)
+    return returncode
+
+
 def generate_motion_clock(settings, motion_record):
     """
     Generate client-side clock, based on the motion trace
@@ -84,14 +111,14 @@ def update_motion(motion_ts, curr_ts, motion_history, motion_record):
         motion timestamp
     curr_ts: int
         current system timestamp
-    motion_history: list
+    motion_history: MotionHistory or list
         record historical motion information
     motion_record: dict
         head movement, with format {yaw, pitch, roll}
 
     Returns
     -------
-    motion_history: list
+    motion_history: MotionHistory or list
         updated historical motion information
     """
 
@@ -107,7 +134,7 @@ def update_motion(motion_ts, curr_ts, motion_history, motion_record):
 
 def save_video_frame(dst_video_frame_uri, dst_video_frame):
     """
-    Write video frame to image file
+    Write video frame to image file, or hand it over in memory if an active frame sink captures the uri
 
     Parameters
     ----------
@@ -121,6 +148,10 @@ def save_video_frame(dst_video_frame_uri, dst_video_frame):
         None
     """
 
+    frame_sink = get_frame_sink()
+    if frame_sink is not None and frame_sink.captures(dst_video_frame_uri):
+        frame_sink.put(dst_video_frame_uri, dst_video_frame)
+        return
     cv2.imwrite(dst_video_frame_uri, dst_video_frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
 
 
@@ -0,0 +1,204 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import os
+import json
+import numpy as np
+import os.path as osp
+from e3po.utils.logger import get_logger
+from e3po.utils.motion_trace import MotionTrace, calc_default_scale
+
+MOTION_DATASET_VERSION = 1
+MOTION_FIELDS = ['yaw', 'pitch', 'roll', 'scale']
+
+_dataset_cache = {}
+
+
+def get_dataset_uri(client_log_path):
+    """
+    Uri of the binary dataset cached next to the client log, with format (npy_uri, header_uri).
+    """
+    stem = osp.splitext(client_log_path)[0]
+    return f"{stem}.motion.npy", f"{stem}.motion.json"
+
+
+def get_source_key(client_log_path):
+    """The size and mtime of the client log, which the cached dataset is keyed by."""
+    stat = os.stat(client_log_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def _iter_user_rows(f):
+    """Yield the (pitch, yaw) line pairs of each user, the first line of the file being timestamps."""
+    _ = f.readline()
+    while True:
+        line_pitch = f.readline().rstrip('\n')
+        line_yaw = f.readline().rstrip('\n')
+        if ' ' not in line_pitch:
+            break
+        yield line_pitch, line_yaw
+
+
+def convert_client_log(client_log_path, npy_uri=None, header_uri=None):
+    """
+    Convert the client log into a binary dataset, i.e. a users x samples x {yaw, pitch, roll, scale}
+    npy array that can be memory-mapped, together with a json header.
+    Users with fewer samples are padded with nan.
+
+    Parameters
+    ----------
+    client_log_path: str
+        path to client log file
+    npy_uri: str
+        uri of the generated array, defaults to the cache next to the client log
+    header_uri: str
+        uri of the generated header, defaults to the cache next to the client log
+
+    Returns
+    -------
+    header: dict
+        the dataset header
+    """
+    default_npy_uri, default_header_uri = get_dataset_uri(client_log_path)
+    npy_uri = npy_uri or default_npy_uri
+    header_uri = header_uri or default_header_uri
+    source_key = get_source_key(client_log_path)
+
+    # the first pass only counts the samples of each user
+    with open(client_log_path, 'r') as f:
+        sample_counts = [line_yaw.count(' ') + 1 for _, line_yaw in _iter_user_rows(f)]
+    user_num, sample_num = len(sample_counts), max(sample_counts, default=0)
+
+    tmp_npy_uri = f"{npy_uri}.{os.getpid()}.tmp.npy"
+    data = np.lib.format.open_memmap(tmp_npy_uri, mode='w+', dtype=np.float64, shape=(user_num, sample_num, len(MOTION_FIELDS)))
+    data[:] = np.nan
+    with open(client_log_path, 'r') as f:
+        for user_idx, (line_pitch, line_yaw) in enumerate(_iter_user_rows(f)):
+            yaw = np.array(line_yaw.split(' '), dtype=np.float64)
+            n = len(yaw)
+            data[user_idx, :n, 0] = yaw
+            data[user_idx, :n, 1] = np.array(line_pitch.split(' '), dtype=np.float64)[:n]
+            data[user_idx, :n, 2] = 0
+            data[user_idx, :n, 3] = calc_default_scale(n)
+    data.flush()
+    del data
+    os.replace(tmp_npy_uri, npy_uri)
+
+    header = {
+        'version': MOTION_DATASET_VERSION,
+        'fields': MOTION_FIELDS,
+        'user_num': user_num,
+        'sample_num': sample_num,
+        'sample_counts': sample_counts,
+        **source_key
+    }
+    tmp_header_uri = f"{header_uri}.{os.getpid()}.tmp"
+    with open(tmp_header_uri, 'w') as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_header_uri, header_uri)
+
+    return header
+
+
+class MotionDataset:
+    """
+    Memory-mapped binary motion dataset, from which any user or batch of users is read without parsing
+    the client log again.
+
+    Parameters
+    ----------
+    npy_uri: str
+        uri of the dataset array
+    header: dict
+        the dataset header
+    """
+
+    def __init__(self, npy_uri, header):
+        self.header = header
+        self.data = np.load(npy_uri, mmap_mode='r')
+        self.sample_counts = header['sample_counts']
+
+    @property
+    def user_num(self):
+        return self.header['user_num']
+
+    def read_user(self, user_index, interval):
+        """
+        Read the motion samples of one user.
+
+        Parameters
+        ----------
+        user_index: int
+            index of the user in the client log, starting from 1
+        interval: int
+            the motion sampling interval of the client log, in milliseconds
+
+        Returns
+        -------
+        MotionTrace
+            client record before frame filling
+        """
+        if not 1 <= user_index <= self.user_num:
+            raise ValueError(f"[error] user {user_index} not found, the dataset has {self.user_num} users")
+        n = self.sample_counts[user_index - 1]
+        samples = self.data[user_index - 1, :n]
+        return MotionTrace(np.arange(n, dtype=np.int64) * interval, samples[:, 0], samples[:, 1],
+                           samples[:, 3].astype(np.int64), samples[:, 2])
+
+    def read_users(self, user_index_list, interval):
+        """Read the motion samples of a batch of users, see read_user."""
+        return [self.read_user(user_index, interval) for user_index in user_index_list]
+
+
+def open_motion_dataset(client_log_path):
+    """
+    Open the binary dataset of the client log. It is converted and cached next to the client log on the
+    first use, and converted again whenever the size or mtime of the client log changes.
+
+    Parameters
+    ----------
+    client_log_path: str
+        path to client log file
+
+    Returns
+    -------
+    dataset: MotionDataset
+        the opened dataset
+    """
+
+    npy_uri, header_uri = get_dataset_uri(client_log_path)
+    source_key = get_source_key(client_log_path)
+    cached = _dataset_cache.get(npy_uri)
+    if cached is not None and all(cached.header[key] == value for key, value in source_key.items()):
+        return cached
+
+    header = None
+    if osp.exists(header_uri) and osp.exists(npy_uri):
+        with open(header_uri, 'r') as f:
+            header = json.load(f)
+        if header.get('version') != MOTION_DATASET_VERSION or \
+                any(header.get(key) != value for key, value in source_key.items()):
+            header = None
+    if header is None:
+        get_logger().info(f"[motion dataset] convert {client_log_path}")
+        header = convert_client_log(client_log_path, npy_uri, header_uri)
+
+    dataset = MotionDataset(npy_uri, header)
+    _dataset_cache[npy_uri] = dataset
+    return dataset
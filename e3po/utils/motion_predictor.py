@@ -0,0 +1,145 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+from copy import deepcopy
+from e3po.utils.logger import get_logger
+from e3po.utils.registry import motion_predictor_registry
+from e3po.utils.history import history_count
+
+MOTION_KEYS = ('yaw', 'pitch', 'scale')
+
+
+class BaseMotionPredictor:
+    """
+    Base class of the incremental motion predictors.
+
+    A predictor keeps its own state and consumes every motion sample exactly once, so the cost of a
+    prediction does not grow with the length of the motion history.
+    Subclasses implement update() and predict().
+    """
+
+    def __init__(self):
+        self.sample_count = 0
+
+    def reset(self):
+        """Drop the predictor state."""
+        self.sample_count = 0
+
+    def update(self, motion_record):
+        """
+        Consume one motion sample.
+
+        Parameters
+        ----------
+        motion_record: dict
+            head movement, with format {yaw, pitch, scale}
+        """
+        raise NotImplementedError
+
+    def observe(self, motion_history):
+        """
+        Consume the samples appended to motion_history since the last call.
+
+        Parameters
+        ----------
+        motion_history: MotionHistory or list
+            historical motion information, each item with format {motion_ts, system_ts, motion_record}
+        """
+
+        total_count = history_count(motion_history)
+        if total_count < self.sample_count:     # a new history has been started
+            self.reset()
+        # samples that have already left a bounded history are skipped
+        new_count = min(total_count - self.sample_count, len(motion_history))
+        for i in range(len(motion_history) - new_count, len(motion_history)):
+            self.update(motion_history[i]['motion_record'])
+        self.sample_count = total_count
+
+    def predict(self, motion_prediction_size):
+        """
+        Predict the motion of the future chunks.
+
+        Parameters
+        ----------
+        motion_prediction_size: int
+            the size of motion to be predicted
+
+        Returns
+        -------
+        predicted_record: list
+            the predicted motion of each chunk, with format {yaw, pitch, scale}
+        """
+        raise NotImplementedError
+
+
+@motion_predictor_registry.register()
+class EwmaMotionPredictor(BaseMotionPredictor):
+    """
+    Exponential smoothing motion predictor, which uses the same predicted motion for all chunks in pw.
+
+    Parameters
+    ----------
+    alpha: float
+        weight of the previous state in exponential smoothing
+    """
+
+    def __init__(self, alpha=0.3):
+        super(EwmaMotionPredictor, self).__init__()
+        self.alpha = alpha
+        self.state = None
+
+    def reset(self):
+        super(EwmaMotionPredictor, self).reset()
+        self.state = None
+
+    def update(self, motion_record):
+        if self.state is None:
+            self.state = {key: motion_record[key] for key in MOTION_KEYS}
+            return
+        a = self.alpha
+        for key in MOTION_KEYS:
+            self.state[key] = a * self.state[key] + (1 - a) * motion_record[key]
+
+    def predict(self, motion_prediction_size):
+        return [dict(self.state) for _ in range(motion_prediction_size)]
+
+
+def build_motion_predictor(opt):
+    """
+    Build motion predictor from options.
+
+    Parameters
+    ----------
+    opt : dict
+        It must contain a key named: 'type', the other keys are passed to the predictor
+
+    Returns
+    -------
+    object
+        Class object generated based on opt.
+
+    Examples
+    --------
+    >> predictor = build_motion_predictor({'type': 'EwmaMotionPredictor', 'alpha': 0.3})
+    """
+    opt = deepcopy(opt)
+    predictor_type = opt.pop('type')
+    predictor = motion_predictor_registry[predictor_type](**opt)
+    get_logger().debug(f'[create motion predictor] {predictor.__class__.__name__} is created')
+    return predictor
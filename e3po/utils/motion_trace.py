@@ -17,11 +17,95 @@
 # along with this program; if not, see:
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
 
-from collections import OrderedDict
 import os
+import numpy as np
+from e3po.utils.logger import get_logger
 
 
-def pre_processing_client_log(opt):
+class MotionTrace:
+    """
+    Motion trace stored as contiguous arrays, in ascending order of timestamp.
+
+    It can be accessed as the legacy ordered dict {motion_ts: {'yaw', 'pitch', 'scale'}}, e.g.
+    motion_record[motion_ts] or motion_record.keys().
+
+    Parameters
+    ----------
+    motion_ts: array
+        timestamps of the motion samples, in millisecond
+    yaw: array
+        yaw of each sample, in radian
+    pitch: array
+        pitch of each sample, in radian
+    scale: array
+        scale of each sample
+    roll: array
+        roll of each sample, which is omitted from the accessed records if None
+    """
+
+    def __init__(self, motion_ts, yaw, pitch, scale, roll=None):
+        self.motion_ts = np.ascontiguousarray(motion_ts)
+        self.yaw = np.ascontiguousarray(yaw, dtype=np.float64)
+        self.pitch = np.ascontiguousarray(pitch, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale)
+        self.roll = None if roll is None else np.ascontiguousarray(roll, dtype=np.float64)
+
+    @classmethod
+    def from_dict(cls, client_record):
+        """Build the trace from the legacy ordered dict."""
+        values = list(client_record.values())
+        roll = [value['roll'] for value in values] if values and all('roll' in value for value in values) else None
+        return cls(np.array(list(client_record.keys())), [value['yaw'] for value in values],
+                   [value['pitch'] for value in values], np.array([value['scale'] for value in values]), roll)
+
+    def index(self, motion_ts):
+        """Array index of the sample at motion_ts."""
+        idx = int(np.searchsorted(self.motion_ts, motion_ts))
+        if idx >= len(self.motion_ts) or self.motion_ts[idx] != motion_ts:
+            raise KeyError(motion_ts)
+        return idx
+
+    def record(self, idx):
+        """Motion record of the sample at array index idx, with format {yaw, pitch, scale}."""
+        record = {'yaw': self.yaw[idx].item(), 'pitch': self.pitch[idx].item()}
+        if self.roll is not None:
+            record['roll'] = self.roll[idx].item()
+        record['scale'] = self.scale[idx].item()
+        return record
+
+    def __getitem__(self, motion_ts):
+        return self.record(self.index(motion_ts))
+
+    def get(self, motion_ts, default=None):
+        try:
+            return self[motion_ts]
+        except KeyError:
+            return default
+
+    def __contains__(self, motion_ts):
+        try:
+            self.index(motion_ts)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.motion_ts)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self.motion_ts.tolist()
+
+    def values(self):
+        return [self.record(idx) for idx in range(len(self))]
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+
+def pre_processing_client_log(opt, column_idx=None):
     """
     Read and process client logs, return client_record dictionary.
 
@@ -29,31 +113,57 @@ def pre_processing_client_log(opt):
     ----------
     opt : dict
         Configurations.
+    column_idx : int or list
+        The user index in the log file, defaults to opt['motion_trace']['column_idx'].
+        A list of user indexes reads a batch of users.
 
     Returns
     -------
-    dict
-        Client record after frame filling. Its insertion order is in ascending order of timestamp.
+    MotionTrace or list
+        Client record after frame filling, one for each user if column_idx is a list.
+        Its insertion order is in ascending order of timestamp.
             key = timestamp,
             value = {'yaw': yaw, 'pitch': pitch, 'scale': scale}
     """
+    # imported here, since the dataset module builds on MotionTrace
+    from e3po.utils.motion_dataset import open_motion_dataset
+
     # read client log
     client_log_path = opt['motion_trace']['motion_file']
     assert os.path.exists(client_log_path), f'[error] {client_log_path} doesn\'t exist'
     interval = int(1000 / opt['motion_trace']['sample_frequency'])
-    client_log_user_index = opt['motion_trace']['column_idx']
-    client_record = read_client_log(client_log_path, interval, client_log_user_index)
+    client_log_user_index = opt['motion_trace']['column_idx'] if column_idx is None else column_idx
+    batch = isinstance(client_log_user_index, (list, tuple))
+    user_index_list = list(client_log_user_index) if batch else [client_log_user_index]
+    client_records = None
+    if opt['motion_trace'].get('binary_cache', True):
+        try:
+            client_records = open_motion_dataset(client_log_path).read_users(user_index_list, interval)
+        except OSError as e:
+            get_logger().warning(f"[motion dataset] failed to cache {client_log_path}, reading it as text: {e}")
+    if client_records is None:
+        client_records = [read_client_log(client_log_path, interval, user_index) for user_index in user_index_list]
 
     # frame filling
     interval = int(1000 / opt['motion_trace']['motion_frequency'])
     video_duration = opt['video']['video_duration']
-    client_record = frame_interpolation(client_record, interval, video_duration)
-    return client_record
+    client_records = [frame_interpolation(client_record, interval, video_duration) for client_record in client_records]
+    return client_records if batch else client_records[0]
+
+
+def calc_default_scale(sample_num):
+    """Scale of each motion sample, which is not recorded in the client log."""
+    sample_idx = np.arange(sample_num)
+    scale = np.full(sample_num, 2, dtype=np.int64)
+    scale[(280 <= sample_idx) & (sample_idx < 300)] = 4
+    scale[(400 <= sample_idx) & (sample_idx < 500)] = 4
+    return scale
 
 
 def read_client_log(client_log_path, interval, client_log_user_index):
     """
     Read and process client logs, return client_record dictionary.
+    Only the row pair of the selected user is parsed.
 
     Parameters
     ----------
@@ -66,49 +176,39 @@ def read_client_log(client_log_path, interval, client_log_user_index):
 
     Returns
     -------
-    dict
+    MotionTrace
         Client record before frame filling. Its insertion order is in ascending order of timestamp.
             key = timestamp,
-            value = {'yaw': yaw, 'pitch': pitch, 'scale': scale}
+            value = {'yaw': yaw, 'pitch': pitch, 'roll': roll, 'scale': scale}
     """
-    client_record = OrderedDict()
     with open(client_log_path, 'r') as f:
         _ = f.readline()
         index = 0
         while True:
-            line_pitch = f.readline()[:-1].split(' ')
-            line_yaw = f.readline()[:-1].split(' ')
-            if len(line_pitch) <= 1:
-                break
+            line_pitch = f.readline().rstrip('\n')
+            line_yaw = f.readline().rstrip('\n')
+            if ' ' not in line_pitch:
+                raise ValueError(f"[error] user {client_log_user_index} not found in {client_log_path}")
             index += 1
-            if index != client_log_user_index:
-                continue
-
-            for i in range(len(line_yaw)):
-                if i < 280:
-                    scale = 2
-                elif i < 300:
-                    scale = 4
-                elif i < 400:
-                    scale = 2
-                elif i < 500:
-                    scale = 4
-                else:
-                    scale = 2
-                client_record[i * interval] = {'yaw': float(line_yaw[i]), 'pitch': float(line_pitch[i]), 'roll': 0, 'scale': scale}
+            if index == client_log_user_index:
+                break
 
-    return client_record
+    yaw = np.array(line_yaw.split(' '), dtype=np.float64)
+    pitch = np.array(line_pitch.split(' '), dtype=np.float64)[:len(yaw)]
+    sample_num = len(yaw)
+    return MotionTrace(np.arange(sample_num, dtype=np.int64) * interval, yaw, pitch,
+                       calc_default_scale(sample_num), np.zeros(sample_num))
 
 
 def frame_interpolation(client_record, interval, video_duration):
     """
     For client_record, let any two adjacent ordered record groups of timestamp be (a, b),
     and insert new records between a and b at interval.
-    The value of the new record is consistent with that of a.
+    The value of the new record is linearly interpolated for yaw and pitch, and is consistent with that of a for scale.
 
     Parameters
     ----------
-    client_record : dict
+    client_record : MotionTrace or dict
         Client record before frame filling. Its insertion order is in ascending order of timestamp.
             key = timestamp,
             value = {'yaw': yaw, 'pitch': pitch, 'scale': scale}
@@ -120,36 +220,32 @@ def frame_interpolation(client_record, interval, video_duration):
 
     Returns
     -------
-    dict
+    MotionTrace
         Client record after frame filling.
             key = timestamp,
             value = {'yaw': yaw, 'pitch': pitch, 'scale': scale}
     """
-    result_client_record = OrderedDict()
+    if not isinstance(client_record, MotionTrace):
+        client_record = MotionTrace.from_dict(client_record)
+    client_keys = client_record.motion_ts
+    yaw, pitch, scale = client_record.yaw, client_record.pitch, client_record.scale
 
     # If the length of client record is not sufficient to cover the video duration,
     # unchanged motion records will be inserted at the end of client record.
-    client_keys = list(client_record.keys())
     if client_keys[-1] <= client_keys[0] + video_duration * 1000:
-        client_keys.append(client_keys[0] + video_duration * 1000)
-        client_record[client_keys[-1]] = client_record[client_keys[-2]]
-
-    # In Python 3, the order in which dict.keys() returns values is the insertion order,
-    # while the insertion order of client_record is in ascending order of timestamp
-    for i in range(1, len(client_keys)):
-        ts_a = client_keys[i - 1]
-        yaw_a = client_record[ts_a]['yaw']
-        pitch_a = client_record[ts_a]['pitch']
-        ts_b = client_keys[i]
-        yaw_b = client_record[ts_b]['yaw']
-        pitch_b = client_record[ts_b]['pitch']
-        ts_tmp = client_keys[i - 1]
-        while ts_tmp < ts_b:
-            # If there are duplicate keys, only the saved key value pairs will be saved
-            result_client_record[ts_tmp] = {}
-            result_client_record[ts_tmp]['yaw'] = yaw_a + (yaw_b - yaw_a) * (ts_tmp - ts_a) / (ts_b - ts_a)
-            result_client_record[ts_tmp]['pitch'] = pitch_a + (pitch_b - pitch_a) * (ts_tmp - ts_a) / (ts_b - ts_a)
-            result_client_record[ts_tmp]['scale'] = client_record[ts_a]['scale']
-            ts_tmp += interval
-
-    return result_client_record
+        client_keys = np.append(client_keys, client_keys[0] + video_duration * 1000)
+        yaw, pitch, scale = np.append(yaw, yaw[-1]), np.append(pitch, pitch[-1]), np.append(scale, scale[-1])
+
+    # each segment [ts_a, ts_b) is filled from ts_a at interval
+    ts_a, ts_b = client_keys[:-1], client_keys[1:]
+    fill_num = np.maximum((ts_b - ts_a + interval - 1) // interval, 0).astype(np.int64)
+    seg = np.repeat(np.arange(len(ts_a)), fill_num)
+    step = np.arange(len(seg)) - np.repeat(np.cumsum(fill_num) - fill_num, fill_num)
+    ts_a, ts_b = ts_a[seg], ts_b[seg]
+    ts_tmp = ts_a + step * interval
+
+    yaw_a, pitch_a = yaw[:-1][seg], pitch[:-1][seg]
+    result_yaw = yaw_a + (yaw[1:][seg] - yaw_a) * (ts_tmp - ts_a) / (ts_b - ts_a)
+    result_pitch = pitch_a + (pitch[1:][seg] - pitch_a) * (ts_tmp - ts_a) / (ts_b - ts_a)
+
+    return MotionTrace(ts_tmp, result_yaw, result_pitch, scale[:-1][seg])
@@ -16,28 +16,193 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see:
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
 import json
-from collections import OrderedDict
 import os
+from bisect import bisect_right
+import numpy as np
+from e3po.utils.history import history_count
+
+
+class NetworkTrace:
+    """
+    Network trace stored as NumPy arrays, together with the prefix sums of the deliverable bytes.
+
+    The trace is a sequence of back-to-back segments with constant throughput and rtt. The last segment is
+    assumed to last forever, such that every download finishes.
+    It can also be accessed as the legacy ordered dict {idx: {'start_ms', 'duration_ms', 'throughput_MBps', 'rtt_ms'}}.
+
+    Parameters
+    ----------
+    start_ms: array
+        start timestamp of each segment, in milliseconds
+    duration_ms: array
+        duration of each segment, in milliseconds
+    throughput_MBps: array
+        throughput of each segment, in MB/s
+    rtt_ms: array
+        rtt of each segment, in milliseconds
+    """
+
+    fields = ('start_ms', 'duration_ms', 'throughput_MBps', 'rtt_ms')
+
+    def __init__(self, start_ms, duration_ms, throughput_MBps, rtt_ms):
+        self.start_ms = np.asarray(start_ms, dtype=np.float64)
+        self.duration_ms = np.asarray(duration_ms, dtype=np.float64)
+        self.throughput_MBps = np.asarray(throughput_MBps, dtype=np.float64)
+        self.rtt_ms = np.asarray(rtt_ms, dtype=np.float64)
+        assert len(self.start_ms) > 0, '[error] empty network trace'
+
+        # bytes per millisecond, and the bytes delivered before the start of each segment
+        self.bytes_per_ms = self.throughput_MBps * 1000
+        self.cum_bytes = np.concatenate([[0], np.cumsum(self.bytes_per_ms * self.duration_ms)])
+        self._start_list = self.start_ms.tolist()
+
+    @classmethod
+    def from_records(cls, network_record):
+        """Build the trace from the legacy list or ordered dict of network records."""
+        if isinstance(network_record, cls):
+            return network_record
+        records = list(network_record.values()) if isinstance(network_record, dict) else list(network_record)
+        return cls(*[[record[field] for record in records] for field in cls.fields])
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise KeyError(idx)
+        return {field: getattr(self, field)[idx].item() for field in self.fields}
+
+    def keys(self):
+        return list(range(len(self)))
+
+    def values(self):
+        return [self[idx] for idx in range(len(self))]
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def started_count(self, ts):
+        """Number of segments that have started by ts."""
+        return bisect_right(self._start_list, ts)
+
+    def segment_at(self, ts):
+        """
+        Index of the segment in effect at ts, which can be a scalar or an array.
+        Timestamps before the trace map to the first segment, and those after it to the last one.
+        """
+        if np.ndim(ts) == 0:
+            return min(max(bisect_right(self._start_list, ts) - 1, 0), len(self) - 1)
+        return np.clip(np.searchsorted(self.start_ms, ts, side='right') - 1, 0, len(self) - 1)
+
+    def bandwidth_at(self, ts):
+        """Throughput in MB/s at ts."""
+        return self.throughput_MBps[self.segment_at(ts)]
+
+    def rtt_at(self, ts):
+        """Rtt in milliseconds at ts."""
+        return self.rtt_ms[self.segment_at(ts)]
+
+    def bytes_at(self, ts):
+        """Cumulative bytes deliverable from the start of the trace until ts, which can be a scalar or an array."""
+        seg = self.segment_at(ts)
+        return self.cum_bytes[seg] + self.bytes_per_ms[seg] * (np.asarray(ts, dtype=np.float64) - self.start_ms[seg])
+
+    def time_at_bytes(self, target_bytes):
+        """
+        Earliest timestamp by which target_bytes have been deliverable, i.e. the inverse of bytes_at.
+
+        Returns
+        -------
+        tuple
+            (ts, seg), where seg is the index of the segment in which ts falls
+        """
+        seg = np.minimum(np.searchsorted(self.cum_bytes[1:], target_bytes, side='left'), len(self) - 1)
+        ts = self.start_ms[seg] + (target_bytes - self.cum_bytes[seg]) / self.bytes_per_ms[seg]
+        return ts, seg
+
+    def finish_time(self, start_ts, size):
+        """
+        Timestamp at which a download of size bytes, started at start_ts, finishes.
+
+        Parameters
+        ----------
+        start_ts: float
+            start timestamp of the download, in milliseconds
+        size: float
+            download size, in bytes
+
+        Returns
+        -------
+        tuple
+            (finish_ts, seg), where seg is the index of the segment in which the download finishes
+        """
+        if size <= 0:
+            return start_ts, self.segment_at(start_ts)
+        finish_ts, seg = self.time_at_bytes(self.bytes_at(start_ts) + size)
+        return finish_ts.item(), int(seg)
+
+    def queue_finish_times(self, request_ts, sizes, idle_ts=0):
+        """
+        Finish timestamps of downloads served one after another, where each download starts once requested
+        and the previous one finished, i.e. finish_i = finish_time(max(request_ts_i, finish_{i-1}), size_i).
+
+        The recurrence is solved without a Python loop in the bytes domain, where it becomes a running
+        maximum: bytes_at(finish_i) = P_i + max_{j<=i}(bytes_at(request_ts_j) - P_{j-1}), with P the prefix
+        sums of sizes.
+
+        Parameters
+        ----------
+        request_ts: array
+            request timestamp of each download, in milliseconds
+        sizes: array
+            size of each download, in bytes
+        idle_ts: float
+            timestamp from which the link is idle, i.e. the finish timestamp of the download before the first one
+
+        Returns
+        -------
+        tuple
+            (finish_ts, seg), arrays with the same meaning as the result of finish_time
+        """
+        request_ts = np.maximum(np.asarray(request_ts, dtype=np.float64), idle_ts)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        if len(request_ts) == 0:
+            return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64)
+
+        prefix = np.cumsum(sizes)
+        backlog = np.maximum.accumulate(self.bytes_at(request_ts) - (prefix - sizes))
+        finish_ts, seg = self.time_at_bytes(prefix + backlog)
+        # a download never finishes before it starts, which only matters for empty downloads and idle links
+        finish_ts = np.maximum.accumulate(np.maximum(finish_ts, request_ts))
+        empty = sizes <= 0
+        seg[empty] = self.segment_at(finish_ts[empty])
+        return finish_ts, seg
 
 
 def pre_processing_network_log(opt):
     """
     read network log
+
+    Returns
+    -------
+    NetworkTrace
+        the network trace, with throughput scaled by network_scale_ratio
     """
     network_log_path = opt['network_trace']['network_file']
     assert os.path.exists(network_log_path), f'[error] {network_log_path} doesn\'t exist'
-    network_record = OrderedDict()
-    start_ms = 0
     with open(network_log_path, 'r') as f:
         network_data = json.load(f)
-        for i in range(len(network_data)):
-            network_record[i] = network_data[i]
-            network_record[i]['throughput_MBps'] *= opt['network_trace']['network_scale_ratio']
-            network_record[i]['start_ms'] = start_ms
-            start_ms += network_record[i]['duration_ms']
 
-    return network_record
+    duration_ms = np.array([record['duration_ms'] for record in network_data], dtype=np.float64)
+    start_ms = np.concatenate([[0], np.cumsum(duration_ms)[:-1]])
+    throughput_MBps = np.array([record['throughput_MBps'] for record in network_data], dtype=np.float64) \
+        * opt['network_trace']['network_scale_ratio']
+    rtt_ms = [record['rtt_ms'] for record in network_data]
+
+    return NetworkTrace(start_ms, duration_ms, throughput_MBps, rtt_ms)
+
 
 def update_network(curr_ts, network_last_idx, network_history, network_record):
     """
@@ -49,24 +214,29 @@ def update_network(curr_ts, network_last_idx, network_history, network_record):
         Current system timestamp in milliseconds.
     network_last_idx : int
         Index of the last processed entry in the network_record list, used to avoid reprocessing.
-    network_history : list
-        A list storing the historical network state records that have already been processed.
-    network_record : list of dict
+    network_history : NetworkHistory or list
+        The historical network state records that have already been processed.
+    network_record : NetworkTrace or list of dict
         Full list of network state records. Each record is a dictionary containing at least
         the 'start_ms' field, indicating when the record becomes active.
 
     Returns
     -------
-    network_history : list
-        The updated list of processed network state records.
+    network_history : NetworkHistory or list
+        The updated processed network state records.
     network_last_idx : int
         The updated index pointing to the last processed entry in network_record.
     """
-    for i in range(network_last_idx, len(network_record)):
-        if curr_ts >= network_record[i]['start_ms'] and len(network_history) < (i + 1):
+    if isinstance(network_record, NetworkTrace):
+        last_idx = network_record.started_count(curr_ts)
+    else:
+        last_idx = network_last_idx
+        while last_idx < len(network_record) and curr_ts >= network_record[last_idx]['start_ms']:
+            last_idx += 1
+
+    for i in range(network_last_idx, last_idx):
+        if history_count(network_history) < (i + 1):
             network_history.append(network_record[i])
             network_last_idx = i + 1
-        elif curr_ts < network_record[i]['start_ms']:
-            break
 
     return network_history, network_last_idx
@@ -24,13 +24,19 @@ import os
 import sys
 import logging
 from .logger import get_logger
+from .profiler import Profiler, set_profiler
 
 
-def get_opt():
+def get_opt(approach_required=True):
     """
     Get options.
     Read command line parameters, read configuration file parameters, and initialize logger.
 
+    Parameters
+    ----------
+    approach_required: bool
+        whether the approach name and type must be given, which is not the case for approach independent commands
+
     Returns
     -------
     dict
@@ -42,10 +48,12 @@ def get_opt():
     """
     # Read the command line input parameter.
     parser = argparse.ArgumentParser()
-    parser.add_argument('-approach_name', type=str, required=True,
+    parser.add_argument('-approach_name', type=str, required=approach_required,
                         help="test approach name")
-    parser.add_argument('-approach_type', type=str, required=True,
+    parser.add_argument('-approach_type', type=str, required=approach_required,
                         help="approach type")
+    parser.add_argument('-column_idx', type=int, nargs='+', default=None,
+                        help="user indexes in the motion log, used by make_benchmark")
     args = parser.parse_args()
 
     project_dir = os.path.dirname(os.path.abspath(__file__)).split('utils')[0]
@@ -55,6 +63,7 @@ def get_opt():
 
     opt['approach_name'] = args.approach_name
     opt['approach_type'] = args.approach_type
+    opt['column_idx_list'] = args.column_idx
     opt['project_path'] = project_dir[:-1]
 
     if not opt['e3po_settings']['video']['origin']['video_dir']:
@@ -72,13 +81,15 @@ def get_opt():
         opt['e3po_settings']['video']['origin']['video_name'].split('.')[0]),
         exist_ok=True
     )
+    log_prefix = f"{opt['approach_name']}_" if opt['approach_name'] else ''
+    log_name = f"{log_prefix}{os.path.basename(sys.modules['__main__'].__file__).split('.')[0]}"
     if opt['e3po_settings']['log']['save_log_file']:
         log_file = osp.join(
             opt['project_path'],
             'log',
             opt['test_group'],
             opt['e3po_settings']['video']['origin']['video_name'].split('.')[0],
-            f"{opt['approach_name']}_{os.path.basename(sys.modules['__main__'].__file__).split('.')[0]}.log"
+            f"{log_name}.log"
         )
         if os.path.exists(log_file):
             os.remove(log_file)
@@ -100,4 +111,17 @@ def get_opt():
         file_log_level = eval(f"logging.{file_log_level.upper()}")
     get_logger(log_file=log_file, console_log_level=console_log_level, file_log_level=file_log_level)
 
+    # Initialize profiler.
+    profile = opt['e3po_settings']['log'].get('profile', False)
+    trace = opt['e3po_settings']['log'].get('trace', False)
+    set_profiler(Profiler(enabled=profile or trace, trace=trace))
+    log_dir = osp.join(
+        opt['project_path'],
+        'log',
+        opt['test_group'],
+        opt['e3po_settings']['video']['origin']['video_name'].split('.')[0]
+    )
+    opt['profile_path'] = osp.join(log_dir, f"{log_name}_profile.json") if profile else None
+    opt['trace_path'] = osp.join(log_dir, f"{log_name}_trace.json") if trace else None
+
     return opt
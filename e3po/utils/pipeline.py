@@ -0,0 +1,209 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import queue
+import threading
+from e3po.utils.logger import get_logger
+from e3po.utils.profiler import get_profiler
+
+_STOP = object()        # end of stream marker passed down the stages
+
+
+class PipelineStage:
+    """
+    One stage of a FramePipeline.
+
+    Parameters
+    ----------
+    name: str
+        stage name, used for the thread names
+    func: callable
+        func(item) -> item, called once per item. It may run on several threads at once, and in any order.
+    workers: int
+        number of threads running the stage
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+
+
+class FramePipeline:
+    """
+    Staged processing of the frames of the evaluation, where each stage runs on its own threads and the stages
+    are connected by bounded queues, such that cv2, numpy and subprocess work of consecutive frames overlaps.
+
+    Items are put in order by the caller, pass through the stages, and are handed to the sink in the order they
+    were put, through a reorder buffer. The sink runs on a single thread. With threaded=False all stages and the
+    sink run inline in put(), which gives the plain serial loop.
+
+    Parameters
+    ----------
+    stages: list
+        PipelineStage items, in processing order
+    sink: callable
+        sink(item), called once per item in put order
+    queue_size: int
+        capacity of the queue in front of each stage and of the sink, put() blocks beyond it
+    threaded: bool
+        whether to run the stages on threads
+    """
+
+    def __init__(self, stages, sink, queue_size=8, threaded=True):
+        self.stages = stages
+        self.sink = sink
+        self.threaded = threaded
+        self.error = None
+        self._seq = 0
+        self._closed = False
+        if not threaded:
+            return
+
+        self._queues = [queue.Queue(max(int(queue_size), 1)) for _ in range(len(stages) + 1)]
+        self._running = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+        self._threads = []
+        for stage_idx, stage in enumerate(stages):
+            for worker_idx in range(stage.workers):
+                self._threads.append(threading.Thread(target=self._run_stage, args=(stage_idx,),
+                                                      name=f"e3po_{stage.name}_{worker_idx}", daemon=True))
+        self._threads.append(threading.Thread(target=self._run_sink, name='e3po_pipeline_sink', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _fail(self, e):
+        with self._lock:
+            if self.error is None:
+                self.error = e
+                get_logger().error(f"[pipeline] {type(e).__name__}: {e}")
+
+    def _run_stage(self, stage_idx):
+        stage = self.stages[stage_idx]
+        in_queue, out_queue = self._queues[stage_idx], self._queues[stage_idx + 1]
+        while True:
+            entry = in_queue.get()
+            if entry is _STOP:
+                # the last worker of the stage passes the end of stream on
+                with self._lock:
+                    self._running[stage_idx] -= 1
+                    last = self._running[stage_idx] == 0
+                if last:
+                    out_queue.put(_STOP)
+                else:
+                    in_queue.put(_STOP)
+                return
+            if self.error is not None:      # keep draining, such that put() never blocks
+                continue
+            seq, item = entry
+            try:
+                with get_profiler().timer(f'pipeline.{stage.name}'):
+                    item = stage.func(item)
+                out_queue.put((seq, item))
+            except Exception as e:
+                self._fail(e)
+
+    def _run_sink(self):
+        pending = {}
+        next_seq = 0
+        while True:
+            entry = self._queues[-1].get()
+            if entry is _STOP:
+                return
+            if self.error is not None:
+                continue
+            seq, item = entry
+            pending[seq] = item
+            try:
+                while next_seq in pending:
+                    with get_profiler().timer('pipeline.output'):
+                        self.sink(pending.pop(next_seq))
+                    next_seq += 1
+            except Exception as e:
+                self._fail(e)
+
+    def put(self, item):
+        """
+        Feed the next item.
+
+        Raises
+        ------
+        Exception
+            the first error raised by a stage or the sink
+        """
+
+        assert not self._closed, '[error] the pipeline is closed'
+        if self.error is not None:
+            raise self.error
+        if not self.threaded:
+            for stage in self.stages:
+                with get_profiler().timer(f'pipeline.{stage.name}'):
+                    item = stage.func(item)
+            with get_profiler().timer('pipeline.output'):
+                self.sink(item)
+            return
+        self._queues[0].put((self._seq, item))
+        self._seq += 1
+
+    def close(self):
+        """
+        Wait until all items went through the sink, and stop the threads.
+
+        Raises
+        ------
+        Exception
+            the first error raised by a stage or the sink
+        """
+
+        if not self._closed:
+            self._closed = True
+            if self.threaded:
+                self._queues[0].put(_STOP)
+                for thread in self._threads:
+                    thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def build_frame_pipeline(system_opt, stages, sink):
+    """
+    Build the frame pipeline of the evaluation, according to the 'pipeline' settings of e3po.yml.
+
+    Parameters
+    ----------
+    system_opt: dict
+        system configuration information
+    stages: list
+        (name, func) items in processing order, whose number of threads is read from pipeline.{name}_threads
+    sink: callable
+        sink(item), called once per item in put order
+
+    Returns
+    -------
+    FramePipeline
+        the pipeline, which runs inline if the pipeline is disabled
+    """
+
+    pipeline_opt = system_opt.get('pipeline') or {}
+    return FramePipeline(
+        [PipelineStage(name, func, pipeline_opt.get(f"{name}_threads") or 1) for name, func in stages],
+        sink,
+        queue_size=pipeline_opt.get('queue_size') or 8,
+        threaded=pipeline_opt.get('enabled', True)
+    )
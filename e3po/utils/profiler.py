@@ -0,0 +1,316 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+import numpy as np
+from e3po.utils.logger import get_logger
+
+
+class _NullTimer:
+    """Timer of a disabled profiler, which does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_args(self, **kwargs):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('_profiler', '_name', '_start', '_args')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+        self._args = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.record(self._name, time.perf_counter() - self._start, self._start, self._args)
+        return False
+
+    def set_args(self, **kwargs):
+        """Attach details to the trace span of the block, e.g. the command of a subprocess."""
+        self._args = {**(self._args or {}), **kwargs}
+
+
+class Profiler:
+    """
+    Wall-clock timers and counters of the stages of a run, e.g. 'ffmpeg.encode', 'metric.ssim' or
+    'approach.generate_display_result', which can be used from several threads.
+
+    When disabled, timer() returns a shared no-op context manager and count() returns at once.
+    When tracing, every timed block is also kept as a span with its process and thread ids, which can be
+    written as a Chrome trace, see write_trace.
+
+    Parameters
+    ----------
+    enabled: bool
+        whether to record anything
+    trace: bool
+        whether to keep the spans of the timed blocks
+
+    Examples
+    --------
+    >> with get_profiler().timer('metric.ssim'):
+    >>     ssim = _cal_ssim_fast(img1, img2)
+    """
+
+    def __init__(self, enabled=True, trace=False):
+        self.enabled = enabled
+        self.trace = enabled and trace
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._counters = defaultdict(int)
+        self._events = []
+        self._threads = {}
+
+    def timer(self, name):
+        """Context manager recording the duration of its block under name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, seconds, start=None, args=None):
+        """
+        Record a duration.
+
+        Parameters
+        ----------
+        name: str
+            stage name
+        seconds: float
+            duration, in seconds
+        start: float
+            time.perf_counter() at the start of the stage, the span is only traced if given
+        args: dict
+            details of the span
+        """
+
+        if not self.enabled:
+            return
+        if self.trace and start is not None:
+            pid, tid = os.getpid(), threading.get_native_id()
+            event = {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': round(start * 1e6, 3), 'dur': round(seconds * 1e6, 3)}
+            if args:
+                event['args'] = args
+        with self._lock:
+            self._samples[name].append(seconds)
+            if self.trace and start is not None:
+                self._events.append(event)
+                if (pid, tid) not in self._threads:
+                    self._threads[(pid, tid)] = (multiprocessing.current_process().name,
+                                                 threading.current_thread().name)
+
+    def count(self, name, value=1):
+        """Increase a counter."""
+        if self.enabled:
+            with self._lock:
+                self._counters[name] += value
+
+    def get_state(self):
+        """Raw durations and counters, which can be merged into another profiler, e.g. of the parent process."""
+        with self._lock:
+            return {'samples': {name: list(samples) for name, samples in self._samples.items()},
+                    'counters': dict(self._counters),
+                    'events': list(self._events),
+                    'threads': dict(self._threads)}
+
+    def merge(self, state):
+        """Add the durations and counters of get_state() of another profiler."""
+        with self._lock:
+            for name, samples in state['samples'].items():
+                self._samples[name] += samples
+            for name, value in state['counters'].items():
+                self._counters[name] += value
+            if self.trace:
+                self._events += state.get('events', [])
+                self._threads.update(state.get('threads', {}))
+
+    def summary(self):
+        """
+        Summary of the recorded stages.
+
+        Returns
+        -------
+        dict
+            {'timers': {name: {'count', 'total_s', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}},
+            'counters': {name: value}}, timers in descending order of total time
+        """
+
+        with self._lock:
+            samples = {name: np.asarray(values, dtype=np.float64) * 1000 for name, values in self._samples.items()}
+            counters = dict(sorted(self._counters.items()))
+        timers = {}
+        for name, values in sorted(samples.items(), key=lambda item: -item[1].sum()):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            timers[name] = {
+                'count': int(len(values)),
+                'total_s': round(float(values.sum()) / 1000, 6),
+                'mean_ms': round(float(values.mean()), 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(values.max()), 3)
+            }
+        return {'timers': timers, 'counters': counters}
+
+    def trace_events(self):
+        """
+        The traced spans in the Chrome trace event format, with the names of their processes and threads.
+
+        Returns
+        -------
+        list
+            complete ('X') events sorted by start time, preceded by the metadata ('M') events
+        """
+
+        with self._lock:
+            events = sorted(self._events, key=lambda event: event['ts'])
+            threads = dict(self._threads)
+        metadata, named_pids = [], set()
+        for (pid, tid), (process_name, thread_name) in sorted(threads.items()):
+            if pid not in named_pids:
+                named_pids.add(pid)
+                metadata.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                                 'args': {'name': f"{process_name} ({pid})"}})
+            metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                             'args': {'name': thread_name}})
+        return metadata + events
+
+
+_profiler = Profiler(enabled=False)
+
+
+def get_profiler():
+    """The profiler of the current run, disabled unless set by get_opt."""
+    return _profiler
+
+
+def set_profiler(profiler):
+    """Set the profiler of the current run."""
+    global _profiler
+    _profiler = profiler
+
+
+def timed(name):
+    """Decorator recording the duration of each call of the function under name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _profiler.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wait_process(process):
+    """
+    Wait for a subprocess to exit, and get the cpu time it and its own children used.
+
+    Parameters
+    ----------
+    process: subprocess.Popen
+        the started subprocess
+
+    Returns
+    -------
+    returncode: int
+        the exit code of the subprocess
+    cpu_s: float
+        user plus system cpu time, in seconds, None where os.wait4 is not available
+    """
+
+    if hasattr(os, 'wait4') and process.returncode is None:
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:       # already reaped
+            return process.wait(), None
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode, round(usage.ru_utime + usage.ru_stime, 6)
+    return process.wait(), None
+
+
+def write_trace(trace_path):
+    """
+    Write the traced spans of the run as a Chrome trace, which can be opened in chrome://tracing or
+    https://ui.perfetto.dev.
+
+    Parameters
+    ----------
+    trace_path: str
+        path of the json file
+    """
+
+    profiler = get_profiler()
+    if not profiler.trace:
+        return
+    os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': profiler.trace_events(), 'displayTimeUnit': 'ms'}, f)
+    get_logger().info(f"[profile] trace written to {trace_path}")
+
+
+def write_profile(opt):
+    """
+    Log the profile summary of the run, and write it to the json file opt['profile_path'] when profiling.
+    The trace of the run, if enabled, is written to opt['trace_path'].
+
+    Parameters
+    ----------
+    opt : dict
+        Configurations.
+    """
+
+    profiler = get_profiler()
+    if not profiler.enabled:
+        return
+    summary = profiler.summary()
+    logger = get_logger()
+    for name, timer in summary['timers'].items():
+        logger.info(f"[profile] {name}: {timer['count']} calls, {timer['total_s']:.3f}s in total, "
+                    f"p50 {timer['p50_ms']}ms, p95 {timer['p95_ms']}ms, p99 {timer['p99_ms']}ms")
+    for name, value in summary['counters'].items():
+        logger.info(f"[profile] {name}: {value}")
+
+    profile_path = opt.get('profile_path')
+    if profile_path:
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    if opt.get('trace_path'):
+        write_trace(opt['trace_path'])
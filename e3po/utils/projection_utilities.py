@@ -17,8 +17,8 @@
 # along with this program; if not, see:
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
 
-import copy
 import numpy as np
+from e3po.utils.tile_layout import get_tile_raster
 
 
 def fov_to_3d_polar_coord(fov_direction, fov_range, fov_resolution):
@@ -651,26 +651,8 @@ def pixel_coord_to_tile(pixel_coord, total_tile_num, video_size, chunk_idx):
         the calculated tile list, for the given pixel coordinates
     """
 
-    coord_tile_list = np.full(pixel_coord[0].shape, 0)
-    for i in range(total_tile_num):
-        tile_id = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(i).zfill(3)}"
-        if tile_id not in video_size:
-            continue
-        tile_idx = video_size[tile_id]['user_video_spec']['tile_info']['tile_idx']
-        tile_start_width = video_size[tile_id]['user_video_spec']['segment_info']['start_position']['width']
-        tile_start_height = video_size[tile_id]['user_video_spec']['segment_info']['start_position']['height']
-        tile_width = video_size[tile_id]['user_video_spec']['segment_info']['segment_out_info']['width']
-        tile_height = video_size[tile_id]['user_video_spec']['segment_info']['segment_out_info']['height']
-
-        # Create a Boolean mask to check if the coordinates are within the tile range
-        mask_width = (tile_start_width <= pixel_coord[0]) & (pixel_coord[0] < tile_start_width + tile_width)
-        mask_height = (tile_start_height <= pixel_coord[1]) & (pixel_coord[1] < tile_start_height + tile_height)
-
-        # find coordinates that satisfy both width and height conditions
-        hit_coord_mask = mask_width & mask_height
-
-        # update coord_tile_list
-        coord_tile_list[hit_coord_mask] = tile_idx
+    tile_raster = get_tile_raster(video_size, chunk_idx, total_tile_num)
+    coord_tile_list = tile_raster.pixel_coord_to_tile(pixel_coord)
 
     return coord_tile_list
 
@@ -695,20 +677,17 @@ def pixel_coord_to_relative_tile_coord(pixel_coord, coord_tile_list, video_info,
         the relative tile coord for the given pixel coordinates
     """
 
-    relative_tile_coord = copy.deepcopy(pixel_coord)
-    unique_tile_list = np.unique(coord_tile_list)
-    for i in unique_tile_list:
-        tile_id = f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(i).zfill(3)}"
-        tile_start_width = video_info[tile_id]['user_video_spec']['segment_info']['start_position']['width']
-        tile_start_height = video_info[tile_id]['user_video_spec']['segment_info']['start_position']['height']
-        tile_width = video_info[tile_id]['user_video_spec']['segment_info']['segment_out_info']['width']
-        tile_height = video_info[tile_id]['user_video_spec']['segment_info']['segment_out_info']['height']
-
-        hit_coord_mask = (coord_tile_list == i)
-
-        # update the relative position
-        relative_tile_coord[0][hit_coord_mask] = np.clip(relative_tile_coord[0][hit_coord_mask] - tile_start_width, 0, tile_width - 1)
-        relative_tile_coord[1][hit_coord_mask] = np.clip(relative_tile_coord[1][hit_coord_mask] - tile_start_height, 0, tile_height - 1)
+    tile_rects = get_tile_raster(video_info, chunk_idx).rects
+    unique_tile_list, tile_inverse = np.unique(coord_tile_list, return_inverse=True)
+    rects = np.array([tile_rects[int(i)] for i in unique_tile_list]).reshape(-1, 4)
+    tile_inverse = tile_inverse.reshape(np.shape(coord_tile_list))
+
+    # update the relative position, with the rectangle of the tile each pixel belongs to
+    tile_start_width, tile_start_height, tile_width, tile_height = [rects[:, k][tile_inverse] for k in range(4)]
+    relative_tile_coord = [
+        np.clip(pixel_coord[0] - tile_start_width, 0, tile_width - 1),
+        np.clip(pixel_coord[1] - tile_start_height, 0, tile_height - 1)
+    ]
 
     return relative_tile_coord
 
@@ -17,11 +17,21 @@
 # along with this program; if not, see:
 #    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import cv2
 import numpy as np
 import torch
 import torch.nn.functional as fun
 from .logger import get_logger
+from .frame_sink import as_uint8
+from .profiler import get_profiler
+
+SSIM_THREADS = min(8, os.cpu_count() or 1)     # threads of the cpu ssim, each one handles a stripe of a channel
+SSIM_STRIPE_ROWS = 256                          # minimum number of rows of a stripe
+
+_ssim_executor = None
 
 
 def calculate_psnr_ssim_mse(img1_uri, img2_uri, use_cuda_flag=False, psnr_flag=True, ssim_flag=True):
@@ -30,10 +40,10 @@ def calculate_psnr_ssim_mse(img1_uri, img2_uri, use_cuda_flag=False, psnr_flag=T
 
     Parameters
     ----------
-    img1_uri : ndarray
-        The range of each pixel value is [0, 255].
-    img2_uri : ndarray
-        The range of each pixel value is [0, 255].
+    img1_uri : ndarray or str
+        The image, or its uri. The range of each pixel value is [0, 255].
+    img2_uri : ndarray or str
+        The image, or its uri. The range of each pixel value is [0, 255].
     use_cuda_flag : bool
         Whether to use cuda to accelerate operations.
     psnr_flag : bool
@@ -46,8 +56,8 @@ def calculate_psnr_ssim_mse(img1_uri, img2_uri, use_cuda_flag=False, psnr_flag=T
     list
         [psnr, ssim]
     """
-    img1 = np.array(cv2.imread(img1_uri))
-    img2 = np.array(cv2.imread(img2_uri))
+    img1 = np.array(cv2.imread(img1_uri)) if isinstance(img1_uri, str) else as_uint8(img1_uri)
+    img2 = np.array(cv2.imread(img2_uri)) if isinstance(img2_uri, str) else as_uint8(img2_uri)
     assert img1.shape == img2.shape, f'[error] Input images have different shapes: {img1.shape}, {img2.shape}!'
     psnr = 0
     ssim = 0
@@ -71,22 +81,19 @@ def calculate_psnr_ssim_mse(img1_uri, img2_uri, use_cuda_flag=False, psnr_flag=T
             ssim = float(_cal_ssim_gpu(img1_, img2_))
             _logger.debug(f'[evaluation] end cal ssim')
     else:
-        img1 = img1.astype(np.float64)
-        img2 = img2.astype(np.float64)
         if psnr_flag:
             _logger.debug(f'[evaluation] start cal psnr')
-            mse = np.mean((img1 - img2) ** 2)
-            if mse == 0:
-                psnr = float('inf')
-            else:
-                psnr = 10. * np.log10(255. * 255. / mse)
+            with get_profiler().timer('metric.psnr'):
+                mse = np.mean((img1.astype(np.float64) - img2.astype(np.float64)) ** 2)
+                if mse == 0:
+                    psnr = float('inf')
+                else:
+                    psnr = 10. * np.log10(255. * 255. / mse)
             _logger.debug(f'[evaluation] end cal psnr')
         if ssim_flag:
             _logger.debug(f'[evaluation] start cal ssim')
-            ssims = []
-            for i in range(img1.shape[2]):
-                ssims.append(_cal_ssim(img1[..., i], img2[..., i]))
-            ssim = np.array(ssims).mean()
+            with get_profiler().timer('metric.ssim'):
+                ssim = _cal_ssim_fast(img1, img2)
             _logger.debug(f'[evaluation] end cal ssim')
     return psnr, ssim, mse
 
@@ -132,6 +139,102 @@ def _cal_ssim(img1, img2):
     return ssim_img12.mean()
 
 
+@lru_cache(maxsize=None)
+def _ssim_kernel():
+    """The 1-D Gaussian kernel of ssim in float32, whose outer product is the 11x11 window of _cal_ssim."""
+    return cv2.getGaussianKernel(11, 1.5).astype(np.float32)
+
+
+def _get_ssim_executor():
+    global _ssim_executor
+    if _ssim_executor is None:
+        _ssim_executor = ThreadPoolExecutor(SSIM_THREADS, thread_name_prefix='e3po_ssim')
+    return _ssim_executor
+
+
+def _ssim_stripe_sum(img1, img2):
+    """
+    Sum of the ssim map over the valid rows and columns of one stripe of one channel.
+
+    The images are shifted by -128 before the moments are computed, which keeps the float32 variances accurate,
+    and the means are shifted back for the luminance term.
+    """
+    k_1 = 0.01
+    k_2 = 0.03
+    L = 255                                            # The dynamic range of pixel-value: 2^8 - 1
+
+    c_1 = (k_1 * L) ** 2
+    c_2 = (k_2 * L) ** 2
+    kernel = _ssim_kernel()
+
+    img1 = img1.astype(np.float32) - 128
+    img2 = img2.astype(np.float32) - 128
+    mean_img1 = cv2.sepFilter2D(img1, -1, kernel, kernel)[5:-5, 5:-5]
+    mean_img2 = cv2.sepFilter2D(img2, -1, kernel, kernel)[5:-5, 5:-5]
+    var_img1 = cv2.sepFilter2D(img1 * img1, -1, kernel, kernel)[5:-5, 5:-5] - mean_img1 * mean_img1
+    var_img2 = cv2.sepFilter2D(img2 * img2, -1, kernel, kernel)[5:-5, 5:-5] - mean_img2 * mean_img2
+    var_img12 = cv2.sepFilter2D(img1 * img2, -1, kernel, kernel)[5:-5, 5:-5] - mean_img1 * mean_img2
+    mean_img1 += 128
+    mean_img2 += 128
+
+    # numerator and denominator are computed in place
+    numerator = mean_img1 * mean_img2
+    denominator = mean_img1 * mean_img1
+    denominator += mean_img2 * mean_img2
+    denominator += c_1
+    numerator *= 2
+    numerator += c_1
+    var_img12 *= 2
+    var_img12 += c_2
+    numerator *= var_img12
+    var_img1 += var_img2
+    var_img1 += c_2
+    denominator *= var_img1
+
+    return float(np.sum(numerator / denominator, dtype=np.float64))
+
+
+def _cal_ssim_fast(img1, img2):
+    """
+    Calculate the SSIM metric for two input images, averaged over the channels, in float32 and with the
+    separable Gaussian window. The channels are split into horizontal stripes, which are processed on a
+    thread pool. The result matches _cal_ssim within 1e-4.
+
+    Parameters
+    ----------
+    img1 : ndarray
+        The range of each pixel value is [0, 255], shape (h, w, c) or (h, w).
+    img2 : ndarray
+        The range of each pixel value is [0, 255], shape (h, w, c) or (h, w).
+
+    Returns
+    -------
+    float
+        The calculated SSIM result.
+    """
+    if img1.ndim == 2:
+        img1 = img1[..., None]
+        img2 = img2[..., None]
+    height, width, channel_num = img1.shape
+    valid_height = height - 10
+    assert valid_height > 0 and width > 10, '[error] images are too small for ssim'
+
+    stripe_num = max(1, min(SSIM_THREADS, valid_height // SSIM_STRIPE_ROWS))
+    bounds = np.linspace(0, valid_height, stripe_num + 1).astype(int)
+    tasks = []
+    for i in range(channel_num):
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            # each stripe carries the 5 rows above and below it, which its window reaches
+            tasks.append((img1[start:end + 10, :, i], img2[start:end + 10, :, i]))
+
+    if len(tasks) == 1 or SSIM_THREADS <= 1:
+        sums = [_ssim_stripe_sum(*task) for task in tasks]
+    else:
+        sums = list(_get_ssim_executor().map(lambda task: _ssim_stripe_sum(*task), tasks))
+
+    return sum(sums) / (channel_num * valid_height * (width - 10))
+
+
 def _cal_ssim_gpu(img1, img2):
     """
     Calculate the SSIM (structural similarity index measure) metric for two input images, with GPU acceleration.
@@ -67,4 +67,5 @@ class Registry:
 
 data_registry = Registry('data_registry')
 decision_registry = Registry('decision_registry')
-evaluation_registry = Registry('evaluation_registry')
\ No newline at end of file
+evaluation_registry = Registry('evaluation_registry')
+motion_predictor_registry = Registry('motion_predictor_registry')
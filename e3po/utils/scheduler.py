@@ -0,0 +1,156 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import heapq
+from bisect import bisect_left
+import numpy as np
+from e3po.utils.arrival import build_decision_table
+
+# key of user_data, through which an approach requests its next wake-up timestamp
+WAKEUP_KEY = 'next_wakeup_ts'
+
+
+class EventScheduler:
+    """
+    Event queue of the simulation clock, ordered by timestamp and then by insertion order.
+
+    Each event is a tuple (ts, kind, payload), where kind is e.g. 'chunk_boundary', 'network_boundary',
+    'download_complete' or 'wakeup'.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def schedule(self, ts, kind, payload=None):
+        """Schedule an event of the given kind at ts."""
+        heapq.heappush(self._heap, (ts, self._seq, kind, payload))
+        self._seq += 1
+
+    def peek_ts(self):
+        """Timestamp of the earliest pending event, inf if there is none."""
+        return self._heap[0][0] if self._heap else float('inf')
+
+    def pop(self):
+        """Remove and return the earliest pending event."""
+        ts, _, kind, payload = heapq.heappop(self._heap)
+        return ts, kind, payload
+
+    def pop_until(self, ts):
+        """Remove and return all the pending events up to (and including) ts."""
+        events = []
+        while self._heap and self._heap[0][0] <= ts:
+            events.append(self.pop())
+        return events
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def next_wakeup_tick(ticks, start_idx, user_data, scheduler):
+    """
+    Find the next clock tick at which an approach should be called.
+
+    Approaches opt in by setting user_data['next_wakeup_ts']: None requests the next tick, a timestamp
+    requests the first tick at or after it, and float('inf') sleeps until the next scheduled event.
+    Approaches that never set it are called on every tick, as before.
+
+    Parameters
+    ----------
+    ticks: list
+        ascending system timestamps of the simulation clock
+    start_idx: int
+        index of the first tick that has not been handled yet
+    user_data: dict
+        user related parameters and information, returned by the approach
+    scheduler: EventScheduler
+        the pending system events
+
+    Returns
+    -------
+    tick_idx: int
+        index of the next tick to handle, len(ticks) if there is none
+    """
+
+    if not isinstance(user_data, dict) or user_data.get(WAKEUP_KEY) is None:
+        return start_idx
+    wakeup_ts = min(user_data[WAKEUP_KEY], scheduler.peek_ts())
+    if wakeup_ts == float('inf'):
+        return len(ticks)
+    return bisect_left(ticks, wakeup_ts, lo=start_idx)
+
+
+def schedule_download_completions(scheduler, network_trace, dl_list, video_size, idle_ts=0):
+    """
+    Schedule a 'download_complete' event for each decision of dl_list, at the timestamp its tiles reach
+    the client, i.e. one rtt after the link finished serving them, as in build_arrival_table.
+
+    Parameters
+    ----------
+    scheduler: EventScheduler
+        the pending system events
+    network_trace: NetworkTrace
+        the network trace
+    dl_list: list
+        the decisions just written, with their system_ts, see write_decision_json
+    video_size: dict
+        the video size after video preprocessing
+    idle_ts: float
+        timestamp from which the link is idle, i.e. the finish timestamp of the previous downloads
+
+    Returns
+    -------
+    idle_ts: float
+        timestamp from which the link is idle after the downloads of dl_list
+    """
+
+    if not dl_list:
+        return idle_ts
+    rows, _ = build_decision_table(dl_list, video_size)
+    finish_ts, seg = network_trace.queue_finish_times(rows['system_ts'], rows['bytes'], idle_ts)
+    arrival_ts = finish_ts + network_trace.rtt_ms[seg]
+    for ts, chunk_idx in zip(arrival_ts.tolist(), rows['chunk_idx'].tolist()):
+        scheduler.schedule(ts, 'download_complete', chunk_idx)
+    return float(finish_ts[-1])
+
+
+def generate_frame_events(motion_clock, video_fps):
+    """
+    Generate the display events, i.e. the clock ticks at which the displayed frame changes.
+
+    Parameters
+    ----------
+    motion_clock: list
+        client-side clock, each item represents a motion timestamp
+    video_fps: int
+        video framerate
+
+    Returns
+    -------
+    frame_events: list
+        each item with format (motion_ts, frame_idx), in ascending order of time
+    """
+
+    motion_ts = np.asarray(motion_clock, dtype=np.int64)
+    if len(motion_ts) == 0:
+        return []
+    frame_idx = (motion_ts * video_fps // 1000.0).astype(np.int64)
+    changed = np.ones(len(frame_idx), dtype=bool)
+    changed[1:] = frame_idx[1:] != frame_idx[:-1]
+    return [(int(ts), int(idx)) for ts, idx in zip(motion_ts[changed], frame_idx[changed])]
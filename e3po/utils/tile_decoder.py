@@ -0,0 +1,321 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from e3po.utils.profiler import get_profiler
+
+
+class SequentialDecoder:
+    """
+    Decoder of one video, which keeps the cv2.VideoCapture open and decodes the frames in order.
+
+    Requesting frame n after frame m < n only decodes the frames in between, and requesting an earlier
+    frame reopens the video. Frames decoded ahead of time are buffered until they are requested.
+
+    Parameters
+    ----------
+    video_uri: str
+        uri of the video
+    group: int
+        the group of the decoder, e.g. the chunk index of a tile video
+    """
+
+    def __init__(self, video_uri, group=None):
+        self.video_uri = video_uri
+        self.group = group
+        self.next_idx = 0               # index of the next frame delivered by the capture
+        self.buffer = OrderedDict()     # frames decoded ahead of time, frame_idx -> frame
+        self.buffer_bytes = 0
+        self.decoded_frames = 0
+        self.read_ahead_to = 0          # read-ahead has been requested up to this frame (exclusive)
+        self.closed = False
+        self.lock = threading.Lock()
+        self._cap = None
+
+    def _open(self):
+        if self._cap is not None:
+            self._cap.release()
+        self._cap = cv2.VideoCapture(self.video_uri)
+        if not self._cap.isOpened():
+            self._cap = None
+            raise IOError(f"[decoder error] failed to open {self.video_uri}")
+        self.next_idx = 0
+
+    def _decode(self, frame_idx, keep_from):
+        """Decode up to frame_idx, buffering the frames from keep_from on. The caller holds the lock."""
+        if self._cap is None or frame_idx < self.next_idx:
+            self._open()
+        while self.next_idx <= frame_idx:
+            if self.next_idx < keep_from:
+                ret = self._cap.grab()
+                frame = None
+            else:
+                ret, frame = self._cap.read()
+            if not ret:
+                raise IOError(f"[decoder error] frame {self.next_idx} of {self.video_uri} can not be decoded")
+            if frame is not None:
+                self.buffer[self.next_idx] = frame
+                self.buffer_bytes += frame.nbytes
+            self.next_idx += 1
+            self.decoded_frames += 1
+
+    def _pop(self, frame_idx):
+        """Remove frame_idx and all the earlier frames from the buffer, and return frame_idx."""
+        frame = None
+        while self.buffer:
+            idx = next(iter(self.buffer))
+            if idx > frame_idx:
+                break
+            _frame = self.buffer.pop(idx)
+            self.buffer_bytes -= _frame.nbytes
+            if idx == frame_idx:
+                frame = _frame
+        return frame
+
+    def read(self, frame_idx):
+        """
+        Get the given frame of the video.
+
+        Parameters
+        ----------
+        frame_idx: int
+            frame index within the video
+
+        Returns
+        -------
+        frame: array
+            the decoded frame in BGR, with the same layout as cv2.imread
+        """
+
+        with self.lock:
+            if self.closed:
+                raise IOError(f"[decoder error] decoder of {self.video_uri} has been closed")
+            if frame_idx not in self.buffer:
+                self._decode(frame_idx, keep_from=frame_idx)
+            return self._pop(frame_idx)
+
+    def read_ahead(self, frame_idx):
+        """Decode all frames before frame_idx which have not been decoded, and buffer them."""
+        with self.lock:
+            if self.closed or frame_idx <= self.next_idx:
+                return
+            try:
+                self._decode(frame_idx - 1, keep_from=self.next_idx)
+            except IOError:
+                pass                    # reported when the frame is actually requested
+
+    def drop_buffer(self):
+        """Drop the frames decoded ahead of time."""
+        with self.lock:
+            self.buffer.clear()
+            self.buffer_bytes = 0
+
+    def close(self):
+        """Release the capture and the buffered frames."""
+        with self.lock:
+            self.closed = True
+            self.buffer.clear()
+            self.buffer_bytes = 0
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+
+
+class TileDecoderPool:
+    """
+    Pool of sequential decoders, one per open video, with read-ahead on background threads.
+
+    The least recently used decoder is closed once max_decoders are open, and frames decoded ahead of time
+    are dropped once they take more than max_frame_memory.
+
+    Parameters
+    ----------
+    max_decoders: int
+        maximum number of open decoders
+    max_frame_memory: float
+        maximum memory of the frames decoded ahead of time, in MB
+    read_ahead_frames: int
+        number of frames decoded ahead of time, for each prefetched video
+    read_ahead_threads: int
+        number of background decoding threads, 0 disables read-ahead
+    """
+
+    def __init__(self, max_decoders=64, max_frame_memory=512, read_ahead_frames=8, read_ahead_threads=4):
+        assert max_decoders > 0, '[error] max_decoders should be positive'
+        self.max_decoders = max_decoders
+        self.max_frame_bytes = max_frame_memory * 1024 * 1024
+        self.read_ahead_frames = read_ahead_frames
+        self._executor = ThreadPoolExecutor(read_ahead_threads, thread_name_prefix='e3po_decoder') \
+            if read_ahead_threads > 0 and read_ahead_frames > 0 else None
+        self._decoders = OrderedDict()
+        self.opened_decoders = 0
+        self.closed_decoded_frames = 0      # frames decoded by the decoders which have been closed
+
+    def _get_decoder(self, video_uri, group=None):
+        decoder = self._decoders.get(video_uri)
+        if decoder is not None:
+            self._decoders.move_to_end(video_uri)
+            return decoder
+        while len(self._decoders) >= self.max_decoders:
+            _, oldest = self._decoders.popitem(last=False)
+            self._close(oldest)
+        decoder = SequentialDecoder(video_uri, group)
+        self._decoders[video_uri] = decoder
+        self.opened_decoders += 1
+        return decoder
+
+    def _close(self, decoder):
+        decoder.close()
+        self.closed_decoded_frames += decoder.decoded_frames
+
+    def _trim_memory(self):
+        buffer_bytes = sum(decoder.buffer_bytes for decoder in self._decoders.values())
+        for decoder in list(self._decoders.values()):
+            if buffer_bytes <= self.max_frame_bytes:
+                break
+            buffer_bytes -= decoder.buffer_bytes
+            decoder.drop_buffer()
+
+    def get_frame(self, video_uri, frame_idx, group=None):
+        """
+        Get the given frame of a video, decoding it if it has not been decoded ahead of time.
+
+        Parameters
+        ----------
+        video_uri: str
+            uri of the video
+        frame_idx: int
+            frame index within the video
+        group: int
+            the group of the video, e.g. the chunk index of a tile video
+
+        Returns
+        -------
+        frame: array
+            the decoded frame in BGR, with the same layout as cv2.imread
+        """
+
+        with get_profiler().timer('decode.tile_frame'):
+            frame = self._get_decoder(video_uri, group).read(frame_idx)
+        self._trim_memory()
+        return frame
+
+    def prefetch(self, video_uri, frame_idx=0, group=None):
+        """Start decoding the read_ahead_frames frames from frame_idx on in the background."""
+        if self._executor is None:
+            return
+        decoder = self._get_decoder(video_uri, group)
+        end_idx = frame_idx + self.read_ahead_frames
+        if end_idx > decoder.read_ahead_to:
+            decoder.read_ahead_to = end_idx
+            self._executor.submit(decoder.read_ahead, end_idx)
+
+    def get_stats(self):
+        """Number of opened decoders and of decoded frames so far."""
+        decoded_frames = self.closed_decoded_frames + sum(decoder.decoded_frames for decoder in self._decoders.values())
+        return {'opened_decoders': self.opened_decoders, 'decoded_frames': decoded_frames}
+
+    def merge_stats(self, stats):
+        """Add the get_stats() of another pool, e.g. of a worker process."""
+        self.opened_decoders += stats['opened_decoders']
+        self.closed_decoded_frames += stats['decoded_frames']
+
+    def release_groups(self, keep):
+        """Close the decoders whose group does not satisfy keep(group)."""
+        for video_uri in [uri for uri, decoder in self._decoders.items() if not keep(decoder.group)]:
+            self._close(self._decoders.pop(video_uri))
+
+    def close(self):
+        """Close all decoders and stop the background threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for decoder in self._decoders.values():
+            self._close(decoder)
+        self._decoders.clear()
+
+
+class LazyFrameList(Sequence):
+    """
+    List of frames which are decoded on first access, such that the tiles an approach skips because they do
+    not cover the fov are never decoded.
+
+    Parameters
+    ----------
+    loaders: list
+        one callable per frame, which returns the decoded frame
+    stats: dict
+        decode statistics {'available_tiles', 'decoded_tiles'} to be updated, optional
+    """
+
+    def __init__(self, loaders, stats=None):
+        self._loaders = list(loaders)
+        self._frames = [None] * len(self._loaders)
+        self._stats = stats
+        if stats is not None:
+            stats['available_tiles'] += len(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('frame list index out of range')
+        if self._frames[idx] is None:
+            self._frames[idx] = self._loaders[idx]()
+            if self._stats is not None:
+                self._stats['decoded_tiles'] += 1
+        return self._frames[idx]
+
+    @property
+    def decoded_count(self):
+        """Number of frames which have been decoded."""
+        return sum(frame is not None for frame in self._frames)
+
+
+def build_tile_decoder_pool(system_opt):
+    """
+    Build the tile decoder pool from the 'decoder' settings of e3po.yml.
+
+    Parameters
+    ----------
+    system_opt: dict
+        system configuration information
+
+    Returns
+    -------
+    TileDecoderPool
+        the decoder pool, with default limits for the settings which are not given
+    """
+
+    decoder_opt = system_opt.get('decoder') or {}
+    return TileDecoderPool(
+        max_decoders=decoder_opt.get('max_open_decoders', 64),
+        max_frame_memory=decoder_opt.get('max_frame_memory', 512),
+        read_ahead_frames=decoder_opt.get('read_ahead_frames', 8),
+        read_ahead_threads=decoder_opt.get('read_ahead_threads', 4)
+    )
@@ -0,0 +1,304 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+from functools import lru_cache
+import numpy as np
+
+BACKGROUND_TILE_IDX = -1
+
+_tile_index_cache = {}
+_raster_cache = {}
+
+
+@lru_cache(maxsize=None)
+def encode_tile_id(chunk_idx, tile_idx):
+    """
+    Encode (chunk_idx, tile_idx) into the string tile id used by the json files and the video file names.
+
+    Parameters
+    ----------
+    chunk_idx: int
+        chunk index
+    tile_idx: int
+        tile index, -1 for the background stream
+
+    Returns
+    -------
+    tile_id: str
+        with format 'chunk_xxxx_tile_xxx' or 'chunk_xxxx_background'
+    """
+
+    if tile_idx != BACKGROUND_TILE_IDX:
+        return f"chunk_{str(chunk_idx).zfill(4)}_tile_{str(tile_idx).zfill(3)}"
+    else:
+        return f"chunk_{str(chunk_idx).zfill(4)}_background"
+
+
+@lru_cache(maxsize=None)
+def decode_tile_id(tile_id):
+    """
+    Decode the string tile id into (chunk_idx, tile_idx), which is the inverse of encode_tile_id.
+
+    Parameters
+    ----------
+    tile_id: str
+        with format 'chunk_xxxx_tile_xxx' or 'chunk_xxxx_background'
+
+    Returns
+    -------
+    tuple
+        (chunk_idx, tile_idx), where tile_idx is -1 for the background stream
+    """
+
+    fields = tile_id.split('_')
+    if len(fields) == 4 and fields[0] == 'chunk' and fields[2] == 'tile':
+        return int(fields[1]), int(fields[3])
+    if len(fields) == 3 and fields[0] == 'chunk' and fields[2] == 'background':
+        return int(fields[1]), BACKGROUND_TILE_IDX
+    raise ValueError(f"[tile id error] invalid tile_id={tile_id}")
+
+
+def tile_bit(tile_idx):
+    """Bit of the tile in a tile bitset, where bit 0 is the background and bit i+1 is tile i."""
+    return 1 << (tile_idx + 1)
+
+
+def tiles_to_bitset(tile_list):
+    """
+    Pack a list of tile indexes into an integer bitset.
+
+    Parameters
+    ----------
+    tile_list: list
+        tile indexes, -1 for the background stream
+
+    Returns
+    -------
+    bitset: int
+        the packed tile set
+    """
+
+    bitset = 0
+    for tile_idx in tile_list:
+        bitset |= 1 << (int(tile_idx) + 1)
+    return bitset
+
+
+def bitset_to_tiles(bitset):
+    """
+    Unpack an integer bitset into the sorted list of tile indexes, which is the inverse of tiles_to_bitset.
+
+    Parameters
+    ----------
+    bitset: int
+        the packed tile set
+
+    Returns
+    -------
+    tile_list: list
+        sorted tile indexes, -1 for the background stream
+    """
+
+    tile_list = []
+    bit_idx = 0
+    while bitset:
+        if bitset & 1:
+            tile_list.append(bit_idx - 1)
+        bitset >>= 1
+        bit_idx += 1
+    return tile_list
+
+
+class TileIndex:
+    """
+    Integer index over video_size, which is parsed once such that the per-frame and per-decision
+    lookups are keyed by (chunk_idx, tile_idx) instead of formatted string ids.
+
+    Parameters
+    ----------
+    video_size: dict
+        video size of preprocessed video, keyed by string tile ids
+    """
+
+    def __init__(self, video_size):
+        self.sizes = {}
+        self.spec_tile_idx = {}
+        self.chunk_tiles = {}
+        for tile_id, tile_info in video_size.items():
+            try:
+                chunk_idx, tile_idx = decode_tile_id(tile_id)
+            except ValueError:
+                continue
+            self.sizes[(chunk_idx, tile_idx)] = tile_info['video_size']
+            user_video_spec = tile_info.get('user_video_spec') or {}
+            self.spec_tile_idx[(chunk_idx, tile_idx)] = user_video_spec.get('tile_info', {}).get('tile_idx', tile_idx)
+            if tile_idx == BACKGROUND_TILE_IDX or 'segment_info' not in user_video_spec:
+                continue
+            segment_info = user_video_spec['segment_info']
+            if 'start_position' not in segment_info:
+                continue
+            self.chunk_tiles.setdefault(chunk_idx, []).append((
+                tile_idx,
+                user_video_spec['tile_info']['tile_idx'],
+                segment_info['start_position']['width'],
+                segment_info['start_position']['height'],
+                segment_info['segment_out_info']['width'],
+                segment_info['segment_out_info']['height']
+            ))
+        for tiles in self.chunk_tiles.values():
+            tiles.sort(key=lambda tile: tile[0])
+
+    def get_size(self, chunk_idx, tile_idx):
+        """Size of the given tile in bytes."""
+        try:
+            return self.sizes[(chunk_idx, tile_idx)]
+        except KeyError:
+            raise Exception(f"[get size error] tile_id={encode_tile_id(chunk_idx, tile_idx)} not found!")
+
+    def get_spec_tile_idx(self, chunk_idx, tile_idx):
+        """Tile index recorded in the user_video_spec of the given tile."""
+        return self.spec_tile_idx[(chunk_idx, tile_idx)]
+
+
+def get_tile_index(video_size):
+    """
+    Get the integer index of video_size, which is built once per video_size object and then memoized.
+
+    Parameters
+    ----------
+    video_size: dict
+        video size of preprocessed video
+
+    Returns
+    -------
+    tile_index: TileIndex
+        the integer index of video_size
+    """
+
+    cached = _tile_index_cache.get(id(video_size))
+    if cached is not None and cached[0] is video_size:
+        return cached[1]
+
+    tile_index = TileIndex(video_size)
+    _tile_index_cache[id(video_size)] = (video_size, tile_index)
+
+    return tile_index
+
+
+class TileRaster:
+    """
+    Coordinate-compressed raster of a rectangular tile layout, which maps pixel coordinates to tile indexes.
+
+    Pixels that are not covered by any tile are mapped to tile 0, and overlapping tiles are resolved in
+    the order they are given, which both follow the behaviour of pixel_coord_to_tile.
+
+    Parameters
+    ----------
+    tiles: list
+        each item with format (tile_idx, start_width, start_height, width, height)
+    """
+
+    def __init__(self, tiles):
+        self.tiles = [tuple(int(v) for v in tile) for tile in tiles]
+        tile_indices = [0]
+        for tile in self.tiles:
+            if tile[0] not in tile_indices:
+                tile_indices.append(tile[0])
+        self.tile_indices = np.array(tile_indices, dtype=np.int64)
+        slot_of = {tile_idx: slot for slot, tile_idx in enumerate(tile_indices)}
+        self.rects = {tile[0]: tile[1:] for tile in self.tiles}
+
+        self.x_edges = np.unique([0] + [t[1] for t in self.tiles] + [t[1] + t[3] for t in self.tiles]).astype(np.float64)
+        self.y_edges = np.unique([0] + [t[2] for t in self.tiles] + [t[2] + t[4] for t in self.tiles]).astype(np.float64)
+
+        # the last row and column hold the uncovered area beyond the last edges
+        self.grid = np.zeros((len(self.y_edges), len(self.x_edges)), dtype=np.int32)
+        for tile_idx, start_w, start_h, width, height in self.tiles:
+            c0, c1 = np.searchsorted(self.x_edges, [start_w, start_w + width])
+            r0, r1 = np.searchsorted(self.y_edges, [start_h, start_h + height])
+            self.grid[r0:r1, c0:c1] = slot_of[tile_idx]
+
+    @property
+    def slot_num(self):
+        return len(self.tile_indices)
+
+    def layout_key(self):
+        """Stable description of the tile layout, used for hashing."""
+        return [list(tile) for tile in self.tiles]
+
+    def pixel_coord_to_slot(self, pixel_coord):
+        """
+        Map pixel coordinates to raster slots, where tile_indices[slot] is the tile index.
+
+        Parameters
+        ----------
+        pixel_coord: array
+            pixel coordinates, with format [coor_x, coor_y]
+
+        Returns
+        -------
+        slots: array
+            slot of each pixel, with the same shape as coor_x
+        """
+
+        cols = np.searchsorted(self.x_edges, pixel_coord[0], side='right') - 1
+        rows = np.searchsorted(self.y_edges, pixel_coord[1], side='right') - 1
+        outside = (cols < 0) | (rows < 0)
+        slots = self.grid[np.maximum(rows, 0), np.maximum(cols, 0)]
+        slots[outside] = 0
+        return slots
+
+    def pixel_coord_to_tile(self, pixel_coord):
+        """Map pixel coordinates to tile indexes, with the same result as pixel_coord_to_tile."""
+        return self.tile_indices[self.pixel_coord_to_slot(pixel_coord)]
+
+
+def get_tile_raster(video_size, chunk_idx, total_tile_num=None):
+    """
+    Get the tile raster of the given chunk, which is built once per chunk and then memoized.
+
+    Parameters
+    ----------
+    video_size: dict
+        video size of preprocessed video
+    chunk_idx: int
+        chunk index
+    total_tile_num: int
+        total num of tiles for different approach, all tiles of the chunk are used if None
+
+    Returns
+    -------
+    tile_raster: TileRaster
+        the tile raster of the given chunk
+    """
+
+    key = (id(video_size), chunk_idx, total_tile_num)
+    cached = _raster_cache.get(key)
+    if cached is not None and cached[0] is video_size:
+        return cached[1]
+
+    tiles = []
+    for tile in get_tile_index(video_size).chunk_tiles.get(chunk_idx, []):
+        if total_tile_num is not None and tile[0] >= total_tile_num:
+            continue
+        tiles.append(tile[1:])
+    tile_raster = TileRaster(tiles)
+    _raster_cache[key] = (video_size, tile_raster)
+
+    return tile_raster
@@ -0,0 +1,238 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import os
+import os.path as osp
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+import numpy as np
+from e3po.utils.logger import get_logger
+from e3po.utils.profiler import get_profiler, wait_process
+
+
+def build_encoding_args(encoding_params, ffmpeg_settings):
+    """
+    Build the encoding options of ffmpeg, the same for the streamed and the image based encoding.
+
+    Parameters
+    ----------
+    encoding_params: dict
+        the 'encoding_params' settings of e3po.yml
+    ffmpeg_settings: dict
+        the 'ffmpeg' settings of e3po.yml
+
+    Returns
+    -------
+    list
+        ffmpeg arguments, e.g. ['-threads', '6', '-preset', 'faster', '-c:v', 'libx264', ...]
+    """
+
+    return [
+        '-threads', str(ffmpeg_settings['thread']),
+        '-preset', str(encoding_params['preset']),
+        '-c:v', str(encoding_params['encoder']),
+        '-g', str(encoding_params['gop']),
+        '-bf', str(encoding_params['bf']),
+        '-qp', str(encoding_params['qp_list'][0])
+    ]
+
+
+class _PipeWriter(threading.Thread):
+    """Thread writing raw frames into the stdin of ffmpeg, such that the evaluation never waits for the encoder."""
+
+    def __init__(self, process, max_pending):
+        super(_PipeWriter, self).__init__(name='e3po_video_encoder', daemon=True)
+        self.process = process
+        self.frames = queue.Queue(max_pending)
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                self.process.stdin.write(frame.tobytes())
+        except OSError as e:
+            self.error = e
+            while self.frames.get() is not None:       # keep draining, such that push() never blocks
+                pass
+        finally:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+
+class VideoEncodeStream:
+    """
+    Encode frames into a video while they are generated, by piping them as raw video into one ffmpeg process,
+    which runs concurrently with the evaluation.
+
+    The process is started with the first frame, whose shape is used for all frames. The video is written to
+    a temporary file and only moved to video_uri once ffmpeg succeeded, such that an interrupted run never leaves
+    a truncated video behind.
+
+    Parameters
+    ----------
+    ffmpeg_settings: dict
+        the 'ffmpeg' settings of e3po.yml
+    encoding_params: dict
+        the 'encoding_params' settings of e3po.yml
+    video_uri: str
+        uri of the encoded video
+    max_pending: int
+        maximum number of frames waiting to be written to ffmpeg
+    """
+
+    def __init__(self, ffmpeg_settings, encoding_params, video_uri, max_pending=8):
+        self.ffmpeg_settings = ffmpeg_settings
+        self.encoding_params = encoding_params
+        self.video_uri = video_uri
+        self.max_pending = max_pending
+        self.frame_num = 0
+        self.shape = None
+        self._tmp_uri = f"{video_uri}.{os.getpid()}.tmp"
+        self._process = None
+        self._writer = None
+        self._stderr = None
+
+    def _start(self, shape):
+        self.shape = shape
+        height, width = shape[:2]
+        cmd = [
+            self.ffmpeg_settings['ffmpeg_path'], '-loglevel', str(self.ffmpeg_settings['loglevel']), '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            '-r', str(self.encoding_params['video_fps']), '-i', '-',
+            *build_encoding_args(self.encoding_params, self.ffmpeg_settings),
+            '-f', osp.splitext(self.video_uri)[1][1:] or 'mp4', self._tmp_uri
+        ]
+        get_logger().debug(f"[video encoder] {' '.join(cmd)}")
+
+        # stderr goes to a file, which never fills up while frames are written
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+        self._cmd = ' '.join(cmd)
+        self._process_start = time.perf_counter()
+        self._writer = _PipeWriter(self._process, self.max_pending)
+        self._writer.start()
+
+    def push(self, frame):
+        """
+        Feed the next frame.
+
+        Parameters
+        ----------
+        frame: array
+            uint8 BGR frame
+        """
+
+        if self._process is None:
+            self._start(frame.shape)
+        assert frame.shape == self.shape, f'[error] encoded frames should have shape {self.shape}'
+        self._writer.frames.put(np.ascontiguousarray(frame, dtype=np.uint8))
+        self.frame_num += 1
+
+    def close(self):
+        """
+        Finish the encoding.
+
+        Returns
+        -------
+        bool
+            whether the video was written, False if no frame was pushed or ffmpeg failed
+        """
+
+        if self._process is None:
+            return False
+        with get_profiler().timer('ffmpeg.encode_finish'):
+            self._writer.frames.put(None)
+            self._writer.join()
+            returncode, cpu_s = wait_process(self._process)
+        get_profiler().record('ffmpeg.encode_process', time.perf_counter() - self._process_start,
+                              self._process_start, {'cmd': self._cmd, 'cpu_s': cpu_s, 'frames': self.frame_num})
+        self._stderr.seek(0)
+        stderr = self._stderr.read()
+        self._stderr.close()
+        self._process = None
+
+        if returncode != 0 or not osp.exists(self._tmp_uri):
+            get_logger().error(f"[video encoder] failed to encode {self.video_uri}: {stderr.decode(errors='ignore').strip()}")
+            if osp.exists(self._tmp_uri):
+                os.remove(self._tmp_uri)
+            return False
+        os.replace(self._tmp_uri, self.video_uri)
+        get_logger().debug(f"[video encoder] {self.frame_num} frames encoded into {self.video_uri}")
+        return True
+
+
+def concat_videos(ffmpeg_settings, part_uris, video_uri):
+    """
+    Join videos encoded with the same settings into one video without re-encoding, and remove the parts.
+
+    Parameters
+    ----------
+    ffmpeg_settings: dict
+        the 'ffmpeg' settings of e3po.yml
+    part_uris: list
+        uris of the parts, in playback order
+    video_uri: str
+        uri of the joined video
+
+    Returns
+    -------
+    bool
+        whether the video was written
+    """
+
+    if not part_uris:
+        get_logger().error(f"[video encoder] no part of {video_uri} was encoded")
+        return False
+
+    list_uri = f"{video_uri}.{os.getpid()}.txt"
+    tmp_uri = f"{video_uri}.{os.getpid()}.tmp"
+    with open(list_uri, 'w') as f:
+        for part_uri in part_uris:
+            f.write(f"file '{osp.abspath(part_uri)}'\n")
+    cmd = [
+        ffmpeg_settings['ffmpeg_path'], '-loglevel', str(ffmpeg_settings['loglevel']), '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_uri, '-c', 'copy',
+        '-f', osp.splitext(video_uri)[1][1:] or 'mp4', tmp_uri
+    ]
+    get_logger().debug(f"[video encoder] {' '.join(cmd)}")
+    with get_profiler().timer('ffmpeg.concat') as timer:
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode, cpu_s = wait_process(process)
+        timer.set_args(cmd=' '.join(cmd), cpu_s=cpu_s)
+
+    os.remove(list_uri)
+    if returncode != 0 or not osp.exists(tmp_uri):
+        get_logger().error(f"[video encoder] failed to join {video_uri}: {stderr.decode(errors='ignore').strip()}")
+        if osp.exists(tmp_uri):
+            os.remove(tmp_uri)
+        return False
+    os.replace(tmp_uri, video_uri)
+    for part_uri in part_uris:
+        os.remove(part_uri)
+    return True
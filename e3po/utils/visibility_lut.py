@@ -0,0 +1,213 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import os
+import json
+import hashlib
+import numpy as np
+import os.path as osp
+from e3po.utils.logger import get_logger
+from e3po.utils.projection_utilities import calcualte_3d_cartesian_coord, _3d_polar_coord_to_pixel_coord
+from e3po.utils.tile_layout import TileRaster, get_tile_raster
+
+LUT_VERSION = 1
+DEFAULT_LUT_FOLDER = osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))), 'result', 'visibility_lut')
+
+_lut_cache = {}
+
+
+class TileVisibilityLUT:
+    """
+    Precomputed sphere-to-tile visibility lookup table.
+
+    For a quantized (yaw, pitch) grid, the table stores the set of tiles hit by the fov centered in each
+    cell as a bitmask, such that the tile decision becomes a table lookup.
+
+    Parameters
+    ----------
+    tile_raster: TileRaster
+        tile layout of the projected video
+    projection_mode: str
+        projection format of the projected video
+    resolution: list
+        resolution of the projected video, with format [height, width]
+    range_fov: list
+        degree range of fov, with format [height, width]
+    grid_step: float
+        grid step of the yaw and pitch axes, in degree
+    sampling_size: list
+        number of the sampling points over the fov, with format [height, width]
+    """
+
+    def __init__(self, tile_raster, projection_mode, resolution, range_fov, grid_step=2, sampling_size=(50, 50)):
+        self.tile_raster = tile_raster
+        self.projection_mode = projection_mode
+        self.resolution = [int(resolution[0]), int(resolution[1])]
+        self.range_fov = [float(range_fov[0]), float(range_fov[1])]
+        self.grid_step = float(grid_step)
+        self.sampling_size = [int(sampling_size[0]), int(sampling_size[1])]
+        self.yaw_num = int(round(360 / self.grid_step))
+        self.pitch_num = int(round(180 / self.grid_step))
+        self.bits = None
+
+    @property
+    def layout_hash(self):
+        """Hash of everything the table content depends on."""
+        key = {
+            'version': LUT_VERSION,
+            'tiles': self.tile_raster.layout_key(),
+            'projection_mode': self.projection_mode,
+            'resolution': self.resolution,
+            'range_fov': self.range_fov,
+            'grid_step': self.grid_step,
+            'sampling_size': self.sampling_size
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def build(self, batch_size=128):
+        """Compute the visible tile set of every grid cell."""
+        fov_w, fov_h = self.range_fov[0] * np.pi / 180, self.range_fov[1] * np.pi / 180
+        rays = calcualte_3d_cartesian_coord(fov_w, fov_h, 0, 0, 0, self.sampling_size).reshape(3, -1)
+        sample_h, sample_w = self.sampling_size
+
+        yaw = (np.arange(self.yaw_num) + 0.5) * self.grid_step * np.pi / 180
+        pitch = (np.arange(self.pitch_num) + 0.5) * self.grid_step * np.pi / 180 - np.pi / 2
+        pitch_grid, yaw_grid = np.meshgrid(pitch, yaw, indexing='ij')
+        yaw_grid, pitch_grid = yaw_grid.ravel(), pitch_grid.ravel()
+
+        cell_num = len(yaw_grid)
+        slot_num = self.tile_raster.slot_num
+        visible = np.zeros((cell_num, slot_num), dtype=bool)
+        for start in range(0, cell_num, batch_size):
+            a = yaw_grid[start:start + batch_size]
+            b = pitch_grid[start:start + batch_size]
+            n = len(a)
+
+            # the same rotation as calcualte_3d_cartesian_coord, with zero roll
+            rot = np.empty((n, 3, 3))
+            rot[:, 0] = np.stack([np.cos(a) * np.cos(b), -np.sin(a), np.cos(a) * np.sin(b)], axis=-1)
+            rot[:, 1] = np.stack([np.sin(a) * np.cos(b), np.cos(a), np.sin(a) * np.sin(b)], axis=-1)
+            rot[:, 2] = np.stack([-np.sin(b), np.zeros(n), np.cos(b)], axis=-1)
+            xx, yy, zz = np.clip(np.einsum('nij,jp->inp', rot, rays), -1, 1)
+
+            phi = np.arctan2(yy, xx).reshape(n * sample_h, sample_w)
+            theta = np.arctan2(zz, np.sqrt(xx * xx + yy * yy)).reshape(n * sample_h, sample_w)
+            pixel_coord = _3d_polar_coord_to_pixel_coord(np.concatenate([phi, theta], axis=-1), self.projection_mode, self.resolution)
+            slots = self.tile_raster.pixel_coord_to_slot(pixel_coord).reshape(n, -1)
+            visible[np.repeat(np.arange(start, start + n), slots.shape[1]), slots.ravel()] = True
+
+        self.bits = np.packbits(visible, axis=-1).reshape(self.pitch_num, self.yaw_num, -1)
+        return self
+
+    def save(self, lut_folder):
+        """Persist the table into lut_folder, keyed by the layout hash."""
+        os.makedirs(lut_folder, exist_ok=True)
+        lut_uri = osp.join(lut_folder, f"{self.layout_hash}.npz")
+        tmp_uri = f"{lut_uri}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_uri, bits=self.bits, tile_indices=self.tile_raster.tile_indices)
+        os.replace(tmp_uri, lut_uri)
+        return lut_uri
+
+    def load(self, lut_folder):
+        """Load the table from lut_folder, return False if it has not been persisted yet."""
+        lut_uri = osp.join(lut_folder, f"{self.layout_hash}.npz")
+        if not osp.exists(lut_uri):
+            return False
+        with np.load(lut_uri) as lut_data:
+            if not np.array_equal(lut_data['tile_indices'], self.tile_raster.tile_indices):
+                return False
+            self.bits = lut_data['bits']
+        return True
+
+    def lookup(self, yaw, pitch, margin=0):
+        """
+        Look up the visible tiles for the fov centered in (yaw, pitch).
+
+        Parameters
+        ----------
+        yaw: float
+            yaw of the fov center, in radian
+        pitch: float
+            pitch of the fov center, in radian
+        margin: int
+            number of neighbouring cells united into the result on each side, as a safety margin
+
+        Returns
+        -------
+        tile_list: list
+            sorted indexes of the visible tiles
+        """
+
+        yaw_idx = int(np.floor(np.degrees(yaw) % 360 / self.grid_step)) % self.yaw_num
+        pitch_idx = int(np.floor((np.degrees(pitch) + 90) / self.grid_step))
+        pitch_idx = min(max(pitch_idx, 0), self.pitch_num - 1)
+
+        if margin:
+            pitch_cells = np.arange(max(pitch_idx - margin, 0), min(pitch_idx + margin, self.pitch_num - 1) + 1)
+            yaw_cells = np.arange(yaw_idx - margin, yaw_idx + margin + 1) % self.yaw_num
+            cell_bits = np.bitwise_or.reduce(self.bits[np.ix_(pitch_cells, yaw_cells)].reshape(-1, self.bits.shape[-1]), axis=0)
+        else:
+            cell_bits = self.bits[pitch_idx, yaw_idx]
+
+        visible = np.unpackbits(cell_bits)[:self.tile_raster.slot_num].astype(bool)
+        return sorted(int(tile_idx) for tile_idx in self.tile_raster.tile_indices[visible])
+
+
+def get_visibility_lut(tile_raster, projection_mode, resolution, range_fov, grid_step=2, lut_folder=None):
+    """
+    Get the visibility lookup table for the given tile layout.
+    The table is looked up in memory first, then in lut_folder, and is built and persisted otherwise.
+
+    Parameters
+    ----------
+    tile_raster: TileRaster
+        tile layout of the projected video
+    projection_mode: str
+        projection format of the projected video
+    resolution: list
+        resolution of the projected video, with format [height, width]
+    range_fov: list
+        degree range of fov, with format [height, width]
+    grid_step: float
+        grid step of the yaw and pitch axes, in degree
+    lut_folder: str
+        folder to persist the tables, defaults to 'result/visibility_lut'
+
+    Returns
+    -------
+    lut: TileVisibilityLUT
+        the visibility lookup table
+    """
+
+    lut = TileVisibilityLUT(tile_raster, projection_mode, resolution, range_fov, grid_step)
+    layout_hash = lut.layout_hash
+    if layout_hash in _lut_cache:
+        return _lut_cache[layout_hash]
+
+    lut_folder = lut_folder or DEFAULT_LUT_FOLDER
+    if not lut.load(lut_folder):
+        get_logger().info(f"[visibility lut] build {layout_hash}")
+        lut.build()
+        try:
+            lut.save(lut_folder)
+        except OSError as e:
+            get_logger().warning(f"[visibility lut] failed to persist {layout_hash}: {e}")
+    _lut_cache[layout_hash] = lut
+
+    return lut
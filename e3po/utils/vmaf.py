@@ -0,0 +1,275 @@
+# E3PO, an open platform for 360˚ video streaming simulation and evaluation.
+# Copyright 2023 ByteDance Ltd. and/or its affiliates
+#
+# This file is part of E3PO.
+#
+# E3PO is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# E3PO is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see:
+#    <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>
+
+import errno
+import json
+import os
+import os.path as osp
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import numpy as np
+from e3po.utils.logger import get_logger
+from e3po.utils.profiler import get_profiler, wait_process
+
+
+def build_libvmaf_filter(vmaf_opt, log_path):
+    """
+    Build the libvmaf filter options of ffmpeg.
+
+    Parameters
+    ----------
+    vmaf_opt: dict
+        the 'vmaf' settings of e3po.yml, with optional keys model, n_threads and n_subsample
+    log_path: str
+        path of the json log written by libvmaf
+
+    Returns
+    -------
+    str
+        e.g. 'libvmaf=model=version=vmaf_4k_v0.6.1:n_threads=4:n_subsample=1:log_fmt=json:log_path=...'
+    """
+
+    options = [
+        f"model={vmaf_opt.get('model') or 'version=vmaf_4k_v0.6.1'}",
+        f"n_threads={vmaf_opt.get('n_threads') or 1}",
+        f"n_subsample={vmaf_opt.get('n_subsample') or 1}",
+        "log_fmt=json",
+        f"log_path={log_path}"
+    ]
+    return 'libvmaf=' + ':'.join(options)
+
+
+def read_vmaf_log(log_path):
+    """Pooled mean vmaf score of a libvmaf json log, None if it is not available."""
+    try:
+        with open(log_path, 'r') as f:
+            return float(json.load(f)['pooled_metrics']['vmaf']['mean'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def merge_vmaf_logs(part_logs, log_path):
+    """
+    Join the libvmaf json logs of consecutive ranges of the frames into one log, with the pooled metrics
+    recomputed over all frames.
+
+    Parameters
+    ----------
+    part_logs: list
+        each item with format (log_path, frame_num), in playback order
+    log_path: str
+        path of the joined log
+
+    Returns
+    -------
+    float
+        the pooled mean vmaf score, None if a part is not available
+    """
+
+    frames = []
+    frame_offset = 0
+    version = None
+    for part_path, frame_num in part_logs:
+        try:
+            with open(part_path, 'r') as f:
+                part = json.load(f)
+        except (OSError, ValueError):
+            return None
+        version = part.get('version', version)
+        for frame in part.get('frames', []):
+            frames.append({**frame, 'frameNum': frame['frameNum'] + frame_offset})
+        frame_offset += frame_num
+    if not frames:
+        return None
+
+    pooled_metrics = {}
+    for name in frames[0]['metrics']:
+        values = np.array([frame['metrics'][name] for frame in frames], dtype=np.float64)
+        pooled_metrics[name] = {
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'mean': float(values.mean()),
+            'harmonic_mean': float(1 / np.mean(1 / (values + 1)) - 1)
+        }
+    with open(log_path, 'w') as f:
+        json.dump({'version': version, 'frames': frames, 'pooled_metrics': pooled_metrics, 'aggregate_metrics': {}},
+                  f, indent=2)
+    for part_path, _ in part_logs:
+        os.remove(part_path)
+    return read_vmaf_log(log_path)
+
+
+class _FifoWriter(threading.Thread):
+    """Thread writing raw frames into a named pipe, which is opened once ffmpeg reads it."""
+
+    def __init__(self, fifo_path, process, max_pending):
+        super(_FifoWriter, self).__init__(name='e3po_vmaf_writer', daemon=True)
+        self.fifo_path = fifo_path
+        self.process = process
+        self.frames = queue.Queue(max_pending)
+        self.error = None
+
+    def _open(self):
+        # a non-blocking open fails with ENXIO until the reader opens the pipe, which never happens if ffmpeg exited
+        while True:
+            try:
+                fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.set_blocking(fd, True)
+                return os.fdopen(fd, 'wb')
+            except OSError as e:
+                if e.errno != errno.ENXIO or self.process.poll() is not None:
+                    raise
+                time.sleep(0.01)
+
+    def run(self):
+        pipe = None
+        try:
+            pipe = self._open()
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                pipe.write(frame.tobytes())
+        except OSError as e:
+            self.error = e
+            while self.frames.get() is not None:       # keep draining, such that push() never blocks
+                pass
+        finally:
+            if pipe is not None:
+                try:
+                    pipe.close()
+                except OSError:
+                    pass
+
+
+class VmafStream:
+    """
+    Streaming vmaf calculation, which feeds the distorted and reference frames of the evaluation into one
+    long-lived ffmpeg libvmaf process through two named pipes, while the evaluation is running.
+
+    The process is started with the first frame pair, whose shape is used for all frames.
+
+    Parameters
+    ----------
+    ffmpeg_path: str
+        path of ffmpeg
+    video_fps: int
+        framerate of the frames
+    vmaf_opt: dict
+        the 'vmaf' settings of e3po.yml
+    log_path: str
+        path of the json log written by libvmaf, which should be unique per run
+    max_pending: int
+        maximum number of frames waiting to be written to each pipe
+    """
+
+    def __init__(self, ffmpeg_path, video_fps, vmaf_opt, log_path, max_pending=4):
+        self.ffmpeg_path = ffmpeg_path
+        self.video_fps = video_fps
+        self.vmaf_opt = vmaf_opt
+        self.log_path = log_path
+        self.max_pending = max_pending
+        self.frame_num = 0
+        self.shape = None
+        self._fifo_dir = None
+        self._process = None
+        self._writers = []
+
+    @staticmethod
+    def is_supported():
+        """Named pipes are only available on posix systems."""
+        return hasattr(os, 'mkfifo')
+
+    def _start(self, shape):
+        self.shape = shape
+        height, width = shape[:2]
+        self._fifo_dir = tempfile.mkdtemp(prefix='e3po_vmaf_')
+        fifo_paths = [osp.join(self._fifo_dir, name) for name in ('distorted.yuv', 'reference.yuv')]
+        for fifo_path in fifo_paths:
+            os.mkfifo(fifo_path)
+
+        if osp.exists(self.log_path):
+            os.remove(self.log_path)
+        input_args = ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(self.video_fps)]
+        cmd = [self.ffmpeg_path, '-loglevel', 'error', '-y']
+        for fifo_path in fifo_paths:
+            cmd += input_args + ['-i', fifo_path]
+        cmd += ['-lavfi', f"[0:v][1:v]{build_libvmaf_filter(self.vmaf_opt, self.log_path)}", '-f', 'null', '-']
+        get_logger().debug(f"[vmaf stream] {' '.join(cmd)}")
+
+        self._process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._cmd = ' '.join(cmd)
+        self._process_start = time.perf_counter()
+        self._writers = [_FifoWriter(fifo_path, self._process, self.max_pending) for fifo_path in fifo_paths]
+        for writer in self._writers:
+            writer.start()
+
+    def push(self, distorted, reference):
+        """
+        Feed one pair of frames.
+
+        Parameters
+        ----------
+        distorted: array
+            the frame generated by the approach, uint8 BGR
+        reference: array
+            the benchmark frame, uint8 BGR with the same shape
+        """
+
+        if self._process is None:
+            self._start(reference.shape)
+        assert distorted.shape == self.shape and reference.shape == self.shape, \
+            f'[error] vmaf frames should have shape {self.shape}'
+        self._writers[0].frames.put(np.ascontiguousarray(distorted, dtype=np.uint8))
+        self._writers[1].frames.put(np.ascontiguousarray(reference, dtype=np.uint8))
+        self.frame_num += 1
+
+    def close(self):
+        """
+        Finish the calculation.
+
+        Returns
+        -------
+        float
+            the pooled mean vmaf score, None if no frame was pushed or libvmaf failed
+        """
+
+        if self._process is None:
+            return None
+        with get_profiler().timer('ffmpeg.vmaf_finish'):
+            for writer in self._writers:
+                writer.frames.put(None)
+            for writer in self._writers:
+                writer.join()
+            stderr = self._process.stderr.read()
+            self._process.stderr.close()
+            _, cpu_s = wait_process(self._process)
+        get_profiler().record('ffmpeg.vmaf_process', time.perf_counter() - self._process_start,
+                              self._process_start, {'cmd': self._cmd, 'cpu_s': cpu_s, 'frames': self.frame_num})
+        shutil.rmtree(self._fifo_dir, ignore_errors=True)
+        self._process = None
+
+        score = read_vmaf_log(self.log_path)
+        if score is None:
+            get_logger().error(f"[vmaf stream] vmaf calculation failed: {stderr.decode(errors='ignore').strip()}")
+        return score